@@ -0,0 +1,120 @@
+"""
+grep_files 実行中のイベントループの遅延（lag）を計測する。
+
+合成したツリー（既定 100k ファイル）に対して grep_files を実行しながら、10ms ごとに起きるティッカーを回し、
+予定時刻からの遅れを記録する。Rich の Live 表示や LLM のストリーミングはこの遅れの分だけ止まる。
+
+    inline    従来の挙動: 走査と正規表現をイベントループ上で同期実行する
+    executor  FileOps.grep_files（走査は I/O スレッド、正規表現はプロセスプール）
+
+    uv run python benchmarks/event_loop_lag_bench.py --files 100000
+    uv run python benchmarks/event_loop_lag_bench.py --root path/to/repo --pattern "def .*_handler"
+"""
+import argparse
+import asyncio
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from companion.base.io_executor import shutdown_io_executor  # noqa: E402
+from companion.tools.file_ops import FileOps  # noqa: E402
+from companion.utils.text_search import grep_paths  # noqa: E402
+
+FILES_PER_DIR = 1000
+
+
+def build_tree(root: Path, files: int, lines: int) -> None:
+    body = "".join(f"def function_{i}(value):\n    return value + {i}\n" for i in range(lines // 2))
+    for i in range(files):
+        directory = root / f"pkg_{i // FILES_PER_DIR:04d}"
+        if i % FILES_PER_DIR == 0:
+            directory.mkdir(parents=True, exist_ok=True)
+        # 最後のファイルにだけ検索対象を入れ、全ファイルを読ませる
+        extra = "NEEDLE_MARKER = True\n" if i == files - 1 else ""
+        (directory / f"module_{i:06d}.py").write_text(body + extra, encoding="utf-8")
+
+
+async def tick(interval: float, stop: asyncio.Event, lags: List[float]) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def run_inline(ops: FileOps, args: argparse.Namespace) -> str:
+    import re
+    files = ops._collect_grep_files(".", args.include, True) or []
+    results, _ = grep_paths(re.compile(args.pattern), files, str(ops.workspace_root), args.max_results)
+    return "\n".join(results)
+
+
+async def run_executor(ops: FileOps, args: argparse.Namespace) -> str:
+    return await ops.grep_files(args.pattern, ".", args.include, True, args.max_results)
+
+
+async def measure(mode: str, ops: FileOps, args: argparse.Namespace) -> Tuple[float, List[float], str]:
+    stop = asyncio.Event()
+    lags: List[float] = []
+    ticker = asyncio.create_task(tick(args.interval, stop, lags))
+    await asyncio.sleep(args.interval * 2)
+    started = time.perf_counter()
+    if mode == "inline":
+        output = await run_inline(ops, args)
+    else:
+        output = await run_executor(ops, args)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    return elapsed, lags, output
+
+
+def report(mode: str, elapsed: float, lags: List[float], output: str) -> None:
+    lags_ms = sorted(l * 1000 for l in lags) or [0.0]
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+    matches = sum(1 for line in output.splitlines() if ":" in line and not line.startswith("("))
+    print(
+        f"{mode:9s} grep {elapsed:7.2f}s  ticks {len(lags):5d}  "
+        f"lag max {lags_ms[-1]:8.1f}ms  p99 {p99:8.1f}ms  mean {statistics.mean(lags_ms):6.1f}ms  matches {matches}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", help="既存のディレクトリを検索する（省略時は合成ツリーを一時ディレクトリに作る）")
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--lines", type=int, default=20)
+    parser.add_argument("--pattern", default="NEEDLE_MARKER")
+    parser.add_argument("--include", default="*.py")
+    parser.add_argument("--max-results", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.01, help="ティッカーの間隔（秒）")
+    parser.add_argument("--modes", default="inline,executor")
+    args = parser.parse_args()
+
+    tmp = None
+    if args.root:
+        root = Path(args.root).resolve()
+    else:
+        tmp = Path(tempfile.mkdtemp(prefix="duckflow-lag-"))
+        root = tmp
+        started = time.perf_counter()
+        build_tree(root, args.files, args.lines)
+        print(f"built {args.files} files in {time.perf_counter() - started:.1f}s ({root})")
+
+    ops = FileOps(str(root))
+    try:
+        for mode in args.modes.split(","):
+            report(mode, *(await measure(mode, ops, args)))
+    finally:
+        shutdown_io_executor()
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+"""
+LLMClient の負荷・レイテンシ計測（llm_stub_server.py と組み合わせて使う）。
+
+スタブサーバーに対して LLMClient.chat / chat_stream を同時に N 本ずつ発行し、
+レイテンシ（ストリームは TTFT も）の p50 / p99、スループット、リトライ回数を表示する。
+HTTP プール・リトライ・レート制限を含む実際の経路を通る。
+
+    uv run python benchmarks/llm_stub_server.py --port 8765 --error-rate 0.05 &
+    uv run python benchmarks/llm_load_bench.py --base-url http://127.0.0.1:8765/v1 --requests 200 --concurrency 16
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from companion.base.http_pool import aclose_all  # noqa: E402
+from companion.base.llm_client import LLMClient  # noqa: E402
+
+MESSAGES = [
+    {"role": "system", "content": "You are Duckflow."},
+    {"role": "user", "content": "Read README.md and summarize it."},
+]
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def one_request(client: LLMClient, stream: bool) -> tuple:
+    """(全体の秒数, TTFT 秒 or None, 成功したか)"""
+    started = time.perf_counter()
+    ttft: Optional[float] = None
+    try:
+        if stream:
+            async for _ in client.chat_stream(MESSAGES):
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+            return time.perf_counter() - started, ttft, True
+        content = await client.chat(MESSAGES, raw=True)
+        return time.perf_counter() - started, None, isinstance(content, str)
+    except Exception:
+        return time.perf_counter() - started, ttft, False
+
+
+async def run(args: argparse.Namespace) -> None:
+    client = LLMClient(api_key="stub", base_url=args.base_url, model="stub", provider="openai")
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded() -> tuple:
+        async with semaphore:
+            return await one_request(client, args.stream)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(bounded() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    await aclose_all()
+
+    latencies = [r[0] for r in results if r[2]]
+    ttfts = [r[1] for r in results if r[1] is not None]
+    failures = sum(1 for r in results if not r[2])
+    stats = client.usage_stats
+    print(f"requests={args.requests} concurrency={args.concurrency} stream={args.stream}")
+    print(f"elapsed={elapsed:.2f}s throughput={args.requests / elapsed:.1f} req/s failures={failures}")
+    if latencies:
+        print(
+            f"latency p50={statistics.median(latencies) * 1000:.0f}ms "
+            f"p99={percentile(latencies, 0.99) * 1000:.0f}ms"
+        )
+    if ttfts:
+        print(f"ttft    p50={statistics.median(ttfts) * 1000:.0f}ms p99={percentile(ttfts, 0.99) * 1000:.0f}ms")
+    print(
+        f"tokens={stats['total_tokens']:,} retries={stats['retries']} "
+        f"({stats['retries_by_kind']}) retry_wait={stats['retry_wait_seconds']:.1f}s"
+    )
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--base-url", default="http://127.0.0.1:8765/v1")
+    ap.add_argument("--requests", type=int, default=100)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--stream", action="store_true")
+    args = ap.parse_args()
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,369 @@
+"""
+オフラインで使える OpenAI 互換の LLM スタブサーバー（負荷・レイテンシ計測用）。
+
+POST /v1/chat/completions に対し、台本（Sym-Ops 応答のテキスト）を順番に返す。
+ストリーミング（SSE）、最初のトークンまでの時間（TTFT）、出力速度（tokens/sec）、
+429 / 5xx の注入、usage を再現するので、LLMClient の HTTP プール・リトライ・
+レート制限・ストリーミング実行をネットワークなしで計測できる。
+
+    uv run python benchmarks/llm_stub_server.py --port 8765 --ttft 0.3 --tps 80 --error-rate 0.05
+
+エージェントをスタブに向ける:
+
+    DUCKFLOW_LLM_PROVIDER=openai OPENAI_BASE_URL=http://127.0.0.1:8765/v1 \\
+    OPENAI_API_KEY=stub DUCKFLOW_MODEL=stub uv run python main.py
+
+台本（--script）:
+    ディレクトリ   中の *.txt を名前順に1応答ずつ（既定: benchmarks/corpus/symops）
+    .jsonl ファイル 1行1応答。{"content": "..."} または記録した chat.completion レスポンス
+    .txt ファイル   ファイル全体を1応答
+
+プロンプトキャッシュ（--prompt-cache）:
+    Anthropic 方式を再現する。cache_control を付けたメッセージ（ブレークポイント）までの
+    プレフィックスを TTL 付きで保存し、次のリクエストではブレークポイントとその手前
+    20 ブロックまでで一致する最長のプレフィックスを usage.prompt_tokens_details.cached_tokens に返す。
+
+その他のエンドポイント: GET /v1/models, GET /stats（リクエスト数・注入したエラー数）
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_SCRIPT = Path(__file__).resolve().parent / "corpus" / "symops"
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests",
+    500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable",
+    529: "Overloaded",
+}
+
+# 1トークン ≈ 単語1つ（直後の空白を含む）。長い単語は4文字ずつに分ける
+_TOKEN_RE = re.compile(r"\S{1,4}\s*|\s+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text)
+
+
+def _message_text(msg: Dict) -> str:
+    content = msg.get("content", "")
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def _has_breakpoint(msg: Dict) -> bool:
+    if "cache_control" in msg:
+        return True
+    content = msg.get("content")
+    return isinstance(content, list) and any(
+        isinstance(part, dict) and "cache_control" in part for part in content
+    )
+
+
+def message_tokens(msg: Dict) -> int:
+    return len(_message_text(msg)) // 4 + 4
+
+
+def estimate_prompt_tokens(messages: List[Dict]) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+
+class PromptCache:
+    """Anthropic-style prefix cache keyed by explicit breakpoints."""
+
+    LOOKBACK = 20
+
+    def __init__(self, ttl: float = 300.0, min_tokens: int = 1024):
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.entries: Dict[str, float] = {}
+
+    def lookup_and_store(self, messages: List[Dict]) -> int:
+        """キャッシュから読めたプレフィックスのトークン数を返し、ブレークポイントまでを保存する。"""
+        now = time.monotonic()
+        hashes, cumulative = [], []
+        digest = hashlib.sha1()
+        total = 0
+        for msg in messages:
+            digest.update(f"{msg.get('role', '')}\x00{_message_text(msg)}\x01".encode("utf-8", "replace"))
+            hashes.append(digest.hexdigest())
+            total += message_tokens(msg)
+            cumulative.append(total)
+
+        breakpoints = [i for i, m in enumerate(messages) if _has_breakpoint(m)]
+        cached = 0
+        for bp in breakpoints:
+            for j in range(bp, max(-1, bp - self.LOOKBACK - 1), -1):
+                expiry = self.entries.get(hashes[j])
+                if expiry is not None and expiry > now:
+                    cached = max(cached, cumulative[j])
+                    self.entries[hashes[j]] = now + self.ttl  # 読み出しで TTL を延長
+                    break
+        for bp in breakpoints:
+            if cumulative[bp] >= self.min_tokens:
+                self.entries[hashes[bp]] = now + self.ttl
+        return cached
+
+
+def load_script(path: Path) -> List[str]:
+    """台本を読み込み、応答テキストのリストを返す。"""
+    if path.is_dir():
+        return [p.read_text(encoding="utf-8") for p in sorted(path.glob("*.txt"))]
+    if path.suffix == ".jsonl":
+        responses = []
+        for line in path.read_text(encoding="utf-8").splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "choices" in record:
+                record = {"content": record["choices"][0]["message"]["content"]}
+            responses.append(record["content"])
+        return responses
+    return [path.read_text(encoding="utf-8")]
+
+
+class StubLLM:
+    """Scripted OpenAI-compatible chat completions with injected latency and errors."""
+
+    def __init__(
+        self,
+        responses: List[str],
+        ttft: float = 0.3,
+        tps: float = 80.0,
+        error_rate: float = 0.0,
+        error_statuses: Tuple[int, ...] = (429, 503),
+        retry_after: Optional[float] = None,
+        seed: Optional[int] = None,
+        prompt_cache: Optional[PromptCache] = None,
+    ):
+        if not responses:
+            raise ValueError("script has no responses")
+        self.responses = responses
+        self.ttft = ttft
+        self.tps = tps
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.prompt_cache = prompt_cache
+        self.next_index = 0
+        self.stats = {"requests": 0, "streamed": 0, "errors": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+
+    def next_response(self) -> str:
+        content = self.responses[self.next_index % len(self.responses)]
+        self.next_index += 1
+        return content
+
+    async def handle(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        if method == "GET" and path.rstrip("/").endswith("/models"):
+            await self.send_json(writer, 200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+            return
+        if method == "GET" and path == "/stats":
+            await self.send_json(writer, 200, self.stats)
+            return
+        if method != "POST" or not path.rstrip("/").endswith("/chat/completions"):
+            await self.send_json(writer, 404, {"error": {"message": f"Unknown endpoint {method} {path}"}})
+            return
+
+        self.stats["requests"] += 1
+        try:
+            request = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            await self.send_json(writer, 400, {"error": {"message": "Invalid JSON body"}})
+            return
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            status = self.random.choice(self.error_statuses)
+            self.stats["errors"] += 1
+            headers = {}
+            if self.retry_after is not None:
+                headers["retry-after"] = f"{self.retry_after:g}"
+            await self.send_json(
+                writer, status,
+                {"error": {"message": f"Injected {status}", "type": "stub_error", "code": status}},
+                headers,
+            )
+            return
+
+        model = request.get("model", "stub")
+        tokens = tokenize(self.next_response())
+        max_tokens = request.get("max_tokens")
+        if max_tokens:
+            tokens = tokens[: int(max_tokens)]
+        finish_reason = "length" if max_tokens and len(tokens) >= int(max_tokens) else "stop"
+        messages = request.get("messages", [])
+        usage = {
+            "prompt_tokens": estimate_prompt_tokens(messages),
+            "completion_tokens": len(tokens),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if self.prompt_cache is not None:
+            cached = self.prompt_cache.lookup_and_store(messages)
+            usage["prompt_tokens_details"] = {"cached_tokens": cached}
+            self.stats["cached_tokens"] += cached
+        self.stats["prompt_tokens"] += usage["prompt_tokens"]
+        self.stats["completion_tokens"] += len(tokens)
+
+        await asyncio.sleep(self.ttft)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        if request.get("stream"):
+            self.stats["streamed"] += 1
+            include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+            await self.stream(writer, completion_id, model, tokens, finish_reason, usage if include_usage else None)
+            return
+
+        if self.tps > 0:
+            await asyncio.sleep(len(tokens) / self.tps)
+        await self.send_json(writer, 200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": finish_reason,
+            }],
+            "usage": usage,
+        })
+
+    async def stream(
+        self,
+        writer: asyncio.StreamWriter,
+        completion_id: str,
+        model: str,
+        tokens: List[str],
+        finish_reason: str,
+        usage: Optional[Dict],
+    ) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\nTransfer-Encoding: chunked\r\n\r\n"
+        )
+
+        def chunk(delta: Dict, finish: Optional[str] = None, chunk_usage: Optional[Dict] = None) -> Dict:
+            return {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [] if chunk_usage else [{"index": 0, "delta": delta, "finish_reason": finish}],
+                "usage": chunk_usage,
+            }
+
+        async def send_event(data: str) -> None:
+            payload = f"data: {data}\n\n".encode("utf-8")
+            writer.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+            await writer.drain()
+
+        await send_event(json.dumps(chunk({"role": "assistant", "content": ""})))
+        interval = 1.0 / self.tps if self.tps > 0 else 0.0
+        started = time.monotonic()
+        for i, token in enumerate(tokens):
+            # 一定の tokens/sec を保つ（sleep の誤差を累積させない）
+            delay = started + i * interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await send_event(json.dumps(chunk({"content": token}), ensure_ascii=False))
+        await send_event(json.dumps(chunk({}, finish_reason)))
+        if usage:
+            await send_event(json.dumps(chunk({}, chunk_usage=usage)))
+        await send_event("[DONE]")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    async def send_json(
+        writer: asyncio.StreamWriter, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        lines = [
+            f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+        ]
+        lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve_connection(stub: StubLLM, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """HTTP/1.1 keep-alive 接続を1本処理する。"""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0) or 0)
+            body = await reader.readexactly(length) if length else b""
+            await stub.handle(method, path.split("?", 1)[0], body, writer)
+            if headers.get("connection", "").lower() == "close":
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def run_server(stub: StubLLM, host: str, port: int) -> None:
+    server = await asyncio.start_server(lambda r, w: serve_connection(stub, r, w), host, port)
+    print(
+        f"LLM stub listening on http://{host}:{port}/v1 "
+        f"({len(stub.responses)} responses, ttft={stub.ttft}s, tps={stub.tps}, error_rate={stub.error_rate})"
+    )
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--script", type=Path, default=DEFAULT_SCRIPT, help="応答の台本（ディレクトリ / .jsonl / .txt）")
+    ap.add_argument("--ttft", type=float, default=0.3, help="最初のトークンまでの秒数")
+    ap.add_argument("--tps", type=float, default=80.0, help="出力トークン/秒（0 = 即時）")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="エラーを返す割合（0〜1）")
+    ap.add_argument("--error-status", default="429,503", help="注入するステータス（カンマ区切り）")
+    ap.add_argument("--retry-after", type=float, default=None, help="エラー時の Retry-After 秒")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--prompt-cache", action="store_true", help="cache_control ブレークポイントによるプレフィックスキャッシュを再現する")
+    ap.add_argument("--cache-ttl", type=float, default=300.0, help="プロンプトキャッシュの TTL 秒")
+    ap.add_argument("--cache-min-tokens", type=int, default=1024, help="キャッシュされる最小プレフィックス長")
+    args = ap.parse_args()
+
+    stub = StubLLM(
+        load_script(args.script),
+        ttft=args.ttft,
+        tps=args.tps,
+        error_rate=args.error_rate,
+        error_statuses=tuple(int(s) for s in args.error_status.split(",") if s.strip()),
+        retry_after=args.retry_after,
+        seed=args.seed,
+        prompt_cache=PromptCache(args.cache_ttl, args.cache_min_tokens) if args.prompt_cache else None,
+    )
+    try:
+        asyncio.run(run_server(stub, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+get_project_tree の .gitignore 判定とツリーのキャッシュの効果を計測する。
+
+合成した git リポジトリ（ソース 2k ファイル + 無視される generated/ と node_modules/ に既定 50k ファイルずつ）で比べる。
+
+    legacy   従来の実装: 毎回 `git ls-files --others --ignored --exclude-standard` で無視されるファイルを全部集める
+             （無視されたディレクトリの中にも降り、空になったディレクトリの骨組みを表示していた）
+    cold     GitIgnoreMatcher で判定しながら走査（無視されたディレクトリには降りない）
+    cached   2回目以降（読んだディレクトリと無視ファイルの mtime が同じなら描画済みのツリーを返す）
+
+ファイルを1つ追加すると次の呼び出しで作り直されること、git リポジトリの外でも .gitignore が効くことも確認する。
+
+    uv run python benchmarks/project_tree_bench.py --ignored 50000
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from companion.tools.get_project_tree import DEFAULT_EXCLUDES, _build_project_tree  # noqa: E402
+
+FILES_PER_DIR = 100
+
+
+def build_repo(root: Path, sources: int, ignored: int) -> None:
+    for prefix, count in (("src", sources), ("generated", ignored), ("node_modules", ignored)):
+        for i in range(count):
+            directory = root / prefix / f"part_{i // (FILES_PER_DIR * 10):03d}" / f"dir_{i // FILES_PER_DIR:04d}"
+            if i % FILES_PER_DIR == 0:
+                directory.mkdir(parents=True, exist_ok=True)
+            (directory / f"file_{i:06d}.py").write_text("", encoding="utf-8")
+    (root / ".gitignore").write_text("generated/\nnode_modules/\n*.tmp\n", encoding="utf-8")
+    (root / "src" / "scratch.tmp").write_text("", encoding="utf-8")
+
+
+def legacy_tree(abs_path: str, depth: int) -> str:
+    result = subprocess.run(
+        ["git", "ls-files", "--others", "--ignored", "--exclude-standard"],
+        cwd=abs_path, capture_output=True, text=True, check=False,
+    )
+    ignored_files = set(result.stdout.splitlines())
+
+    def build_tree(current: str, current_depth: int) -> list:
+        if current_depth > depth:
+            return []
+        items = []
+        with os.scandir(current) as it:
+            for entry in sorted(it, key=lambda e: (not e.is_dir(), e.name.lower())):
+                rel_path = os.path.relpath(entry.path, abs_path)
+                if (
+                    entry.name in DEFAULT_EXCLUDES
+                    or any(exclude in rel_path.split(os.sep) for exclude in DEFAULT_EXCLUDES)
+                    or rel_path in ignored_files
+                ):
+                    continue
+                if entry.is_dir():
+                    items.append(f"{entry.name}/")
+                    items.extend(f"{'  ' * current_depth}{child}" for child in build_tree(entry.path, current_depth + 1))
+                else:
+                    items.append(entry.name)
+        return items
+
+    return "\n".join(build_tree(abs_path, 1))
+
+
+def timed(label: str, func, *args) -> str:
+    started = time.perf_counter()
+    output = func(*args)
+    print(f"{label:8s} {(time.perf_counter() - started) * 1000:9.1f}ms  {len(output.splitlines())} lines")
+    return output
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", type=int, default=2_000)
+    parser.add_argument("--ignored", type=int, default=50_000)
+    parser.add_argument("--depth", type=int, default=3)
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="duckflow-tree-"))
+    root = tmp / "repo"
+    try:
+        started = time.perf_counter()
+        build_repo(root, args.sources, args.ignored)
+        subprocess.run(["git", "init", "-q", str(root)], check=True)
+        print(f"built repo in {time.perf_counter() - started:.1f}s")
+        time.sleep(1.1)  # 作った直後のディレクトリは mtime が新しすぎてキャッシュされない
+
+        legacy = timed("legacy", legacy_tree, str(root), args.depth)
+        cold = timed("cold", _build_project_tree, str(root), args.depth, True)
+        timed("cached", _build_project_tree, str(root), args.depth, True)
+        # legacy は無視されたディレクトリの中のファイルだけを消し、ディレクトリの骨組みは表示していた
+        extra = set(legacy.splitlines()) - set(cold.splitlines())
+        print(f"         legacy shows every entry of the new tree: {set(cold.splitlines()) <= set(legacy.splitlines())}, "
+              f"extra lines are all directories: {all(line.endswith('/') for line in extra)}")
+
+        (root / "src" / "added_later.py").write_text("", encoding="utf-8")
+        tree = timed("changed", _build_project_tree, str(root), args.depth, True)
+        print(f"         new file shown: {'added_later.py' in tree}, scratch.tmp hidden: {'scratch.tmp' not in tree}")
+
+        shutil.rmtree(root / ".git")
+        tree = timed("no git", _build_project_tree, str(root), args.depth, True)
+        print(f"         .gitignore applied outside git: {'generated/' not in tree}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
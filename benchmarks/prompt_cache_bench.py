@@ -0,0 +1,93 @@
+"""
+会話履歴へのローリング cache_control ブレークポイントの効果を計測する（llm_stub_server.py --prompt-cache と組み合わせる）。
+
+静的プレフィックス（Few-shot 末尾にブレークポイント）の後ろに会話履歴が伸びていく複数ターンのセッションを
+LLMClient(provider="openrouter") で再現し、ターンごとのキャッシュ読み出し率を表示する。
+途中で履歴の先頭を要約に置き換える（メモリの枝刈り）ターンを挟み、書き換え後にキャッシュが回復するかも確認する。
+比較対象は静的プレフィックスだけにブレークポイントを置く従来の挙動。
+
+    uv run python benchmarks/llm_stub_server.py --port 8765 --ttft 0 --tps 0 --prompt-cache &
+    uv run python benchmarks/prompt_cache_bench.py --base-url http://127.0.0.1:8765/v1 --turns 20
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from companion.base.http_pool import aclose_all  # noqa: E402
+from companion.base.llm_client import LLMClient  # noqa: E402
+from companion.prompts.cache_planner import CACHE_MARKER, CacheBreakpointPlanner  # noqa: E402
+
+
+def static_prefix(run_id: str) -> List[Dict]:
+    # run_id でプレフィックスを分け、2回の計測がスタブのキャッシュを共有しないようにする
+    return [
+        {"role": "system", "content": f"[{run_id}] Duckflow protocol. " + "Follow Sym-Ops strictly. " * 200},
+        {"role": "user", "content": "Example request."},
+        {"role": "assistant", "content": "::note Example answer.", "cache_control": dict(CACHE_MARKER)},
+    ]
+
+
+def turn_messages(turn: int, size: int) -> List[Dict]:
+    return [
+        {"role": "user", "content": f"Turn {turn}: " + f"tool result line {turn} " * size},
+        {"role": "assistant", "content": f"::note Step {turn} done. " + "reasoning " * (size // 2)},
+    ]
+
+
+async def run_session(client: LLMClient, planner: Optional[CacheBreakpointPlanner], args: argparse.Namespace, run_id: str) -> List[float]:
+    prefix = static_prefix(run_id)
+    history: List[Dict] = []
+    ratios = []
+    for turn in range(1, args.turns + 1):
+        history.extend(turn_messages(turn, args.turn_size))
+        if turn == args.prune_at:
+            # メモリの枝刈り: 古い半分を要約1件に置き換える
+            half = len(history) // 2
+            history = [{"role": "user", "content": "[Summary] " + "earlier work " * 50}] + history[half:]
+        marked = planner.apply(prefix, history) if planner else list(history)
+        messages = prefix + marked + [{"role": "user", "content": f"[SYSTEM]\nturn={turn}"}]
+
+        before_prompt = client.usage_stats["input_tokens"]
+        before_cached = client.usage_stats["cached_tokens"]
+        await client.chat(messages, raw=True, max_tokens=16)
+        prompt = client.usage_stats["input_tokens"] - before_prompt
+        cached = client.usage_stats["cached_tokens"] - before_cached
+        ratios.append(cached / prompt if prompt else 0.0)
+    return ratios
+
+
+async def run(args: argparse.Namespace) -> None:
+    baseline_client = LLMClient(api_key="stub", base_url=args.base_url, model="stub", provider="openrouter")
+    rolling_client = LLMClient(api_key="stub", base_url=args.base_url, model="stub", provider="openrouter")
+    baseline = await run_session(baseline_client, None, args, "static-only")
+    rolling = await run_session(rolling_client, CacheBreakpointPlanner(), args, "rolling")
+    await aclose_all()
+
+    print(f"{'turn':>4}  {'static only':>11}  {'rolling':>8}")
+    for turn, (b, r) in enumerate(zip(baseline, rolling), start=1):
+        mark = "  <- pruned" if turn == args.prune_at else ""
+        print(f"{turn:>4}  {b:>11.0%}  {r:>8.0%}{mark}")
+
+    def overall(client: LLMClient) -> float:
+        stats = client.usage_stats
+        return stats["cached_tokens"] / stats["input_tokens"] if stats["input_tokens"] else 0.0
+
+    print(f"overall cached ratio: static only={overall(baseline_client):.0%} rolling={overall(rolling_client):.0%}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--base-url", default="http://127.0.0.1:8765/v1")
+    ap.add_argument("--turns", type=int, default=20)
+    ap.add_argument("--turn-size", type=int, default=120, help="1ターンで履歴に増えるメッセージの大きさ（繰り返し数）")
+    ap.add_argument("--prune-at", type=int, default=12, help="このターンで履歴の先頭を要約に置き換える（0 で無効）")
+    args = ap.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+read_file のページング（start/end）のコストを、ファイル内の位置ごとに比較する。
+
+    islice  従来の挙動: 先頭から islice で全行をデコードして読み飛ばす
+    index   LineIndex: 1回だけ行オフセットを作り（cold）、以降は seek + read（warm）
+
+合成したログ（既定 500MB）の先頭・中央・末尾のページを読む時間を表示する。
+
+    uv run python benchmarks/read_file_paging_bench.py --size-mb 500
+    uv run python benchmarks/read_file_paging_bench.py --file path/to/big.log
+"""
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from companion.utils.line_index import LineIndexCache  # noqa: E402
+
+
+def build_log(path: str, size_mb: int) -> None:
+    line = "2026-01-01T00:00:00.000Z INFO  worker-07 request handled id={:09d} status=200 latency_ms=12\n"
+    target = size_mb * 1024 * 1024
+    written = 0
+    i = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            block = "".join(line.format(i + k) for k in range(10000))
+            f.write(block)
+            written += len(block)
+            i += 10000
+
+
+def islice_page(path: str, start: int, count: int) -> Tuple[List[str], bool]:
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [l.rstrip("\n") for l in itertools.islice(f, start - 1, start - 1 + count)]
+        try:
+            next(f)
+            return lines, True
+        except StopIteration:
+            return lines, False
+
+
+def timed(func, *args) -> Tuple[float, object]:
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", help="既存のファイルを使う（省略時は合成ログを一時ファイルに作る）")
+    parser.add_argument("--size-mb", type=int, default=500)
+    parser.add_argument("--page", type=int, default=300, help="1ページの行数（read_file の end）")
+    args = parser.parse_args()
+
+    path = args.file
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix="duckflow-paging-", suffix=".log")
+        os.close(fd)
+        started = time.perf_counter()
+        build_log(path, args.size_mb)
+        print(f"built {os.path.getsize(path) / 1024 / 1024:.0f}MB log in {time.perf_counter() - started:.1f}s")
+
+    try:
+        cache = LineIndexCache()
+        cold, index = timed(cache.get, path)
+        total = index.line_count
+        print(f"{total} lines, index {len(index.offsets) * index.offsets.itemsize / 1024 / 1024:.1f}MB, built in {cold:.2f}s")
+
+        for label, start in (("first", 1), ("middle", total // 2), ("last", max(1, total - args.page + 1))):
+            t_islice, expected = timed(islice_page, path, start, args.page)
+            t_index, actual = timed(lambda: cache.get(path).read_lines(start, args.page))
+            assert actual == expected, f"page mismatch at line {start}"
+            print(f"{label:6s} page @ {start:>10d}: islice {t_islice * 1000:9.1f}ms   index {t_index * 1000:7.2f}ms")
+    finally:
+        if args.file is None:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Sym-Ops パーサーの出力一致を確認するスクリプト。
+
+1. benchmarks/corpus/symops/ の応答を SymOpsProcessor.process で処理し、
+   expected.json（旧パイプラインの出力）と比較する。
+2. ランダムに組み立てた Sym-Ops 風テキスト（LLM の典型的な崩れを含む）を
+   旧パイプライン（symops_legacy.py）と比較する。
+3. 同じテキストをランダムなチャンク長で IncrementalSymOpsParser に feed し、
+   結果とストリーム中に出たアクションを比較する。
+
+    uv run python benchmarks/symops_equivalence.py --cases 5000 --seed 1
+"""
+import argparse
+import dataclasses
+import json
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from companion.utils.sym_ops import SymOpsProcessor  # noqa: E402
+from companion.utils.sym_ops_stream import IncrementalSymOpsParser  # noqa: E402
+
+from symops_legacy import legacy_process  # noqa: E402
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus" / "symops"
+
+FRAGMENTS = [
+    ">> ファイルを確認します",
+    "  >> indented thought",
+    "::c0.9 ::s0.8 ::m0.7 ::f0.9",
+    "::c 0.85 ::s 0.4",
+    "Confidence: 95%",
+    "safety: 0.3",
+    "#c0.5 #f 0.6",
+    "confidence:",
+    "Memory:   ",
+    "::c",
+    "::s ",
+    "#f",
+    "0.9",
+    "::read_file @src/main.py",
+    "::read_file @src/main.py 10 50",
+    "  ::list_directory @.",
+    "::write_file @a.py",
+    "::edit_file @b.py > 1",
+    "::run_command pytest -q",
+    "run_command ls -la",
+    "read_file @ notes.md",
+    "$ echo hi",
+    "::response",
+    "::finish @done",
+    "::mark_task_complete @0",
+    "::execute_batch",
+    "%%%",
+    "%%%read_file @x.py",
+    "  %%%",
+    "<<<",
+    ">>>",
+    "    >>> doctest()",
+    "x >>> y",
+    "<<< inline",
+    "```python",
+    "```",
+    "```bash",
+    "text ```py",
+    "a```b",
+    "---",
+    "anchors: \"1:ab 2:cd\"",
+    "mode: strict",
+    "def foo():",
+    "    return 1",
+    "",
+    "",
+    "   ",
+    "? 確認してもよいですか",
+    "! error found",
+    "Sure! Here's the plan:",
+    "# Heading",
+    "## 要約",
+    "* item",
+    "1. step",
+    "[REPORT] 完了しました",
+    "plain text line",
+    "\t",
+    "line with trailing space   ",
+    "crlf line\r",
+]
+
+
+def random_text(rng: random.Random) -> str:
+    n = rng.randint(0, 30)
+    lines = [rng.choice(FRAGMENTS) for _ in range(n)]
+    text = "\n".join(lines)
+    if rng.random() < 0.3:
+        text = "```\n" + text + "\n```"
+    if rng.random() < 0.3:
+        text += "\n" * rng.randint(1, 3)
+    if rng.random() < 0.2:
+        text = "\n" * rng.randint(1, 2) + text
+    return text
+
+
+def chunked(text: str, rng: random.Random):
+    i = 0
+    while i < len(text):
+        size = rng.choice([1, 2, 3, 7, 16, 64, 1000])
+        yield text[i:i + size]
+        i += size
+
+
+def without_batch(actions):
+    """旧パイプラインにない Action.batch（execute_batch の番号）を比較対象から外す。"""
+    return [dataclasses.replace(a, batch=None) for a in actions]
+
+
+def summarize(result):
+    return (
+        result.thoughts,
+        result.vitals,
+        without_batch(result.actions),
+        result.questions,
+        result.errors,
+        result.warnings,
+    )
+
+
+def check_corpus() -> int:
+    expected = json.loads((CORPUS_DIR / "expected.json").read_text(encoding="utf-8"))
+    failures = 0
+    for name, want in sorted(expected.items()):
+        text = (CORPUS_DIR / name).read_text(encoding="utf-8")
+        got = dataclasses.asdict(SymOpsProcessor().process(text))
+        for action in got["actions"]:
+            action.pop("batch")
+        if got != want:
+            failures += 1
+            print(f"--- corpus mismatch: {name} ---")
+            print("expected:", want)
+            print("actual:  ", got)
+    print(f"corpus: {len(expected)} files, {failures} mismatches")
+    return failures
+
+
+def check_random(cases: int, seed: int) -> int:
+    rng = random.Random(seed)
+    failures = 0
+    for case in range(cases):
+        text = random_text(rng)
+        expected = legacy_process(text)
+        batch = SymOpsProcessor().process(text)
+
+        parser = IncrementalSymOpsParser()
+        events = []
+        for chunk in chunked(text, rng):
+            events.extend(parser.feed(chunk))
+        events.extend(parser.close())
+        actual = parser.result()
+
+        streamed_actions = [e.value for e in events if e.kind == "action"]
+        if (summarize(batch) != summarize(expected)
+                or summarize(actual) != summarize(expected)
+                or without_batch(streamed_actions) != expected.actions):
+            failures += 1
+            if failures <= 5:
+                print(f"--- mismatch (case {case}) ---")
+                print(repr(text))
+                print("expected:", summarize(expected))
+                print("batch:   ", summarize(batch))
+                print("chunked: ", summarize(actual))
+                print("events:  ", streamed_actions)
+
+    print(f"random: {cases} cases, {failures} mismatches")
+    return failures
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--cases", type=int, default=2000)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    failures = check_corpus() + check_random(args.cases, args.seed)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
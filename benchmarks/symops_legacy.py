@@ -0,0 +1,301 @@
+"""
+Sym-Ops 旧パイプラインの凍結コピー（比較・ベンチマーク用）
+
+AutoRepair を1パスのステートマシンに置き換える前の実装をそのまま残したもの。
+symops_equivalence.py / symops_parse_bench.py から参照する。
+companion 本体からは import しないこと。
+"""
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from companion.utils.preprocessor import PlainMarkdownConverter, SymOpsPreprocessor  # noqa: E402
+from companion.utils.sym_ops import Action, FuzzyParser, ParsedResult  # noqa: E402
+
+
+class LegacyAutoRepair:
+    """
+    Pattern-based auto-repair engine v2.1
+    Automatically fixes typical LLM output errors with higher tolerance.
+    """
+    
+    def repair(self, text: str) -> str:
+        """Apply all repair rules"""
+        text = self._fix_markdown_blocks(text)
+        text = self._fix_missing_symbols(text)
+        text = self._fix_vitals_format(text)
+        text = self._fix_delimiters(text)
+        text = self._fix_indentation(text)
+        text = self._fix_unclosed_blocks(text)
+        return text
+    
+    def _fix_unclosed_blocks(self, text: str) -> str:
+        """Ensure all <<< blocks are closed with >>> at the end of text."""
+        open_count = text.count('<<<')
+        close_count = text.count('>>>')
+        
+        if open_count > close_count:
+            # Add missing closing delimiters
+            text = text.rstrip() + '\n' + ('>>>\n' * (open_count - close_count))
+        return text
+
+    def _fix_markdown_blocks(self, text: str) -> str:
+        """Convert Markdown code blocks to v2 format"""
+        # Improved regex to handle language identifier better
+        pattern = r'```[\w\-]*\n(.*?)(?:```|$)'
+        
+        def replace_block(match):
+            content = match.group(1).rstrip('\n')
+            return f'<<<\n{content}\n>>>'
+        
+        return re.sub(pattern, replace_block, text, flags=re.DOTALL | re.MULTILINE)
+    
+    def _fix_missing_symbols(self, text: str) -> str:
+        """Complement missing symbols from action lines v2.1 v2.1"""
+        lines = text.split('\n')
+        fixed_lines = []
+        
+        # Expanded action verbs with common variants
+        action_verbs = {
+            'create', 'edit', 'delete', 'remove', 'update', 'write', 'read',
+            'run', 'execute', 'test', 'check', 'verify', 'finish', 'response', 'report',
+            'propose_plan', 'duck_call', 'create_file', 'edit_file', 'delete_file',
+            'run_command', 'read_file', 'list_directory', 'get_project_tree',
+            'execute_batch', 'note', 'search_archives', 'recall'
+        }
+        
+        for line in lines:
+            stripped = line.strip()
+            
+            # Already has protocol prefix
+            if stripped.startswith('::') or stripped.startswith('>>') or stripped.startswith('<<<'):
+                fixed_lines.append(line)
+                continue
+            
+            # Support $ as a prefix (common LLM mistake)
+            if stripped.startswith('$'):
+                indent = line[:len(line) - len(line.lstrip())]
+                line = indent + ':: ' + line.lstrip().replace('$', '', 1).strip()
+                fixed_lines.append(line)
+                continue
+            
+            # Look for "verb @ path" or "verb path"
+            # Support case-insensitive and leading whitespace
+            match = re.match(r'^(' + '|'.join(action_verbs) + r')\b\s*(?:@\s*)?([^\n]+)?', stripped, re.IGNORECASE)
+            
+            if match:
+                action, rest = match.groups()
+                indent = line[:len(line) - len(line.lstrip())]
+                if rest:
+                    line = f'{indent}:: {action.lower()} @ {rest.strip()}'
+                else:
+                    line = f'{indent}:: {action.lower()}'
+            
+            fixed_lines.append(line)
+        
+        return '\n'.join(fixed_lines)
+    
+    def _fix_delimiters(self, text: str) -> str:
+        """Normalize delimiters to v3.2 format.
+        - `>>>` はインデントなし行頭のみをブロック終端として認識する（Python doctest保護）。
+        - execute_batch ブロック内の %%% はバッチ区切りとして保護する。
+        - `---` は変換せずコンテンツとして pass-through（Markdown水平線保護）。
+        """
+        lines = text.split('\n')
+        fixed = []
+        in_batch_block = False   # ::execute_batch の <<< ～ >>> 内かどうか
+        in_block = False          # 通常の <<< ～ >>> 内かどうか
+
+        for line in lines:
+            stripped = line.strip()
+
+            # execute_batch ブロック追跡
+            if stripped == '::execute_batch':
+                in_batch_block = True
+                fixed.append(line)
+                continue
+
+            if stripped == '<<<':
+                in_block = True
+                fixed.append(line)
+                continue
+
+            # v3.2: >>> は行頭（column 0）のみブロック終端として認識する
+            if line.rstrip() == '>>>':
+                if in_batch_block and in_block:
+                    in_batch_block = False
+                in_block = False
+                fixed.append(line)
+                continue
+
+            # execute_batch ブロック内の %%% はバッチ区切りとして保護
+            if in_batch_block and in_block and stripped == '%%%':
+                fixed.append('%%%')
+                continue
+
+            # バッククォートのコードブロックは <<< >>> に変換
+            if stripped.startswith('```'):
+                fixed.append('<<<')
+            else:
+                fixed.append(line)
+
+        return '\n'.join(fixed)
+    
+    def _fix_indentation(self, text: str) -> str:
+        """Remove unnecessary indentation from protocol symbol lines v2.
+
+        コンテンツブロック（<<< ～ >>>）の内側はインデントを保護する。
+        LLMがプロトコル記号を誤ってインデントした場合のみ補正する。
+        """
+        lines = text.split('\n')
+        fixed_lines = []
+        in_block = False  # <<< ～ >>> 内かどうか
+
+        for line in lines:
+            stripped = line.strip()
+
+            # <<< でブロック開始
+            if stripped == '<<<':
+                in_block = True
+                fixed_lines.append(line)
+                continue
+
+            # v3.2: >>> は行頭のみブロック終端として認識（doctest保護）
+            if line.rstrip() == '>>>':
+                in_block = False
+                fixed_lines.append(line)
+                continue
+
+            # コンテンツブロック内は一切変更しない（インデント保護）
+            if in_block:
+                fixed_lines.append(line)
+                continue
+
+            # ブロック外のプロトコル記号の不要インデントを除去
+            if re.match(r'^\s*[:>@!?<-]', line):
+                line = line.lstrip()
+            fixed_lines.append(line)
+
+        return '\n'.join(fixed_lines)
+    
+    def _fix_vitals_format(self, text: str) -> str:
+        """Normalize Duck Vitals format with tolerance for natural language and percentages."""
+        # 1. Natural language: "Confidence: 95%" -> "::c0.95"
+        def norm_percent(match):
+            key_map = {'confidence': 'c', 'safety': 's', 'memory': 'm', 'focus': 'f'}
+            key = match.group(1).lower()
+            val = float(match.group(2)) / 100.0
+            return f'::{key_map[key]}{val:.2f}'
+
+        text = re.sub(r'\b(confidence|safety|memory|focus):\s*(\d+)%', norm_percent, text, flags=re.IGNORECASE)
+        
+        # 2. Natural language: "Confidence: 0.95" -> "::c0.95"
+        def norm_plain(match):
+            key_map = {'confidence': 'c', 'safety': 's', 'memory': 'm', 'focus': 'f'}
+            key = match.group(1).lower()
+            val = match.group(2)
+            return f'::{key_map[key]}{val}'
+
+        text = re.sub(r'\b(confidence|safety|memory|focus):\s*([\d.]+)', norm_plain, text, flags=re.IGNORECASE)
+
+        # 3. Handle #c0.9 style
+        text = re.sub(r'#([cmfs])\s*([\d.]+)', r'::\1\2', text)
+        
+        # 4. Standardize spacing: "::c 0.9" -> "::c0.9"
+        text = re.sub(r'::([cmfs])\s+([\d.]+)', r'::\1\2', text)
+        
+        return text
+
+
+class LegacyParser(FuzzyParser):
+    """FuzzyParser with the original full-text strict_parse."""
+
+    def strict_parse(self, text: str) -> ParsedResult:
+        """Strict parse v3.1 format. execute_batch ブロックを認識する。"""
+        result = ParsedResult(thoughts=[], vitals={}, actions=[], questions=[], errors=[])
+        current_action = None
+        in_content = False
+        content_buffer = []
+        lines = text.split('\n')
+        i = 0
+
+        while i < len(lines):
+            line = lines[i]
+            stripped = line.strip()
+
+            if stripped == '<<<':
+                if not current_action:
+                    # Robustness: Create a default action if content starts without one
+                    current_action = Action(type="response", path="")
+                in_content = True
+                i += 1
+                continue
+
+            # v3.2: >>> は行頭（column 0）のみブロック終端として認識する（doctest保護）
+            if line.rstrip() == '>>>':
+                if not in_content:
+                    i += 1
+                    continue # Ignore orphan >>>
+                
+                if current_action:
+                    if current_action.type == 'execute_batch':
+                        # バッチブロックを %%% で分割してサブアクションに展開
+                        batch_actions = self._split_batch_content('\n'.join(content_buffer))
+                        result.actions.extend(batch_actions)
+                    else:
+                        raw_content = '\n'.join(content_buffer)
+                        yaml_params, body = self._extract_yaml_frontmatter(raw_content)
+                        current_action.content = body
+                        # YAML フロントマターのパラメーターをインライン params にマージ（YAML優先）
+                        current_action.params = {**current_action.params, **yaml_params}
+                        result.actions.append(current_action)
+                    current_action = None
+                content_buffer = []
+                in_content = False
+                i += 1
+                continue
+
+            if in_content:
+                content_buffer.append(line)
+                i += 1
+                continue
+
+            if stripped.startswith('>>'):
+                result.thoughts.append(stripped[2:].strip())
+            elif stripped.startswith('::'):
+                if self._is_vitals(stripped):
+                    self._parse_vitals(stripped, result.vitals)
+                else:
+                    if current_action:
+                        # 前のアクションにコンテンツブロックがなかった
+                        # コンテンツなしの単体アクションとして追加する
+                        result.actions.append(current_action)
+                    current_action = self._parse_action(stripped)
+            elif stripped.startswith('?'):
+                result.questions.append(stripped[1:].strip())
+            elif stripped.startswith('!'):
+                result.errors.append(stripped[1:].strip())
+            i += 1
+
+        # ループ終了時に未追加のアクションがあれば追加（コンテンツブロックなしの単体アクション）
+        if current_action:
+            result.actions.append(current_action)
+
+        return result
+
+
+def legacy_process(raw_output: str) -> ParsedResult:
+    """SymOpsProcessor.process の旧実装（strict parse 経路）。"""
+    converted, was_converted = PlainMarkdownConverter().convert(raw_output)
+    if was_converted:
+        raw_output = converted
+    preprocessed, corrections = SymOpsPreprocessor().preprocess(raw_output)
+    repaired = LegacyAutoRepair().repair(preprocessed)
+    parsed = LegacyParser().strict_parse(repaired)
+    if was_converted:
+        parsed.warnings.append("Converted from plain markdown/text")
+    if corrections:
+        parsed.warnings.append(f"Preprocessing: {', '.join(corrections)}")
+    return parsed
@@ -0,0 +1,74 @@
+"""
+Sym-Ops パーサーのスループット計測。
+
+benchmarks/corpus/symops/ の応答を連結・複製して 1KB〜200KB の入力を作り、
+SymOpsProcessor.process（1パス）と旧パイプライン（symops_legacy.py）の
+MB/s と 1回あたりの p50 / p99 レイテンシを比較する。
+
+    uv run python benchmarks/symops_parse_bench.py --repeat 50
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from companion.utils.sym_ops import SymOpsProcessor  # noqa: E402
+
+from symops_legacy import legacy_process  # noqa: E402
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus" / "symops"
+SIZES_KB = (1, 8, 32, 200)
+
+
+def build_input(size_kb: int) -> str:
+    """コーパスの Sym-Ops 応答（:: を含むもの）を指定サイズまで連結する。"""
+    payloads = [
+        p.read_text(encoding="utf-8").strip()
+        for p in sorted(CORPUS_DIR.glob("*.txt"))
+    ]
+    payloads = [p for p in payloads if any(l.strip().startswith("::") for l in p.split("\n"))]
+    target = size_kb * 1024
+    parts = []
+    total = 0
+    while total < target:
+        for p in payloads:
+            parts.append(p)
+            total += len(p) + 1
+            if total >= target:
+                break
+    return "\n".join(parts)
+
+
+def measure(fn, text: str, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    p50 = statistics.median(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    mb_s = len(text.encode("utf-8")) / 1e6 / p50
+    return mb_s, p50 * 1000, p99 * 1000
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=30)
+    args = ap.parse_args()
+
+    processor = SymOpsProcessor()
+    print(f"{'size':>6}  {'engine':<8} {'MB/s':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for size_kb in SIZES_KB:
+        text = build_input(size_kb)
+        for name, fn in (("legacy", legacy_process), ("1-pass", processor.process)):
+            mb_s, p50, p99 = measure(fn, text, args.repeat)
+            print(f"{size_kb:>4}KB  {name:<8} {mb_s:>8.2f} {p50:>9.2f} {p99:>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
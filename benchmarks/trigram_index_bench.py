@@ -0,0 +1,87 @@
+"""
+trigram インデックス（llm.grep.trigram_index）の効果を計測する。
+
+合成したコードベース（既定 10k ファイル × 100 行 = 100 万行）に対して FileOps.grep_files を実行し、
+インデックスなし（毎回全ファイルを検索）/ 初回（インデックス作成）/ 2回目以降（候補だけ検索）の時間を比べる。
+途中で1ファイルを書き換え、差分だけ読み直して結果に反映されることも確認する。
+
+    uv run python benchmarks/trigram_index_bench.py --files 10000 --lines 100
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from companion.base.io_executor import shutdown_io_executor  # noqa: E402
+from companion.tools.file_ops import FileOps  # noqa: E402
+
+FILES_PER_DIR = 500
+PATTERNS = [r"def \w+_handler", r"class RequestRouter", r"(fetch|store)_record_\d+", r"TODO\(duck\)"]
+
+
+def build_tree(root: Path, files: int, lines: int) -> None:
+    for i in range(files):
+        directory = root / f"pkg_{i // FILES_PER_DIR:04d}"
+        if i % FILES_PER_DIR == 0:
+            directory.mkdir(parents=True, exist_ok=True)
+        body = [f"def compute_{i}_{j}(value):\n    return value * {j} + {i}\n" for j in range(lines // 2)]
+        if i % 1000 == 0:
+            body.append(f"def event_{i}_handler(event):\n    return event\n")
+        if i % 2500 == 0:
+            body.append("class RequestRouter:\n    pass\n")
+        if i % 333 == 0:
+            body.append(f"    fetch_record_{i}()  # TODO(duck)\n")
+        (directory / f"module_{i:06d}.py").write_text("".join(body), encoding="utf-8")
+
+
+async def run_patterns(ops: FileOps, label: str) -> None:
+    for pattern in PATTERNS:
+        started = time.perf_counter()
+        output = await ops.grep_files(pattern, ".", "*.py", True, 1000)
+        matches = output.rsplit("\n", 1)[-1]
+        print(f"  {label:10s} {pattern:28s} {(time.perf_counter() - started) * 1000:9.1f}ms  {matches}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=10_000)
+    parser.add_argument("--lines", type=int, default=100)
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="duckflow-trigram-"))
+    root = tmp / "workspace"
+    started = time.perf_counter()
+    build_tree(root, args.files, args.lines)
+    print(f"built {args.files} files x {args.lines} lines in {time.perf_counter() - started:.1f}s")
+
+    os.environ["DUCKFLOW_LLM_GREP_INDEX_DIR"] = str(tmp / "index")
+    ops = FileOps(str(root))
+    try:
+        os.environ["DUCKFLOW_LLM_GREP_TRIGRAM_INDEX"] = "false"
+        print("full scan:")
+        await run_patterns(ops, "scan")
+
+        os.environ["DUCKFLOW_LLM_GREP_TRIGRAM_INDEX"] = "true"
+        started = time.perf_counter()
+        await ops.grep_files("zzz_build_index", ".", "*.py", True, 1)
+        print(f"index built in {time.perf_counter() - started:.1f}s")
+        print("with index:")
+        await run_patterns(ops, "indexed")
+
+        # 1ファイルだけ書き換える（そのファイルだけ読み直される）
+        await ops.write_file("pkg_0000/module_000001.py", "def late_handler(event):\n    return event\n")
+        print("after editing one file:")
+        await run_patterns(ops, "indexed")
+    finally:
+        shutdown_io_executor()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
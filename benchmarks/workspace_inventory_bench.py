@@ -0,0 +1,114 @@
+"""
+共有のディレクトリ一覧（WorkspaceInventory）の効果を計測する。
+
+合成したツリー（既定 20k ファイル / 400 ディレクトリ）に対して、1回のループの中でツールが何度も
+ツリーを辿る状況を再現し、従来の走査（iterdir + エントリごとの is_file / is_dir）と比べる。
+
+    legacy     従来の find_files: 呼び出しごとに全ディレクトリを iterdir し、エントリごとに stat する
+    cold       インベントリが空の状態の find_files（scandir で一覧を作る）
+    warm       2回目以降（ディレクトリを stat して mtime が同じなら一覧を使い回す）
+
+途中でファイルを1つ追加し、次の find_files / grep_files にすぐ反映されることも確認する。
+
+    uv run python benchmarks/workspace_inventory_bench.py --files 20000 --repeat 10
+"""
+import argparse
+import asyncio
+import shutil
+import sys
+import tempfile
+import time
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from companion.base.io_executor import shutdown_io_executor  # noqa: E402
+from companion.tools.file_ops import FileOps  # noqa: E402
+from companion.tools.get_project_tree import _build_project_tree  # noqa: E402
+from companion.utils.workspace_inventory import get_workspace_inventory  # noqa: E402
+
+FILES_PER_DIR = 50
+
+
+def build_tree(root: Path, files: int) -> None:
+    for i in range(files):
+        directory = root / f"pkg_{i // (FILES_PER_DIR * 20):03d}" / f"mod_{i // FILES_PER_DIR:05d}"
+        if i % FILES_PER_DIR == 0:
+            directory.mkdir(parents=True, exist_ok=True)
+        suffix = ".py" if i % 4 else ".md"
+        (directory / f"file_{i:06d}{suffix}").write_text(f"value = {i}\n", encoding="utf-8")
+
+
+def legacy_find_files(root: Path, pattern: str) -> List[str]:
+    results: List[str] = []
+
+    def search_dir(directory: Path, depth: int = 0) -> None:
+        if depth > 10:
+            return
+        for item in directory.iterdir():
+            if item.name.startswith("."):
+                continue
+            if item.is_file() and fnmatch(item.name, pattern):
+                results.append(str(item.relative_to(root)))
+            if item.is_dir():
+                search_dir(item, depth + 1)
+
+    search_dir(root)
+    return sorted(results)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=10, help="1回のループで find_files を呼ぶ回数")
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="duckflow-inventory-"))
+    root = tmp / "workspace"
+    started = time.perf_counter()
+    build_tree(root, args.files)
+    print(f"built {args.files} files in {time.perf_counter() - started:.1f}s")
+
+    ops = FileOps(str(root))
+    inventory = get_workspace_inventory()
+    try:
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            legacy = legacy_find_files(root, "*.py")
+        print(f"legacy    {(time.perf_counter() - started) / args.repeat * 1000:8.1f}ms/call  {len(legacy)} files")
+
+        started = time.perf_counter()
+        found = await ops.find_files("*.py")
+        print(f"cold      {(time.perf_counter() - started) * 1000:8.1f}ms/call  {len(found)} files")
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            found = await ops.find_files("*.py")
+        print(f"warm      {(time.perf_counter() - started) / args.repeat * 1000:8.1f}ms/call  {len(found)} files")
+        print(f"          same results as legacy: {found == legacy}")
+        print(f"          directory scans {inventory.scans}, cached listings reused {inventory.hits}")
+
+        # 他のツールも同じ一覧を使う（ディスクを走査し直さない）
+        scans = inventory.scans
+        started = time.perf_counter()
+        await ops.list_files("pkg_000")
+        _build_project_tree(str(root), 3, False)
+        await ops.grep_files("value = 1$", ".", "*.py", True, 10)
+        print(f"list_directory + get_project_tree + grep_files {(time.perf_counter() - started) * 1000:.1f}ms, "
+              f"new directory scans {inventory.scans - scans}")
+
+        # 外部からの追加（ディレクトリの mtime が変わる）はすぐ反映される
+        time.sleep(1.1)
+        (root / "pkg_000" / "mod_00000" / "added_later.py").write_text("value = -1\n", encoding="utf-8")
+        found = await ops.find_files("added_*.py")
+        grep = await ops.grep_files("value = -1", ".", "*.py", True, 10)
+        print(f"after adding a file: find_files {found}, grep_files {grep.splitlines()[0]!r}")
+    finally:
+        shutdown_io_executor()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""
+ActionStream - ストリーミング応答から Sym-Ops アクションを逐次取り出す
+
+LLM のストリーミング出力を IncrementalSymOpsParser に流し込み、
+確定したアクションから順に内部 Action として yield する。
+パーサーの最終結果はバッチ処理（SymOpsProcessor.process）と同一なので、
+ストリーム完了後に全文を再パースする必要はない。
+
+ストリームが途中で失敗した場合はパーサーを close しない（AutoRepair が未閉じの <<< ブロックを補完して、
+途中で切れた write_file などの本文が実行されてしまうため）。確定済みのアクションだけを残し、
+書きかけのアクションは捨てて error に例外を入れる。
+"""
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from companion.state.agent_state import ActionList, Action
+from companion.utils.sym_ops_stream import IncrementalSymOpsParser, ParseEvent
+
+logger = logging.getLogger(__name__)
+
+
+class ActionStream:
+    """
+    Async iterator over internal Actions parsed from a streaming LLM response.
+
+    Attributes available during/after iteration:
+        vitals:      ストリーム中に受信したバイタル
+        thoughts:    ストリーム中に受信した思考 (>> 行)
+        action_list: ストリーム完了後の最終 ActionList
+        error:       ストリームが途中で失敗した場合の例外（書きかけのアクションは捨てられている）
+    """
+
+    def __init__(self, client: Any, chunks: AsyncIterator[str], messages: List[Dict[str, str]]):
+        self._client = client
+        self._chunks = chunks
+        self._messages = messages
+        self._parser = IncrementalSymOpsParser()
+        self._emitted: List[Action] = []
+        self.vitals: Dict[str, float] = {}
+        self.thoughts: List[str] = []
+        self.action_list: Optional[ActionList] = None
+        self.error: Optional[Exception] = None
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        error: Optional[Exception] = None
+        try:
+            async for chunk in self._chunks:
+                for action in self._handle_events(self._parser.feed(chunk)):
+                    yield action
+        except Exception as e:
+            logger.error(f"Streaming LLM response failed: {e}")
+            error = e
+
+        content = self._parser.text
+        if not content.strip() and not self._emitted:
+            # 何も受信できなかった: 非ストリーミング経路（空応答リトライ込み）にフォールバック
+            if error is not None:
+                logger.warning("Falling back to non-streaming request after stream error")
+            else:
+                logger.warning("Empty streaming response; falling back to non-streaming request")
+            self.action_list = await self._client.chat(self._messages, response_model=ActionList)
+            for action in self.action_list.actions:
+                yield action
+            return
+
+        if error is not None:
+            # 途中で切れた応答は補完しない: 確定済みのアクションだけで終える
+            self.error = error
+            logger.info(f"📥 Raw LLM Response (interrupted):\n{content}")
+            logger.warning(
+                f"Stream interrupted after {len(self._emitted)} complete action(s); discarding the unfinished remainder"
+            )
+            self.action_list = ActionList(
+                reasoning="\n".join(self.thoughts) if self.thoughts else "No reasoning provided.",
+                actions=list(self._emitted),
+                vitals=self.vitals,
+            )
+            return
+
+        for action in self._handle_events(self._parser.close()):
+            yield action
+
+        result = self._parser.result()
+        logger.info(f"📥 Raw LLM Response (FULL):\n{content}")
+        for warning in result.warnings:
+            logger.warning(f"⚠️ Sym-Ops Warning: {warning}")
+        logger.info(f"✅ Parsed streamed Sym-Ops response. Actions: {len(result.actions)}")
+
+        self.action_list = ActionList(
+            reasoning="\n".join(self.thoughts) if self.thoughts else "No reasoning provided.",
+            actions=list(self._emitted),
+            vitals=self.vitals,
+        )
+
+    def _handle_events(self, events: List[ParseEvent]) -> List[Action]:
+        """パーサーのイベントを反映し、新たに確定した内部 Action を返す。"""
+        actions = []
+        for event in events:
+            if event.kind == "thought":
+                self.thoughts.append(event.value)
+            elif event.kind == "vitals":
+                self.vitals.update(event.value)
+            elif event.kind == "action":
+                action = self._client._to_internal_action(event.value)
+                self._emitted.append(action)
+                actions.append(action)
+        return actions
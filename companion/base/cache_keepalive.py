@@ -0,0 +1,132 @@
+"""
+Prompt-cache keep-alive while waiting for user input.
+
+プロバイダーのプロンプトキャッシュ（Anthropic の ephemeral など）は数分で期限切れになる。
+ユーザーが出力を読んでいる間に期限が切れると、次のターンは履歴全体を非キャッシュ価格で送り直す。
+CacheKeepAlive は入力待ちの間だけ、TTL が切れる少し前に同じプレフィックスで max_tokens=1 の
+リクエストを送り、キャッシュを延命する。
+
+送るかどうかは毎回見積もる:
+    節約額 = 観測したキャッシュ率 × プレフィックス × (通常価格 − キャッシュ読み出し価格)
+    1回のコスト = キャッシュ済み部分の読み出し + 非キャッシュ部分の通常価格
+この入力待ちで送った回数 +1 回分のコストが節約額を超えるなら送らない（長く離席するほど打ち切られる）。
+セッション全体の上限（max_cost）を超える場合と、キャッシュヒットがまだ観測されていない場合も送らない。
+
+設定（duckflow.yaml の llm.cache_keepalive）:
+    enabled:            true で有効
+    ttl_seconds:        プロバイダーのキャッシュ TTL（秒）
+    margin_seconds:     TTL のこの秒数前に送る
+    max_idle_minutes:   入力待ちがこれより長くなったら送らない
+    max_cost:           セッションあたりのキープアライブ費用の上限（USD）
+    cached_price_ratio: 価格が不明なときに使う「キャッシュ読み出し / 通常」の価格比
+"""
+import asyncio
+import contextlib
+import logging
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from companion.base.token_counter import get_token_counter
+from companion.base.usage_ledger import estimate_cost
+from companion.config.config_loader import config
+
+logger = logging.getLogger(__name__)
+
+
+class CacheKeepAlive:
+    """Refreshes the provider prompt cache while the agent is idle, when it pays for itself."""
+
+    def __init__(self, llm_client):
+        self.llm = llm_client
+        self.spent = 0.0
+        self.pings = 0
+
+    @property
+    def enabled(self) -> bool:
+        return config.get_bool("llm.cache_keepalive.enabled", False) and not getattr(self.llm, "use_mock", False)
+
+    def interval(self) -> float:
+        ttl = float(config.get("llm.cache_keepalive.ttl_seconds", 300))
+        margin = float(config.get("llm.cache_keepalive.margin_seconds", 30))
+        return max(1.0, ttl - margin)
+
+    def _prices(self, prefix_tokens: int) -> Tuple[float, float, bool]:
+        """プレフィックス全体を (通常価格で送る, キャッシュから読む) ときのコストと、価格が既知か。"""
+        provider, model = self.llm.provider, self.llm.model
+        full = estimate_cost(provider, model, prefix_tokens, 0, 0)
+        cached = estimate_cost(provider, model, prefix_tokens, 0, prefix_tokens)
+        if full > 0:
+            return full, cached, True
+        # 価格が不明: トークン数を単位にして比だけで判断する（上限 max_cost は効かない）
+        full = float(prefix_tokens)
+        return full, full * float(config.get("llm.cache_keepalive.cached_price_ratio", 0.1)), False
+
+    def observed_hit_rate(self) -> float:
+        """このセッションで入力トークンのうちキャッシュから読まれた割合。"""
+        stats = self.llm.usage_stats
+        input_tokens = stats.get("input_tokens", 0)
+        return stats.get("cached_tokens", 0) / input_tokens if input_tokens else 0.0
+
+    def should_refresh(self, messages: List[Dict], pings_this_idle: int) -> bool:
+        """次のキープアライブを送る価値があるか。"""
+        hit_rate = self.observed_hit_rate()
+        if hit_rate <= 0:
+            return False
+        prefix_tokens = get_token_counter().count_messages(messages, self.llm.model)
+        full, cached, priced = self._prices(prefix_tokens)
+        savings = hit_rate * (full - cached)
+        ping_cost = hit_rate * cached + (1 - hit_rate) * full
+        if (pings_this_idle + 1) * ping_cost >= savings:
+            return False
+        max_cost = float(config.get("llm.cache_keepalive.max_cost", 0.5))
+        if priced and self.spent + ping_cost > max_cost:
+            logger.info(f"Cache keep-alive budget exhausted (${self.spent:.4f} spent)")
+            return False
+        return True
+
+    @contextlib.asynccontextmanager
+    async def idle(self, build_messages: Callable[[], List[Dict]]) -> AsyncIterator[None]:
+        """
+        with ブロックの間（ユーザー入力待ち）バックグラウンドでキープアライブを送る。
+
+        Args:
+            build_messages: 次のターンと同じプレフィックスを持つメッセージを返す関数
+                （待ちに入る時点で1回だけ呼ぶ）
+        """
+        task: Optional[asyncio.Task] = None
+        if self.enabled:
+            try:
+                messages = build_messages()
+            except Exception as e:
+                logger.warning(f"Cache keep-alive disabled for this idle period: {e}")
+                messages = []
+            if messages:
+                task = asyncio.create_task(self._run(messages))
+        try:
+            yield
+        finally:
+            if task is not None:
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+
+    async def _run(self, messages: List[Dict]) -> None:
+        started = time.monotonic()
+        max_idle = float(config.get("llm.cache_keepalive.max_idle_minutes", 30)) * 60
+        pings = 0
+        while True:
+            await asyncio.sleep(self.interval())
+            if time.monotonic() - started > max_idle:
+                return
+            if not self.should_refresh(messages, pings):
+                return
+            metrics = await self.llm.refresh_prompt_cache(messages)
+            if metrics is None:
+                return
+            pings += 1
+            self.pings += 1
+            self.spent += metrics.cost
+            logger.info(
+                f"Prompt cache keep-alive #{pings}: {metrics.cached_tokens:,}/{metrics.prompt_tokens:,} "
+                f"tokens cached, ${metrics.cost:.5f}"
+            )
@@ -0,0 +1,102 @@
+"""
+Latency tracking and hedge target selection for LLMClient.
+
+主モデルが「観測した TTFT（最初のトークンまでの時間）の p パーセンタイル」を過ぎても
+最初のトークンを返さない場合に、別プロバイダーのモデルへ同じリクエストを送る（ヘッジ）。
+先に有効な Sym-Ops 応答を返した方を採用し、もう一方はキャンセルする。
+
+設定（duckflow.yaml の llm.hedging）:
+    enabled:          true でインタラクティブな chat() 呼び出しをヘッジする
+    ttft_percentile:  ヘッジまでの待ち時間に使う TTFT のパーセンタイル（0〜1）
+    min_samples:      この件数の観測が集まるまでは initial_delay を使う
+    initial_delay:    観測が少ないときの待ち時間（秒）
+    min_delay:        待ち時間の下限（秒）
+    secondary:        ヘッジ先 {provider, model}。未指定なら available_models から選ぶ
+"""
+import logging
+import re
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from companion.config.config_loader import config
+from companion.utils.sym_ops import SymOpsProcessor
+
+logger = logging.getLogger(__name__)
+
+# モデルごとに保持する TTFT の観測数
+_WINDOW = 50
+# 行頭の "::action"（"::c0.9" のようなバイタルは1文字なので当たらない）
+_ACTION_LINE_RE = re.compile(r'^\s*::\s*[a-z_]{2,}', re.MULTILINE)
+
+
+class LatencyTracker:
+    """Rolling window of time-to-first-token observations for one model."""
+
+    def __init__(self, key: str, window: int = _WINDOW):
+        self.key = key
+        self.samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, ttft: float) -> None:
+        with self._lock:
+            self.samples.append(ttft)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+    def hedge_delay(self) -> float:
+        """ヘッジ要求を出すまでの待ち時間（秒）。"""
+        min_delay = float(config.get("llm.hedging.min_delay", 1.0))
+        if len(self.samples) < int(config.get("llm.hedging.min_samples", 5)):
+            return max(min_delay, float(config.get("llm.hedging.initial_delay", 8.0)))
+        threshold = self.percentile(float(config.get("llm.hedging.ttft_percentile", 0.9)))
+        return max(min_delay, threshold or 0.0)
+
+
+_trackers: Dict[str, LatencyTracker] = {}
+
+
+def get_latency_tracker(provider: str, model: str) -> LatencyTracker:
+    """プロバイダー・モデルごとの共有 LatencyTracker を返す。"""
+    key = f"{provider}/{model}"
+    tracker = _trackers.get(key)
+    if tracker is None:
+        tracker = _trackers[key] = LatencyTracker(key)
+    return tracker
+
+
+def hedge_candidates(provider: str, model: str) -> List[Tuple[str, str]]:
+    """
+    ヘッジ先の候補 (provider, model) を優先順に返す。
+    llm.hedging.secondary があればそれのみ、なければ available_models のうち主モデル以外。
+    """
+    secondary = config.get("llm.hedging.secondary", None)
+    if isinstance(secondary, dict) and secondary.get("provider") and secondary.get("model"):
+        return [(secondary["provider"], secondary["model"])]
+
+    candidates = []
+    for entry in config.get("llm.available_models", []) or []:
+        if not isinstance(entry, dict):
+            continue
+        pair = (entry.get("provider"), entry.get("model"))
+        if pair[0] and pair[1] and pair != (provider, model) and pair not in candidates:
+            candidates.append(pair)
+    return candidates
+
+
+def is_valid_symops(content: Optional[str]) -> bool:
+    """
+    ヘッジの勝者として採用できる応答か（:: のアクション行があり、Sym-Ops として1件以上のアクションが取れる）。
+    :: 行のない文章・JSON は PlainMarkdownConverter が response に包むので、パース結果だけでは弾けない。
+    """
+    if not content or not _ACTION_LINE_RE.search(content):
+        return False
+    try:
+        return bool(SymOpsProcessor().process(content).actions)
+    except Exception:
+        return False
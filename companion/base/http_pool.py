@@ -0,0 +1,82 @@
+"""
+Process-wide pooled HTTP transport for LLM providers.
+
+プロバイダーのベースURL（origin）ごとに httpx.AsyncClient を1つだけ作り、
+メインエージェント・Sub-LLM・要約・モデル一覧取得などすべての呼び出しで共有する。
+keep-alive で接続を再利用するため、TLS ハンドシェイクはプロセスあたり origin ごとに1回で済む。
+
+設定（duckflow.yaml の llm.http）:
+    http2:                     HTTP/2 を使う（h2 パッケージがある場合のみ有効）
+    max_connections:           origin ごとの最大接続数
+    max_keepalive_connections: 保持するアイドル接続数
+    keepalive_expiry:          アイドル接続を保持する秒数
+"""
+import importlib.util
+import logging
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from companion.config.config_loader import config
+
+logger = logging.getLogger(__name__)
+
+# OpenAI SDK が base_url=None のときに使う接続先
+OPENAI_DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def origin_of(base_url: Optional[str]) -> str:
+    """base_url の scheme://host[:port]（接続プール・サーキットブレーカーのキー）。"""
+    parts = urlsplit(base_url or OPENAI_DEFAULT_BASE_URL)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def _http2_enabled() -> bool:
+    if not config.get_bool("llm.http.http2", True):
+        return False
+    # h2 は httpx のオプション依存。なければ HTTP/1.1 の keep-alive のみ
+    return importlib.util.find_spec("h2") is not None
+
+
+def get_http_client(base_url: Optional[str] = None) -> httpx.AsyncClient:
+    """
+    base_url の origin に対応する共有 httpx.AsyncClient を返す（なければ作成）。
+    呼び出し側で close しないこと。終了時は aclose_all() でまとめて閉じる。
+    """
+    origin = origin_of(base_url)
+    client = _clients.get(origin)
+    if client is not None and not client.is_closed:
+        return client
+
+    limits = httpx.Limits(
+        max_connections=int(config.get("llm.http.max_connections", 20)),
+        max_keepalive_connections=int(config.get("llm.http.max_keepalive_connections", 10)),
+        keepalive_expiry=float(config.get("llm.http.keepalive_expiry", 30.0)),
+    )
+    http2 = _http2_enabled()
+    client = httpx.AsyncClient(
+        http2=http2,
+        limits=limits,
+        timeout=httpx.Timeout(float(config.get("llm_timeout_seconds", 60.0)), connect=10.0),
+        follow_redirects=True,
+    )
+    _clients[origin] = client
+    logger.info(
+        f"HTTP pool created for {origin} (http2={http2}, "
+        f"max_connections={limits.max_connections}, keepalive={limits.max_keepalive_connections})"
+    )
+    return client
+
+
+async def aclose_all() -> None:
+    """すべての共有クライアントを閉じる（プロセス終了時に呼ぶ）。"""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.debug(f"Failed to close HTTP client: {e}")
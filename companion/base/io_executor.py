@@ -0,0 +1,150 @@
+"""
+Executor layer for blocking file I/O and CPU-heavy work.
+
+FileOps のメソッドは async だが中身は同期の open / iterdir / resolve で、
+そのままイベントループ上で動かすと大きなツリーの grep の間は Rich の Live 表示も
+LLM のストリーミングも止まる。ツールの同期処理はここにある2種類のプールで実行する。
+
+    io   上限付きのスレッドプール（ファイル I/O・subprocess。待ちの間は GIL を手放すのでスレッドで足りる）
+    cpu  プロセスプール（大量のファイルへの正規表現など、GIL を握り続ける処理）
+
+    @blocking_io
+    def read_file(self, path): ...        # 呼び出し側からは async 関数に見える
+
+    await get_io_executor().run_io(func, *args)
+    await get_io_executor().run_cpu(func, *args)   # func と引数は pickle できること
+
+設定（duckflow.yaml の llm.executor）:
+    io_threads:    I/O スレッド数
+    cpu_processes: CPU プロセス数（auto なら CPU 数 - 1、最大4。0 ならプロセスを使わずスレッドで実行）
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from companion.config.config_loader import config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_IO_THREADS = 8
+MAX_AUTO_CPU_PROCESSES = 4
+
+
+def _auto_cpu_processes() -> int:
+    return max(0, min(MAX_AUTO_CPU_PROCESSES, (os.cpu_count() or 1) - 1))
+
+
+class IOExecutor:
+    """Bounded thread pool for blocking I/O plus an optional process pool for CPU-bound work."""
+
+    def __init__(self, io_threads: Optional[int] = None, cpu_processes: Optional[int] = None):
+        self.io_threads = max(1, int(io_threads or config.get("llm.executor.io_threads", DEFAULT_IO_THREADS)))
+        if cpu_processes is None:
+            configured = config.get("llm.executor.cpu_processes", "auto")
+            cpu_processes = _auto_cpu_processes() if configured in (None, "auto") else int(configured)
+        self.cpu_processes = max(0, cpu_processes)
+        self._io_pool: Optional[ThreadPoolExecutor] = None
+        self._cpu_pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def io_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._io_pool is None:
+                self._io_pool = ThreadPoolExecutor(max_workers=self.io_threads, thread_name_prefix="duckflow-io")
+            return self._io_pool
+
+    @property
+    def cpu_pool(self) -> Optional[Executor]:
+        """プロセスプール（cpu_processes=0 なら None）。初回に起動する。"""
+        if self.cpu_processes <= 0:
+            return None
+        with self._lock:
+            if self._cpu_pool is None:
+                # fork はスレッド（I/O プール・イベントループ）を持つ親からだと安全でないため spawn で統一する
+                self._cpu_pool = ProcessPoolExecutor(
+                    max_workers=self.cpu_processes, mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info(f"CPU process pool started ({self.cpu_processes} workers)")
+            return self._cpu_pool
+
+    async def run_io(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """ブロッキングな func を I/O スレッドで実行する（contextvars は引き継ぐ）。"""
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self.io_pool, functools.partial(ctx.run, func, *args, **kwargs))
+
+    async def run_cpu(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        CPU を使い続ける func をプロセスプールで実行する。
+        プロセスが使えない環境（無効化・起動失敗）では I/O スレッドで実行する。
+        """
+        pool = self.cpu_pool
+        if pool is None:
+            return await self.run_io(func, *args)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(pool, functools.partial(func, *args))
+        except (BrokenProcessPool, OSError) as e:
+            if self._disable_cpu_pool(pool):
+                logger.warning(f"CPU process pool unavailable ({e}); falling back to threads")
+            return await self.run_io(func, *args)
+
+    def _disable_cpu_pool(self, pool: Executor) -> bool:
+        """壊れたプロセスプールを捨て、以降はスレッドで実行する。最初に捨てた呼び出しだけ True。"""
+        with self._lock:
+            if self._cpu_pool is not pool:
+                return False
+            self._cpu_pool = None
+            self.cpu_processes = 0
+        pool.shutdown(wait=False, cancel_futures=True)
+        return True
+
+    def shutdown(self, wait: bool = True) -> None:
+        """プールを閉じる（プロセス終了時に呼ぶ）。"""
+        with self._lock:
+            io_pool, self._io_pool = self._io_pool, None
+            cpu_pool, self._cpu_pool = self._cpu_pool, None
+        if io_pool is not None:
+            io_pool.shutdown(wait=wait, cancel_futures=True)
+        if cpu_pool is not None:
+            cpu_pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_executor: Optional[IOExecutor] = None
+
+
+def get_io_executor() -> IOExecutor:
+    """プロセス共有の IOExecutor を返す。"""
+    global _executor
+    if _executor is None:
+        _executor = IOExecutor()
+    return _executor
+
+
+def shutdown_io_executor(wait: bool = True) -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
+
+
+def blocking_io(func: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    """
+    同期関数を、I/O スレッドで実行する async 関数にするデコレータ。
+    functools.wraps でシグネチャと docstring を保つので、ツール登録（inspect）からは元の関数と同じに見える。
+    """
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        return await get_io_executor().run_io(func, *args, **kwargs)
+
+    return wrapper
@@ -1,12 +1,27 @@
 import os
 import json
+import asyncio
+import contextlib
 import logging
-from typing import List, Dict, Any, Optional, Union
+import time
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple, Union, AsyncIterator
 from openai import OpenAI, AsyncOpenAI, APIError
 from companion.state.agent_state import ActionList, Action
 from companion.config.config_loader import config
 from companion.base.response_preprocessor import default_preprocessor
-from companion.utils.sym_ops import SymOpsProcessor
+from companion.base.hedging import get_latency_tracker, hedge_candidates, is_valid_symops
+from companion.base.http_pool import get_http_client, origin_of
+from companion.base.io_executor import get_io_executor
+from companion.base.rate_limiter import estimate_tokens, get_rate_limiter
+from companion.base.token_counter import get_token_counter
+from companion.base.response_cache import cache_key, get_response_cache
+from companion.base.retry_policy import CircuitOpenError, RetryPolicy, call_with_retry, get_circuit_breaker
+from companion.base.usage_ledger import CallMetrics, estimate_cost, get_usage_ledger
+from companion.utils.sym_ops import SymOpsProcessor, ParsedResult, Action as SymOpsAction
+
+if TYPE_CHECKING:
+    # 型注釈用（実行時は stream_actions の中で import する）
+    from companion.base.action_stream import ActionStream
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +62,42 @@ CONTEXT_LENGTH_FALLBACK: Dict[str, int] = {
 # API取得もフォールバックも失敗した場合のデフォルト
 DEFAULT_CONTEXT_LENGTH = 128_000
 
+# コンテキスト長の取得に使う OpenRouter のモデル一覧
+OPENROUTER_MODELS_URL = 'https://openrouter.ai/api/v1/models'
+
+# --- Sym-Ops → parameters マッピング ---
+# 特殊ルール: @target が "path" 以外のパラメータ名にマップされるツール
+# デフォルト: @target → params["path"]
+_TARGET_PARAM: Dict[str, str] = {
+    "run_command":        "command",
+    "investigate":        "reason",
+    "submit_hypothesis":  "hypothesis",
+    "finish_investigation": "conclusion",
+    "search_archives":    "query",
+    "recall":             "query",
+    "note":               "message",
+    "response":           "message",
+    "report":             "message",
+    "duck_call":          "message",
+    "finish":             "result",
+}
+# 特殊ルール: <<<content>>> が "content" 以外のパラメータ名にマップされるツール
+# デフォルト: <<<content>>> → params["content"]
+_CONTENT_PARAM: Dict[str, str] = {
+    "run_command":        "command",
+    "investigate":        "reason",
+    "submit_hypothesis":  "hypothesis",
+    "finish_investigation": "conclusion",
+    "search_archives":    "query",
+    "recall":             "query",
+    "note":               "message",
+    "response":           "message",
+    "report":             "message",
+    "duck_call":          "message",
+    "finish":             "result",
+    "propose_plan":       "goal",
+}
+
 
 class LLMClient:
     """
@@ -130,9 +181,19 @@ class LLMClient:
         self.usage_stats = {
             "input_tokens": 0,
             "output_tokens": 0,
+            "cached_tokens": 0,
             "total_tokens": 0,
-            "cost_estimate": 0.0  # Placeholder for cost calculation
+            "cost_estimate": 0.0,  # Placeholder for cost calculation
+            "retries": 0,
+            "retry_wait_seconds": 0.0,
+            "retries_by_kind": {},
+            "cache_hits": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
         }
+        self.retry_policy = RetryPolicy()
+        # ヘッジ先のクライアント（False = 候補なし）
+        self._hedge_client: Union["LLMClient", None, bool] = None
         
         logger.info(f"LLM Client initialized: provider={self.provider}, model={self.model}, base_url={self.base_url}")
 
@@ -145,7 +206,9 @@ class LLMClient:
             self.client = AsyncOpenAI(
                 api_key=self.api_key,
                 base_url=self.base_url,
-                timeout=self.timeout
+                timeout=self.timeout,
+                http_client=get_http_client(self.base_url),
+                max_retries=0,  # リトライは RetryPolicy で行う
             )
     
     def reinitialize(self, provider: Optional[str] = None, model: Optional[str] = None) -> bool:
@@ -229,8 +292,12 @@ class LLMClient:
             self.client = AsyncOpenAI(
                 api_key=self.api_key,
                 base_url=self.base_url,
-                timeout=self.timeout
+                timeout=self.timeout,
+                http_client=get_http_client(self.base_url),
+                max_retries=0,  # リトライは RetryPolicy で行う
             )
+            # 主モデルが変わったのでヘッジ先を選び直す
+            self._hedge_client = None
             
             logger.info(f"✅ LLM Client reinitialized successfully")
             return True
@@ -294,31 +361,30 @@ class LLMClient:
         # 1. OpenRouter APIから取得を試みる
         if self.provider == 'openrouter' and self.api_key:
             try:
-                import httpx
-                async with httpx.AsyncClient(timeout=10.0) as http:
-                    resp = await http.get(
-                        'https://openrouter.ai/api/v1/models',
-                        headers={'Authorization': f'Bearer {self.api_key}'}
+                resp = await get_http_client(OPENROUTER_MODELS_URL).get(
+                    OPENROUTER_MODELS_URL,
+                    headers={'Authorization': f'Bearer {self.api_key}'},
+                    timeout=10.0,
+                )
+                if resp.status_code == 200:
+                    data = resp.json()
+                    models = data.get('data', [])
+                    for m in models:
+                        if m.get('id') == self.model:
+                            ctx = m.get('context_length', 0)
+                            if ctx > 0:
+                                logger.info(
+                                    f"Context length from OpenRouter API: "
+                                    f"{self.model} = {ctx:,} tokens"
+                                )
+                                return ctx
+                    logger.warning(
+                        f"Model {self.model} not found in OpenRouter models list"
+                    )
+                else:
+                    logger.warning(
+                        f"OpenRouter /models API returned {resp.status_code}"
                     )
-                    if resp.status_code == 200:
-                        data = resp.json()
-                        models = data.get('data', [])
-                        for m in models:
-                            if m.get('id') == self.model:
-                                ctx = m.get('context_length', 0)
-                                if ctx > 0:
-                                    logger.info(
-                                        f"Context length from OpenRouter API: "
-                                        f"{self.model} = {ctx:,} tokens"
-                                    )
-                                    return ctx
-                        logger.warning(
-                            f"Model {self.model} not found in OpenRouter models list"
-                        )
-                    else:
-                        logger.warning(
-                            f"OpenRouter /models API returned {resp.status_code}"
-                        )
             except Exception as e:
                 logger.warning(f"Failed to fetch context length from OpenRouter: {e}")
 
@@ -339,45 +405,63 @@ class LLMClient:
         )
         return DEFAULT_CONTEXT_LENGTH
 
-    async def chat(self, messages: List[Dict[str, str]], response_model: Optional[type] = None, temperature: Optional[float] = None, raw: bool = False) -> Union[Dict[str, Any], ActionList, str]:
+    async def chat(self, messages: List[Dict[str, str]], response_model: Optional[type] = None, temperature: Optional[float] = None, raw: bool = False, max_tokens: Optional[int] = None, priority: str = "interactive", cache: bool = False, caller: str = "main") -> Union[Dict[str, Any], ActionList, str]:
         """
         Send messages to LLM and get a JSON response.
         If response_model is provided, validates and returns that Pydantic model.
         Supports prompt caching for OpenRouter and Anthropic.
+
+        priority: "interactive"（ユーザーが待っている呼び出し）または "background"（要約など）。
+        レート制限の待ちでは interactive が優先される。
+        cache: True なら同一入力のレスポンスをディスクキャッシュから返す（入力が同じなら
+        結果も同じでよい Sub-LLM・要約呼び出し用。llm.response_cache.enabled が true のときのみ。既定は無効）。
+        caller: 使用量 ledger に記録する呼び出し元（main / sub_llm / summarizer / task_generation / memory）。
         """
         if self.use_mock:
             return self._mock_chat(messages, response_model, raw=raw)
 
-        # 1. プロバイダーに応じてメッセージを調整（キャッシュマーカーの処理）
-        processed_messages = []
-        supports_caching = self.provider in ["openrouter", "anthropic", "deepseek"]
-        
-        for msg in messages:
-            m = msg.copy()
-            if "cache_control" in m and not supports_caching:
-                # キャッシュ非対応プロバイダー（OpenAI純正等）の場合はマーカーを削除
-                del m["cache_control"]
-            processed_messages.append(m)
-
-        # 2. 追加のヘッダー（OpenRouter用）
-        extra_headers = {}
-        if self.provider == "openrouter":
-            extra_headers["HTTP-Referer"] = "https://github.com/duckflow/duckflow"
-            extra_headers["X-Title"] = "Duckflow Agent"
-
-        MAX_EMPTY_RETRIES = 2
+        processed_messages, extra_headers = self._prepare_messages(messages)
+        metrics = CallMetrics(caller, self.provider, self.model)
+        succeeded = False
 
         try:
             logger.debug(f"Sending request to {self.model} via {self.base_url or 'default'}")
 
             if temperature is None:
                 temperature = config.get("llm.temperature", 0.7)
-            max_tokens = config.get("llm.max_output_tokens", 4096)
-            
+            if max_tokens is None:
+                max_tokens = config.get("llm.max_output_tokens", 4096)
+
+            response_cache = get_response_cache() if cache else None
+            key = None
             content = None
-            for attempt in range(1, MAX_EMPTY_RETRIES + 2):
-                # OpenAI SDKを使用してリクエスト送信
-                response = await self.client.chat.completions.create(
+            if response_cache is not None:
+                key = cache_key(self.provider, self.model, temperature, max_tokens, processed_messages)
+                # SQLite の読み書き（ロック待ち・commit）はイベントループを止めないよう I/O スレッドで行う
+                content = await get_io_executor().run_io(response_cache.get, key)
+                if content is not None:
+                    logger.info(f"💾 Response cache hit ({self.model}, {len(content)} chars)")
+                    self.usage_stats["cache_hits"] += 1
+                    metrics.cache_hit = succeeded = True
+                    return content if raw else self._parse_response(content, response_model)
+
+            hedge_client = self._get_hedge_client() if self._should_hedge(priority, raw, response_model) else None
+            if hedge_client is not None:
+                content, winner = await self._hedged_content(hedge_client, messages, temperature, max_tokens, priority, metrics)
+                succeeded = True
+                if key is not None:
+                    # ヘッジ先が勝った場合はヘッジ先のモデルの応答として保存する
+                    if winner is not self:
+                        key = cache_key(winner.provider, winner.model, temperature, max_tokens, processed_messages)
+                    await get_io_executor().run_io(response_cache.put, key, winner.model, content)
+                return self._parse_response(content, response_model)
+
+            empty_budget = self.retry_policy.budget("empty")
+            for attempt in range(1, empty_budget + 2):
+                # OpenAI SDKを使用してリクエスト送信（429/5xx などは RetryPolicy でリトライ）
+                response = await self._create_completion(
+                    priority,
+                    metrics,
                     model=self.model,
                     messages=processed_messages,
                     temperature=temperature,
@@ -387,34 +471,25 @@ class LLMClient:
 
                 # Update usage stats
                 if response.usage:
-                    self.usage_stats["input_tokens"] += response.usage.prompt_tokens
-                    self.usage_stats["output_tokens"] += response.usage.completion_tokens
-                    self.usage_stats["total_tokens"] += response.usage.total_tokens
-                    
-                    # キャッシュヒット情報をログに記録（OpenRouter/Anthropic拡張）
-                    if hasattr(response.usage, 'extra_fields'):
-                        # OpenRouter might put cache info here
-                        pass
-                    
-                    # Log caching info if available in response
-                    usage_dict = response.usage.model_dump()
-                    cache_read = usage_dict.get("prompt_tokens_details", {}).get("cached_tokens", 0)
-                    if cache_read > 0:
-                        logger.info(f"🚀 Prompt Cache Hit: {cache_read:,} tokens")
+                    self._record_usage(response.usage, metrics, processed_messages)
 
                 content = response.choices[0].message.content
 
                 if content:
+                    succeeded = True
+                    if key is not None:
+                        await get_io_executor().run_io(response_cache.put, key, self.model, content)
                     break  # 正常なレスポンスを取得
 
                 # 空レスポンス: リトライ可能ならリトライ
                 logger.warning(
-                    f"Empty response from LLM (attempt {attempt}/{MAX_EMPTY_RETRIES + 1}). "
+                    f"Empty response from LLM (attempt {attempt}/{empty_budget + 1}). "
                     f"Model: {self.model}"
                 )
-                if attempt <= MAX_EMPTY_RETRIES:
-                    import asyncio as _asyncio
-                    await _asyncio.sleep(1.0)  # 短いバックオフ
+                if attempt <= empty_budget:
+                    delay = self.retry_policy.delay("empty", attempt)
+                    self._record_retry("empty", attempt, delay, metrics=metrics)
+                    await asyncio.sleep(delay)
                     # temperatureを少し上げてリトライ（同じ空出力を避ける）
                     temperature = min(temperature + 0.1, 1.0)
                     logger.info(f"Retrying with temperature={temperature:.1f}...")
@@ -430,30 +505,344 @@ class LLMClient:
         except APIError as e:
             logger.error(f"LLM API Error: {e}")
             # Return an error action to notify the user
-            error_msg = f"LLM API Error ({e.code}): {e.message}"
+            return self._error_action_list(e)
+        except Exception as e:
+            logger.error(f"Unexpected error in LLMClient: {e}")
+            return self._error_action_list(e)
+        finally:
+            get_usage_ledger().record(metrics, ok=succeeded)
+
+    async def refresh_prompt_cache(self, messages: List[Dict[str, str]]) -> Optional[CallMetrics]:
+        """
+        プロンプトキャッシュの有効期限を延ばすための最小リクエスト（max_tokens=1）を送る。
+        messages は次のターンと同じプレフィックス（cache_control 付き）にすること。
+        空レスポンスのリトライやヘッジはしない。失敗したら None を返す。
+        """
+        if self.use_mock:
+            return None
+
+        processed_messages, extra_headers = self._prepare_messages(messages)
+        metrics = CallMetrics("keepalive", self.provider, self.model)
+        succeeded = False
+        try:
+            response = await self._create_completion(
+                "background",
+                metrics,
+                model=self.model,
+                messages=processed_messages,
+                temperature=0.0,
+                max_tokens=1,
+                extra_headers=extra_headers
+            )
+            if response.usage:
+                self._record_usage(response.usage, metrics, processed_messages)
+            succeeded = True
+            return metrics
+        except Exception as e:
+            logger.warning(f"Prompt cache keep-alive failed: {e}")
+            return None
+        finally:
+            get_usage_ledger().record(metrics, ok=succeeded)
+
+    def _prepare_messages(self, messages: List[Dict[str, str]]) -> tuple:
+        """
+        プロバイダーに応じてメッセージと追加ヘッダーを整える。
+
+        Returns:
+            (processed_messages, extra_headers)
+        """
+        # 1. プロバイダーに応じてメッセージを調整（キャッシュマーカーの処理）
+        processed_messages = []
+        supports_caching = self.provider in ["openrouter", "anthropic", "deepseek"]
+
+        for msg in messages:
+            m = msg.copy()
+            if "cache_control" in m and not supports_caching:
+                # キャッシュ非対応プロバイダー（OpenAI純正等）の場合はマーカーを削除
+                del m["cache_control"]
+            elif "cache_control" in m and isinstance(m.get("content"), str):
+                # Anthropic 形式: cache_control はコンテンツブロックに付ける
+                m["content"] = [{"type": "text", "text": m["content"], "cache_control": m.pop("cache_control")}]
+            processed_messages.append(m)
+
+        # 2. 追加のヘッダー（OpenRouter用）
+        extra_headers = {}
+        if self.provider == "openrouter":
+            extra_headers["HTTP-Referer"] = "https://github.com/duckflow/duckflow"
+            extra_headers["X-Title"] = "Duckflow Agent"
+
+        return processed_messages, extra_headers
+
+    def _record_usage(self, usage: Any, metrics: Optional[CallMetrics] = None, messages: Optional[List[Dict[str, Any]]] = None) -> None:
+        """
+        レスポンスの usage を usage_stats（と呼び出しの計測値）に積算する。
+        messages（送ったメッセージ）を渡すと、実際の入力トークン数でトークンカウンターを補正する。
+        """
+        prompt_tokens = usage.prompt_tokens or 0
+        if messages is not None and prompt_tokens:
+            get_token_counter().observe(self.model, messages, prompt_tokens)
+        completion_tokens = usage.completion_tokens or 0
+        self.usage_stats["input_tokens"] += prompt_tokens
+        self.usage_stats["output_tokens"] += completion_tokens
+        self.usage_stats["total_tokens"] += usage.total_tokens or 0
+
+        # Log caching info if available in response (OpenRouter/Anthropic拡張)
+        usage_dict = usage.model_dump()
+        cache_read = (usage_dict.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0
+        if cache_read > 0:
+            self.usage_stats["cached_tokens"] += cache_read
+            ratio = cache_read / prompt_tokens if prompt_tokens else 0.0
+            logger.info(f"🚀 Prompt Cache Hit: {cache_read:,} tokens ({ratio:.0%} of prompt)")
+
+        cost = estimate_cost(self.provider, self.model, prompt_tokens, completion_tokens, cache_read)
+        self.usage_stats["cost_estimate"] += cost
+        if metrics is not None:
+            metrics.add_usage(prompt_tokens, completion_tokens, cache_read, cost)
+
+    async def _create_completion(self, priority: str = "interactive", metrics: Optional[CallMetrics] = None, **kwargs) -> Any:
+        """
+        chat.completions.create をリトライポリシーとサーキットブレーカーの下で呼び出す。
+        ブレーカーはベースURL（origin）ごとに共有する。
+        各試行の前にレートリミッターで推定トークン数（入力 + max_tokens）を予約し、
+        usage が返れば実際の値で精算する（ストリームは推定値のまま）。
+        """
+        limiter = get_rate_limiter(self.provider, self.model)
+        reserve = estimate_tokens(kwargs.get("messages", [])) + int(kwargs.get("max_tokens") or 0)
+
+        async def attempt() -> Any:
+            reservation = await limiter.acquire(reserve, priority)
+            if metrics is not None:
+                metrics.queue_wait += reservation.waited
+            try:
+                response = await self.client.chat.completions.create(**kwargs)
+            except BaseException:
+                reservation.release()
+                raise
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                reservation.settle(usage.total_tokens)
+            return response
+
+        return await call_with_retry(
+            attempt,
+            self.retry_policy,
+            breaker=get_circuit_breaker(origin_of(self.base_url)),
+            on_retry=lambda kind, attempt, delay, error: self._record_retry(kind, attempt, delay, error, metrics),
+        )
+
+    def _record_retry(self, kind: str, attempt: int, delay: float, error: Optional[BaseException] = None, metrics: Optional[CallMetrics] = None) -> None:
+        """リトライを usage_stats（と呼び出しの計測値）に記録する。"""
+        self.usage_stats["retries"] += 1
+        if metrics is not None:
+            metrics.retries += 1
+        self.usage_stats["retry_wait_seconds"] += delay
+        by_kind = self.usage_stats["retries_by_kind"]
+        by_kind[kind] = by_kind.get(kind, 0) + 1
+        reason = f": {error}" if error is not None else ""
+        logger.warning(f"LLM call retry ({kind} #{attempt}) in {delay:.1f}s{reason}")
+
+    @staticmethod
+    def _error_action_list(error: Exception) -> ActionList:
+        """LLM 呼び出しの例外をユーザー通知用の ActionList に変換する。"""
+        if isinstance(error, CircuitOpenError):
             return ActionList(
-                reasoning="An error occurred while communicating with the LLM API.",
+                reasoning="The LLM endpoint is temporarily unavailable.",
                 actions=[
                     Action(
                         name="response",
-                        parameters={"message": f"⚠️ {error_msg}"},
-                        thought="Reporting API error to user."
+                        parameters={"message": f"⚠️ {error}"},
+                        thought="Reporting unavailable endpoint to user."
                     )
                 ]
             )
-        except Exception as e:
-            logger.error(f"Unexpected error in LLMClient: {e}")
-            error_msg = f"Unexpected Error: {str(e)}"
+        if isinstance(error, APIError):
             return ActionList(
-                reasoning="An unexpected error occurred.",
+                reasoning="An error occurred while communicating with the LLM API.",
                 actions=[
                     Action(
                         name="response",
-                        parameters={"message": f"⚠️ {error_msg}"},
-                        thought="Reporting unexpected error to user."
+                        parameters={"message": f"⚠️ LLM API Error ({error.code}): {error.message}"},
+                        thought="Reporting API error to user."
                     )
                 ]
             )
+        return ActionList(
+            reasoning="An unexpected error occurred.",
+            actions=[
+                Action(
+                    name="response",
+                    parameters={"message": f"⚠️ Unexpected Error: {str(error)}"},
+                    thought="Reporting unexpected error to user."
+                )
+            ]
+        )
+
+    async def chat_stream(self, messages: List[Dict[str, str]], temperature: Optional[float] = None, priority: str = "interactive", max_tokens: Optional[int] = None, caller: str = "main", metrics: Optional[CallMetrics] = None) -> AsyncIterator[str]:
+        """
+        Stream the raw completion text as it is generated.
+        Yields text deltas; usage is recorded from the final chunk when the
+        provider supports stream_options.include_usage.
+        Errors are propagated to the caller.
+
+        metrics: 呼び出し元（ヘッジ中の chat など）の計測値。指定時は ledger への記録を呼び出し元に任せる。
+        """
+        if self.use_mock:
+            yield self._mock_chat(messages, raw=True)
+            return
+
+        processed_messages, extra_headers = self._prepare_messages(messages)
+        if temperature is None:
+            temperature = config.get("llm.temperature", 0.7)
+        if max_tokens is None:
+            max_tokens = config.get("llm.max_output_tokens", 4096)
+        started = time.monotonic()
+        owns_metrics = metrics is None
+        if owns_metrics:
+            metrics = CallMetrics(caller, self.provider, self.model)
+        completed = False
+
+        logger.debug(f"Streaming request to {self.model} via {self.base_url or 'default'}")
+        try:
+            # リトライは最初のチャンクを受け取る前（接続確立まで）のみ
+            stream = await self._create_completion(
+                priority,
+                metrics,
+                model=self.model,
+                messages=processed_messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                extra_headers=extra_headers,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            first_token = True
+            try:
+                async for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        self._record_usage(chunk.usage, metrics, processed_messages)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if first_token:
+                            # ヘッジの待ち時間の基準にする
+                            get_latency_tracker(self.provider, self.model).record(time.monotonic() - started)
+                            metrics.mark_first_token()
+                            first_token = False
+                        yield delta
+            finally:
+                await stream.close()
+            completed = True
+        finally:
+            if owns_metrics:
+                get_usage_ledger().record(metrics, ok=completed)
+
+    def _should_hedge(self, priority: str, raw: bool, response_model: Optional[type] = None) -> bool:
+        """
+        ヘッジ対象の呼び出しか（Sym-Ops の ActionList を待っているインタラクティブな呼び出しのみ）。
+        TaskListProposal などの構造化出力は Sym-Ops として勝者を判定できないのでヘッジしない。
+        """
+        if response_model not in (None, ActionList):
+            return False
+        return priority == "interactive" and not raw and config.get_bool("llm.hedging.enabled", False)
+
+    def _get_hedge_client(self) -> Optional["LLMClient"]:
+        """ヘッジ先のクライアントを返す（API キーのある候補がなければ None）。"""
+        if self._hedge_client is None:
+            self._hedge_client = False
+            for provider, model in hedge_candidates(self.provider, self.model):
+                candidate = LLMClient(provider=provider, model=model)
+                if candidate.use_mock:
+                    continue
+                # トークン使用量・リトライ回数は主クライアントにまとめて表示する
+                candidate.usage_stats = self.usage_stats
+                self._hedge_client = candidate
+                logger.info(f"Hedging enabled: {self.provider}/{self.model} -> {provider}/{model}")
+                break
+            else:
+                logger.warning("Hedging enabled but no secondary model with an API key is configured")
+        return self._hedge_client or None
+
+    async def _collect_stream(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int, priority: str, first_token: asyncio.Event, metrics: CallMetrics) -> str:
+        """ストリームを最後まで受信して連結する。最初のトークンで first_token をセットする。"""
+        parts = []
+        stream = self.chat_stream(messages, temperature, priority, max_tokens, metrics=metrics)
+        async with contextlib.aclosing(stream) as stream:
+            async for delta in stream:
+                first_token.set()
+                parts.append(delta)
+        return "".join(parts)
+
+    async def _hedged_content(self, hedge_client: "LLMClient", messages: List[Dict[str, str]], temperature: float, max_tokens: int, priority: str, metrics: CallMetrics) -> Tuple[str, "LLMClient"]:
+        """
+        主モデルが TTFT のしきい値内に最初のトークンを返さなければ（またはエラーなら）
+        ヘッジ先にも同じリクエストを送り、先に有効な Sym-Ops 応答を返した方を採用する。
+        (応答, 応答したクライアント) を返す。
+
+        metrics は主モデルの計測値。ヘッジ先は別の CallMetrics で ledger に記録する。
+        最初のトークンを返さないままキャンセルした主モデルは、TTFT がヘッジの待ち時間以上だったことしか
+        分からないので、待ち時間を観測値として記録する（速い応答だけが残って待ち時間が縮み続けないように）。
+        """
+        tracker = get_latency_tracker(self.provider, self.model)
+        delay = tracker.hedge_delay()
+        primary_first = asyncio.Event()
+        primary = asyncio.create_task(self._collect_stream(messages, temperature, max_tokens, priority, primary_first, metrics))
+        first_wait = asyncio.create_task(primary_first.wait())
+        await asyncio.wait({primary, first_wait}, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+        first_wait.cancel()
+        if primary_first.is_set() and not primary.done():
+            # 主モデルが間に合った
+            return await primary, self
+        if primary.done() and not primary.cancelled() and primary.exception() is None and is_valid_symops(primary.result()):
+            return primary.result(), self
+
+        self.usage_stats["hedges"] += 1
+        reason = "failed" if primary.done() else f"no first token after {delay:.1f}s"
+        logger.info(f"Hedging request: {self.model} {reason}, also sending to {hedge_client.model}")
+        hedge_metrics = CallMetrics(metrics.caller, hedge_client.provider, hedge_client.model)
+        hedge = asyncio.create_task(
+            hedge_client._collect_stream(messages, temperature, max_tokens, priority, asyncio.Event(), hedge_metrics)
+        )
+        pending = {primary, hedge}
+        fallback: Optional[Tuple[str, "LLMClient"]] = None
+        last_error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        logger.warning(f"Hedged request to {'secondary' if task is hedge else 'primary'} failed: {last_error}")
+                        continue
+                    content = task.result()
+                    if is_valid_symops(content):
+                        if task is hedge:
+                            self.usage_stats["hedge_wins"] += 1
+                            logger.info(f"Hedge won: {hedge_client.model}")
+                            return content, hedge_client
+                        return content, self
+                    if content and fallback is None:
+                        fallback = (content, hedge_client if task is hedge else self)
+        finally:
+            if not primary.done() and not primary_first.is_set():
+                # 打ち切られた観測（TTFT は少なくとも delay）
+                tracker.record(delay)
+            for task in (primary, hedge):
+                if not task.done():
+                    task.cancel()
+            hedge_ok = hedge.done() and not hedge.cancelled() and hedge.exception() is None
+            get_usage_ledger().record(hedge_metrics, ok=hedge_ok)
+        if fallback is not None:
+            return fallback
+        raise last_error or ValueError("Empty response from LLM")
+
+    def stream_actions(self, messages: List[Dict[str, str]], temperature: Optional[float] = None) -> "ActionStream":
+        """
+        Start a streaming request and return an ActionStream that yields
+        internal Actions as soon as each Sym-Ops unit is closed.
+        """
+        from companion.base.action_stream import ActionStream
+        return ActionStream(self, self.chat_stream(messages, temperature=temperature), messages)
 
     def _mock_chat(self, messages: List[Dict[str, str]], response_model: Optional[type] = None, raw: bool = False) -> Union[Dict[str, Any], ActionList, str]:
         """Generate a mock response for testing."""
@@ -560,6 +949,79 @@ class LLMClient:
         params['search'] = content
         params['replace'] = ''
 
+    def _to_internal_action(self, action: SymOpsAction) -> Action:
+        """Map a parsed Sym-Ops action to the internal Action model."""
+        # Determine tool name and params
+        tool_name = action.type
+        params = action.params.copy() if action.params else {}
+
+        logger.debug(f"🔍 Mapping action: type={tool_name}, path={action.path}, content_len={len(action.content) if action.content else 0}")
+
+        # @target マッピング
+        if action.path:
+            if tool_name == "read_file":
+                # 拡張構文: "path 1 500" → path, start=1, end=500
+                parts = action.path.split()
+                params["path"] = parts[0]
+                if len(parts) >= 2 and parts[1].isdigit():
+                    params["start"] = int(parts[1])
+                if len(parts) >= 3 and parts[2].isdigit():
+                    params["end"] = int(parts[2])
+            elif tool_name == "mark_task_complete":
+                # @0, @1 などを task_index に変換
+                try:
+                    params["task_index"] = int(action.path)
+                except (ValueError, TypeError):
+                    logger.warning(f"Could not parse task_index from path: {action.path!r}")
+                    params["task_index"] = 0
+            else:
+                # デフォルト or 特殊マップから解決
+                param_name = _TARGET_PARAM.get(tool_name, "path")
+                params[param_name] = action.path
+            logger.debug(f"  → Set @target: {params}")
+
+        # <<<content>>> マッピング
+        if action.content:
+            if tool_name == "replace_in_file":
+                # YAML 風フォーマットから search/replace を抽出
+                self._parse_replace_content(action.content, params)
+                logger.debug(f"  → Parsed replace_in_file: search={params.get('search', '')[:30]}, replace={params.get('replace', '')[:30]}")
+            elif tool_name == "mark_task_complete":
+                # @target で処理済み。content ブロックは無視
+                if "task_index" not in params:
+                    logger.warning("Sym-Ops: 'mark_task_complete' missing @index. Defaulting to 0.")
+                    params["task_index"] = 0
+            else:
+                # デフォルト or 特殊マップから解決
+                param_name = _CONTENT_PARAM.get(tool_name, "content")
+                params[param_name] = action.content
+                logger.debug(f"  → Set content → {param_name} (length={len(action.content)})")
+
+        logger.debug(f"  → Final params: {list(params.keys())}")
+
+        return Action(
+            name=tool_name,
+            parameters=params,
+            thought=f"Confidence: {action.confidence}",
+            depends_on=action.depends_on,
+            batch=action.batch,
+        )
+
+    def _build_action_list(self, result: ParsedResult) -> ActionList:
+        """Convert a Sym-Ops ParsedResult to the internal ActionList."""
+        # Convert to ActionList (Internal Model)
+        actions = [self._to_internal_action(action) for action in result.actions]
+
+        # Construct ActionList
+        # Join thoughts for reasoning
+        reasoning = "\n".join(result.thoughts) if result.thoughts else "No reasoning provided."
+
+        return ActionList(
+            reasoning=reasoning,
+            actions=actions,
+            vitals=result.vitals
+        )
+
     def _parse_response(self, content: str, response_model: Optional[type] = None):
         if not content:
             logger.error(f"Empty response from LLM. Content type: {type(content)}, Content value: {repr(content)}")
@@ -581,109 +1043,7 @@ class LLMClient:
             
             logger.info(f"✅ Successfully parsed Sym-Ops format. Actions: {len(result.actions)}")
             
-            # Convert to ActionList (Internal Model)
-            actions = []
-            for action in result.actions:
-                # Map Sym-Ops action to internal Action model
-                
-                # Determine tool name and params
-                tool_name = action.type
-                params = action.params.copy() if action.params else {}
-                
-                logger.debug(f"🔍 Mapping action: type={tool_name}, path={action.path}, content_len={len(action.content) if action.content else 0}")
-                
-                # --- Sym-Ops → parameters マッピング ---
-                # 特殊ルール: @target が "path" 以外のパラメータ名にマップされるツール
-                # デフォルト: @target → params["path"]
-                _TARGET_PARAM = {
-                    "run_command":        "command",
-                    "investigate":        "reason",
-                    "submit_hypothesis":  "hypothesis",
-                    "finish_investigation": "conclusion",
-                    "search_archives":    "query",
-                    "recall":             "query",
-                    "note":               "message",
-                    "response":           "message",
-                    "report":             "message",
-                    "duck_call":          "message",
-                    "finish":             "result",
-                }
-                # 特殊ルール: <<<content>>> が "content" 以外のパラメータ名にマップされるツール
-                # デフォルト: <<<content>>> → params["content"]
-                _CONTENT_PARAM = {
-                    "run_command":        "command",
-                    "investigate":        "reason",
-                    "submit_hypothesis":  "hypothesis",
-                    "finish_investigation": "conclusion",
-                    "search_archives":    "query",
-                    "recall":             "query",
-                    "note":               "message",
-                    "response":           "message",
-                    "report":             "message",
-                    "duck_call":          "message",
-                    "finish":             "result",
-                    "propose_plan":       "goal",
-                }
-
-                # @target マッピング
-                if action.path:
-                    if tool_name == "read_file":
-                        # 拡張構文: "path 1 500" → path, start=1, end=500
-                        parts = action.path.split()
-                        params["path"] = parts[0]
-                        if len(parts) >= 2 and parts[1].isdigit():
-                            params["start"] = int(parts[1])
-                        if len(parts) >= 3 and parts[2].isdigit():
-                            params["end"] = int(parts[2])
-                    elif tool_name == "mark_task_complete":
-                        # @0, @1 などを task_index に変換
-                        try:
-                            params["task_index"] = int(action.path)
-                        except (ValueError, TypeError):
-                            logger.warning(f"Could not parse task_index from path: {action.path!r}")
-                            params["task_index"] = 0
-                    else:
-                        # デフォルト or 特殊マップから解決
-                        param_name = _TARGET_PARAM.get(tool_name, "path")
-                        params[param_name] = action.path
-                    logger.debug(f"  → Set @target: {params}")
-
-                # <<<content>>> マッピング
-                if action.content:
-                    if tool_name == "replace_in_file":
-                        # YAML 風フォーマットから search/replace を抽出
-                        self._parse_replace_content(action.content, params)
-                        logger.debug(f"  → Parsed replace_in_file: search={params.get('search', '')[:30]}, replace={params.get('replace', '')[:30]}")
-                    elif tool_name == "mark_task_complete":
-                        # @target で処理済み。content ブロックは無視
-                        if "task_index" not in params:
-                            logger.warning("Sym-Ops: 'mark_task_complete' missing @index. Defaulting to 0.")
-                            params["task_index"] = 0
-                    else:
-                        # デフォルト or 特殊マップから解決
-                        param_name = _CONTENT_PARAM.get(tool_name, "content")
-                        params[param_name] = action.content
-                        logger.debug(f"  → Set content → {param_name} (length={len(action.content)})")
-                                
-                logger.debug(f"  → Final params: {list(params.keys())}")
-                
-                actions.append(Action(
-                    name=tool_name,
-                    parameters=params,
-                    thought=f"Confidence: {action.confidence}"
-                ))
-            
-            # Construct ActionList
-            # Join thoughts for reasoning
-            reasoning = "\n".join(result.thoughts) if result.thoughts else "No reasoning provided."
-            
-            action_list = ActionList(
-                reasoning=reasoning,
-                actions=actions,
-                vitals=result.vitals
-            )
-            
-            return action_list
+            return self._build_action_list(result)
 
         except Exception as e:
             logger.error(f"Failed to parse Sym-Ops response: {e}")
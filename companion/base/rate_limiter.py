@@ -0,0 +1,192 @@
+"""
+Client-side rate limiter for LLM API calls.
+
+プロバイダー・モデルごとに RPM（requests/min）と TPM（tokens/min）のトークンバケットを持ち、
+メインループ・Sub-LLM・要約などすべての LLMClient で共有する。
+リクエスト前に推定トークン数（入力 + max_tokens）を予約し、レスポンスの usage で精算する。
+
+優先度:
+    interactive: ユーザーが応答を待っている呼び出し（メインループなど）
+    background:  要約などの裏方の呼び出し。interactive の待ちがあれば後回しにし、
+                 バケットの background_reserve 分は interactive 用に残す
+
+設定（duckflow.yaml の llm.rate_limit）:
+    rpm / tpm:           既定の上限（0 = 無制限）
+    background_reserve:  background が使えないバケットの割合
+    overrides:           "provider" または "provider/model" ごとの {rpm, tpm}
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from companion.base.token_counter import get_token_counter
+from companion.config.config_loader import config
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {"interactive": 0, "background": 1}
+
+# 先頭以外の待機者がバケットを確認する間隔（秒）
+_POLL_INTERVAL = 0.05
+
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """メッセージの入力トークン数を見積もる（予約用。実際の値は settle で精算する）。"""
+    return get_token_counter().count_messages(messages)
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at limit/60 per second."""
+
+    def __init__(self, limit_per_minute: float):
+        self.capacity = float(limit_per_minute)
+        self.tokens = self.capacity
+        self.refill_rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """amount を取り出し、なお reserve が残るまでの秒数（refill 済みであること）。"""
+        missing = amount + reserve - self.tokens
+        return 0.0 if missing <= 0 else missing / self.refill_rate
+
+
+class Reservation:
+    """A granted request slot; settle() with the actual token usage."""
+
+    def __init__(self, limiter: Optional["RateLimiter"], tokens: int, waited: float = 0.0):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.waited = waited
+
+    def settle(self, actual_tokens: Optional[int]) -> None:
+        """予約したトークン数と実際の使用量の差をバケットに戻す（超過分は差し引く）。"""
+        if self.limiter is None or actual_tokens is None:
+            return
+        self.limiter._adjust_tokens(self.tokens - actual_tokens)
+        self.tokens = actual_tokens
+
+    def release(self) -> None:
+        """リクエストが失敗した場合に予約トークンを返却する（リクエスト数は戻さない）。"""
+        self.settle(0)
+
+
+class RateLimiter:
+    """RPM/TPM limiter with a priority queue of waiters."""
+
+    def __init__(self, key: str, rpm: float = 0, tpm: float = 0, background_reserve: float = 0.2):
+        self.key = key
+        self.requests = TokenBucket(rpm) if rpm and rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm and tpm > 0 else None
+        self.background_reserve = min(max(float(background_reserve), 0.0), 0.9)
+        self._lock = threading.Lock()
+        self._waiters: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def _wait_time(self, tokens: int, priority: int) -> float:
+        now = time.monotonic()
+        wait = 0.0
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket is None:
+                continue
+            bucket.refill(now)
+            reserve = bucket.capacity * self.background_reserve if priority > 0 else 0.0
+            # バケット容量を超える要求は満タンになった時点で通す
+            amount = min(amount, bucket.capacity - reserve)
+            wait = max(wait, bucket.wait_time(amount, reserve))
+        return wait
+
+    def _take(self, tokens: int) -> None:
+        if self.requests is not None:
+            self.requests.tokens -= 1
+        if self.tokens is not None:
+            self.tokens.tokens -= tokens
+
+    def _adjust_tokens(self, delta: float) -> None:
+        if self.tokens is None or not delta:
+            return
+        with self._lock:
+            self.tokens.refill(time.monotonic())
+            self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + delta)
+
+    async def acquire(self, tokens: int, priority: str = "interactive") -> Reservation:
+        """
+        リクエスト1件と tokens 分の枠を確保するまで待つ。
+        優先度が高い（同じなら先に来た）待機者から順に枠を割り当てる。
+        """
+        if not self.enabled:
+            return Reservation(None, tokens)
+
+        level = PRIORITIES.get(priority, 0)
+        entry = (level, next(self._seq))
+        with self._lock:
+            heapq.heappush(self._waiters, entry)
+        waited = 0.0
+        try:
+            while True:
+                with self._lock:
+                    if self._waiters[0] == entry:
+                        wait = self._wait_time(tokens, level)
+                        if wait <= 0:
+                            heapq.heappop(self._waiters)
+                            self._take(tokens)
+                            break
+                        wait = min(wait, _POLL_INTERVAL * 10)
+                    else:
+                        wait = _POLL_INTERVAL
+                await asyncio.sleep(wait)
+                waited += wait
+        except BaseException:
+            with self._lock:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+            raise
+
+        if waited >= 1.0:
+            logger.info(f"Rate limit ({self.key}): waited {waited:.1f}s for {priority} request ({tokens:,} tokens)")
+        return Reservation(self, tokens, waited)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _limits_for(provider: str, model: str) -> Tuple[float, float]:
+    rpm = float(config.get("llm.rate_limit.rpm", 0) or 0)
+    tpm = float(config.get("llm.rate_limit.tpm", 0) or 0)
+    overrides = config.get("llm.rate_limit.overrides", None) or {}
+    # "provider/model" の指定を "provider" より優先する
+    for key in (provider, f"{provider}/{model}"):
+        override = overrides.get(key)
+        if isinstance(override, dict):
+            rpm = float(override.get("rpm", rpm) or 0)
+            tpm = float(override.get("tpm", tpm) or 0)
+    return rpm, tpm
+
+
+def get_rate_limiter(provider: str, model: str) -> RateLimiter:
+    """プロバイダー・モデルごとの共有 RateLimiter を返す。"""
+    key = f"{provider}/{model}"
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            rpm, tpm = _limits_for(provider, model)
+            limiter = _limiters[key] = RateLimiter(
+                key, rpm, tpm,
+                background_reserve=config.get("llm.rate_limit.background_reserve", 0.2),
+            )
+            if limiter.enabled:
+                logger.info(f"Rate limiter for {key}: rpm={rpm or '-'}, tpm={tpm or '-'}")
+        return limiter
@@ -0,0 +1,178 @@
+"""
+Content-addressed on-disk cache for deterministic LLM calls.
+
+(provider, model, temperature, max_tokens, 正規化したメッセージ) の SHA-256 をキーに、
+LLM の生レスポンス（テキスト）を SQLite に保存する。
+同じファイルの再解析や同じセッションの再復元など、入力が同一の Sub-LLM 呼び出しを省略するためのもの。
+既定では無効（llm.response_cache.enabled: true でオプトイン）。有効にしたときも
+LLMClient.chat(cache=True) の呼び出しのみが対象。
+
+設定（duckflow.yaml の llm.response_cache）:
+    enabled:      true のときだけキャッシュを使う（既定 false）
+    path:         SQLite ファイルのパス（既定: ~/.duckflow/response_cache.sqlite3）
+    max_size_mb:  保存するレスポンスの合計サイズ上限（超えたら最終アクセスが古い順に削除）
+    max_age_days: これより古いエントリは使わずに削除する
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from companion.config.config_loader import config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    content TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed);
+"""
+
+# 書き込みこの回数ごとにエビクションを実行する
+_EVICT_EVERY = 20
+
+
+def _normalize_content(content: Any) -> str:
+    if isinstance(content, list):
+        # cache_control 付きのコンテンツブロックはテキストだけを見る
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content or "").strip()
+
+
+def cache_key(
+    provider: str,
+    model: str,
+    temperature: float,
+    max_tokens: int,
+    messages: List[Dict[str, Any]],
+) -> str:
+    """呼び出しパラメータからキャッシュキーを作る（cache_control などのマーカーは無視）。"""
+    payload = {
+        "provider": provider,
+        "model": model,
+        "temperature": round(float(temperature), 3),
+        "max_tokens": int(max_tokens),
+        "messages": [[m.get("role", ""), _normalize_content(m.get("content"))] for m in messages],
+    }
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response store with size and age based eviction."""
+
+    def __init__(self, path: Path, max_size_mb: float = 50.0, max_age_days: float = 7.0):
+        self.path = Path(path)
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.max_age = max_age_days * 86400
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT content, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None or now - row[1] > self.max_age:
+                    if row is not None:
+                        conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                        conn.commit()
+                    self.misses += 1
+                    return None
+                conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                conn.commit()
+                self.hits += 1
+                return row[0]
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache read failed: {e}")
+            return None
+
+    def put(self, key: str, model: str, content: str) -> None:
+        now = time.time()
+        size = len(content.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, model, content, size, created, accessed) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model, content, size, now, now),
+                )
+                self._writes += 1
+                if self._writes % _EVICT_EVERY == 1:
+                    self._evict(conn, now)
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """期限切れのエントリを消し、合計サイズが上限を超えていれば古いアクセス順に削除する。"""
+        conn.execute("DELETE FROM responses WHERE created < ?", (now - self.max_age,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC"):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        logger.debug(f"Response cache evicted {len(doomed)} entries")
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """設定で有効ならプロセス共有の ResponseCache を返す（無効なら None）。"""
+    global _cache
+    if not config.get_bool("llm.response_cache.enabled", False):
+        return None
+    if _cache is None:
+        path = config.get("llm.response_cache.path", None)
+        _cache = ResponseCache(
+            Path(path).expanduser() if path else Path.home() / ".duckflow" / "response_cache.sqlite3",
+            max_size_mb=float(config.get("llm.response_cache.max_size_mb", 50)),
+            max_age_days=float(config.get("llm.response_cache.max_age_days", 7)),
+        )
+    return _cache
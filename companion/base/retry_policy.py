@@ -0,0 +1,240 @@
+"""
+Retry policy and circuit breaker for LLM API calls.
+
+- RetryPolicy: エラー種別ごとのリトライ回数（budget）と、ジッター付き指数バックオフ。
+  Retry-After / retry-after-ms ヘッダーがあればそれに従う。
+- CircuitBreaker: プロバイダー（ベースURL）ごとに連続失敗を数え、閾値を超えたら
+  一定時間呼び出しを即座に失敗させる（タイムアウトを積み重ねない）。
+
+設定（duckflow.yaml）:
+    llm.retry.base_delay / max_delay / max_retry_after
+    llm.retry.budgets.{rate_limit,server,timeout,connection,empty}
+    llm.circuit_breaker.failure_threshold / reset_timeout
+"""
+import asyncio
+import email.utils
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import openai
+
+from companion.config.config_loader import config
+
+logger = logging.getLogger(__name__)
+
+# エラー種別ごとのリトライ回数のデフォルト
+DEFAULT_BUDGETS = {
+    "rate_limit": 5,   # 429
+    "server": 3,       # 5xx（503 / 529 overloaded を含む）
+    "timeout": 2,
+    "connection": 3,
+    "empty": 2,        # 空のレスポンス
+}
+
+# サーキットブレーカーの失敗として数えるエラー種別（429 はエンドポイント自体は生きている）
+_BREAKER_ERRORS = {"server", "timeout", "connection"}
+
+
+class CircuitOpenError(Exception):
+    """Raised when calls to a provider are short-circuited."""
+    def __init__(self, key: str, retry_in: float):
+        self.key = key
+        self.retry_in = retry_in
+        super().__init__(
+            f"LLM endpoint {key} is temporarily unavailable after repeated failures "
+            f"(retry in {retry_in:.0f}s)"
+        )
+
+
+def classify_error(error: BaseException) -> Optional[str]:
+    """リトライ対象のエラー種別を返す。リトライしないエラーは None。"""
+    if isinstance(error, openai.RateLimitError):
+        return "rate_limit"
+    if isinstance(error, openai.APITimeoutError):
+        return "timeout"
+    if isinstance(error, openai.APIConnectionError):
+        return "connection"
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code == 429:
+            return "rate_limit"
+        if error.status_code in (408, 409) or error.status_code >= 500:
+            return "server"
+    return None
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """レスポンスの Retry-After（秒・HTTP日付）/ retry-after-ms を秒で返す。"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000.0)
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter and per-error-class budgets."""
+
+    def __init__(
+        self,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        max_retry_after: Optional[float] = None,
+        budgets: Optional[Dict[str, int]] = None,
+    ):
+        self.base_delay = float(base_delay if base_delay is not None else config.get("llm.retry.base_delay", 0.5))
+        self.max_delay = float(max_delay if max_delay is not None else config.get("llm.retry.max_delay", 20.0))
+        self.max_retry_after = float(
+            max_retry_after if max_retry_after is not None else config.get("llm.retry.max_retry_after", 60.0)
+        )
+        configured = config.get("llm.retry.budgets", None) or {}
+        self.budgets = {**DEFAULT_BUDGETS, **{k: int(v) for k, v in configured.items()}, **(budgets or {})}
+
+    def budget(self, kind: str) -> int:
+        return self.budgets.get(kind, 0)
+
+    def delay(self, kind: str, attempt: int, error: Optional[BaseException] = None) -> float:
+        """
+        attempt 回目（1始まり）のリトライ前に待つ秒数。
+        Retry-After があればそれを優先する（max_retry_after で上限）。
+        """
+        if error is not None:
+            retry_after = retry_after_seconds(error)
+            if retry_after is not None:
+                return min(retry_after, self.max_retry_after)
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(cap / 2, cap) if kind == "empty" else random.uniform(0, cap)
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker.
+
+    closed: 通常。連続失敗が failure_threshold に達すると open へ
+    open: reset_timeout の間は呼び出しを即座に失敗させる
+    half_open: 1件だけ試行を許可し、成功で closed、失敗で再び open
+    """
+
+    def __init__(self, key: str, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None):
+        self.key = key
+        self.failure_threshold = int(
+            failure_threshold if failure_threshold is not None
+            else config.get("llm.circuit_breaker.failure_threshold", 5)
+        )
+        self.reset_timeout = float(
+            reset_timeout if reset_timeout is not None
+            else config.get("llm.circuit_breaker.reset_timeout", 30.0)
+        )
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        """呼び出し可能か確認する。open なら CircuitOpenError。"""
+        state = self.state
+        now = time.monotonic()
+        # 試行中の1件が結果を返さずに終わった（キャンセル等）場合に備え、一定時間で次の試行を許可する
+        probing = self._probe_started is not None and now - self._probe_started < self.reset_timeout
+        if state == "open" or (state == "half_open" and probing):
+            retry_in = max(0.0, self.reset_timeout - (now - self.opened_at))
+            raise CircuitOpenError(self.key, retry_in)
+        if state == "half_open":
+            self._probe_started = now
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info(f"Circuit closed for {self.key}")
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        probing = self._probe_started is not None
+        if probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or probing:
+                logger.warning(f"Circuit opened for {self.key} after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+            self._probe_started = None
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(key: str) -> CircuitBreaker:
+    """エンドポイントごとの共有サーキットブレーカーを返す。"""
+    breaker = _breakers.get(key)
+    if breaker is None:
+        breaker = _breakers[key] = CircuitBreaker(key)
+    return breaker
+
+
+async def call_with_retry(
+    call: Callable[[], Awaitable[Any]],
+    policy: RetryPolicy,
+    breaker: Optional[CircuitBreaker] = None,
+    on_retry: Optional[Callable[[str, int, float, BaseException], None]] = None,
+) -> Any:
+    """
+    call() をリトライポリシーとサーキットブレーカーの下で実行する。
+
+    Args:
+        call: 毎回新しいリクエストを送るコルーチン関数
+        on_retry: リトライ前に (種別, 回数, 待ち秒数, 例外) で呼ばれる
+    """
+    attempts: Dict[str, int] = {}
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = await call()
+        except Exception as e:
+            kind = classify_error(e)
+            if breaker is not None:
+                if kind in _BREAKER_ERRORS:
+                    breaker.record_failure()
+                elif kind is None:
+                    # 4xx などはエンドポイントの故障ではない
+                    breaker.record_success()
+            if kind is None:
+                raise
+            attempts[kind] = attempts.get(kind, 0) + 1
+            if attempts[kind] > policy.budget(kind):
+                raise
+            delay = policy.delay(kind, attempts[kind], e)
+            if on_retry is not None:
+                on_retry(kind, attempts[kind], delay, e)
+            await asyncio.sleep(delay)
+            continue
+
+        if breaker is not None:
+            breaker.record_success()
+        return result
@@ -0,0 +1,200 @@
+"""
+Token counting with a pluggable offline tokenizer and per-model online calibration.
+
+文字数 × 0.5 の概算は、日本語の文章とコード（記号・短い識別子が多い）で大きく外れる。
+TokenCounter はオフラインのトークナイザー（バックエンド）で数え、各呼び出しの
+usage.prompt_tokens（プロバイダーが実際に数えた値）と見比べてモデルごとの補正係数を学習する。
+
+    counter = get_token_counter()
+    counter.count_messages(messages)          # 補正済みの入力トークン数
+    counter.observe(model, messages, usage.prompt_tokens)   # LLMClient が呼ぶ
+
+バックエンド（duckflow.yaml の llm.token_counter.backend）:
+    heuristic  文字種ごとの規則（CJK は1文字ずつ、英単語は4文字ごと、記号は1つずつ）。依存なし
+    tiktoken   tiktoken の BPE（pip install tiktoken。encoding は llm.token_counter.encoding）
+    auto       tiktoken があれば tiktoken、なければ heuristic
+
+メッセージごとの素のカウントは内容の文字列ごとにメモ化する（会話履歴は毎ターン同じ文字列を送り直すため）。
+"""
+import logging
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+
+from companion.config.config_loader import config
+
+logger = logging.getLogger(__name__)
+
+# メッセージごとのオーバーヘッド（role・区切りトークン）
+MESSAGE_OVERHEAD = 4
+# メモ化するメッセージ数の上限
+_MEMO_SIZE = 8192
+# 補正係数の指数移動平均の重みと範囲
+_ALPHA = 0.2
+_FACTOR_RANGE = (0.3, 3.0)
+# これより短いリクエストは補正に使わない（オーバーヘッドの誤差が大きい）
+_MIN_CALIBRATION_TOKENS = 200
+
+
+class TokenizerBackend(Protocol):
+    name: str
+
+    def count(self, text: str) -> int:
+        ...
+
+
+class HeuristicBackend:
+    """Dependency-free estimate by character class."""
+
+    name = "heuristic"
+
+    # CJK・かな・全角記号 / ASCII の英数字 / 空白 / その他の記号
+    _RUN_RE = re.compile(
+        r"(?P<cjk>[\u3000-\u30ff\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]+)"
+        r"|(?P<word>[A-Za-z]+)"
+        r"|(?P<digits>[0-9]+)"
+        r"|(?P<space>\s+)"
+        r"|(?P<other>.)",
+        re.DOTALL,
+    )
+
+    def count(self, text: str) -> int:
+        tokens = 0
+        for match in self._RUN_RE.finditer(text):
+            kind = match.lastgroup
+            length = match.end() - match.start()
+            if kind == "cjk":
+                tokens += length
+            elif kind == "word":
+                tokens += math.ceil(length / 4)
+            elif kind == "digits":
+                tokens += math.ceil(length / 3)
+            elif kind == "space":
+                # 単語前の空白1つは単語に含まれる。インデントや改行の連続は数トークンになる
+                tokens += length // 4 + match.group().count("\n")
+            else:
+                tokens += 1
+        return tokens
+
+
+class TiktokenBackend:
+    """BPE counts from tiktoken (optional dependency)."""
+
+    name = "tiktoken"
+
+    def __init__(self, encoding: str = "o200k_base"):
+        import tiktoken
+        self.encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+def create_backend(name: Optional[str] = None) -> TokenizerBackend:
+    """設定に従ってバックエンドを作る。tiktoken が使えなければ heuristic にフォールバックする。"""
+    name = name or config.get("llm.token_counter.backend", "auto")
+    if name in ("auto", "tiktoken"):
+        try:
+            return TiktokenBackend(config.get("llm.token_counter.encoding", "o200k_base"))
+        except ImportError:
+            if name == "tiktoken":
+                logger.warning("tiktoken is not installed; falling back to heuristic token counts")
+        except Exception as e:
+            logger.warning(f"Failed to load tiktoken encoding: {e}; falling back to heuristic token counts")
+    return HeuristicBackend()
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        # cache_control 付きのコンテンツブロック
+        content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+class TokenCounter:
+    """Counts tokens with a backend, memoizes per message, and calibrates per model."""
+
+    def __init__(self, backend: Optional[TokenizerBackend] = None):
+        self.backend = backend or create_backend()
+        self._memo: "OrderedDict[Tuple[int, int], int]" = OrderedDict()
+        self._factors: Dict[str, float] = {}
+        self._samples: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # 補正係数を使うモデル（最後に observe したモデル）
+        self.active_model: Optional[str] = None
+
+    def raw_count(self, text: str) -> int:
+        """バックエンドの素のカウント（メモ化）。"""
+        # 文字列そのものを保持しないように (hash, 長さ) をキーにする（str のハッシュはオブジェクトにキャッシュされる）
+        key = (hash(text), len(text))
+        with self._lock:
+            cached = self._memo.get(key)
+            if cached is not None:
+                self._memo.move_to_end(key)
+                return cached
+        count = self.backend.count(text)
+        with self._lock:
+            self._memo[key] = count
+            if len(self._memo) > _MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return count
+
+    def factor(self, model: Optional[str] = None) -> float:
+        """モデルの補正係数（観測がなければ 1.0）。"""
+        return self._factors.get(model or self.active_model or "", 1.0)
+
+    def count_text(self, text: str, model: Optional[str] = None) -> int:
+        return math.ceil(self.raw_count(text) * self.factor(model))
+
+    def raw_message_count(self, message: Dict[str, Any]) -> int:
+        """メッセージ本文の素のカウント（補正前・オーバーヘッドなし）。"""
+        return self.raw_count(_message_text(message))
+
+    def count_message(self, message: Dict[str, Any], model: Optional[str] = None) -> int:
+        return math.ceil(self.raw_count(_message_text(message)) * self.factor(model)) + MESSAGE_OVERHEAD
+
+    def count_messages(self, messages: List[Dict[str, Any]], model: Optional[str] = None) -> int:
+        factor = self.factor(model)
+        raw = sum(self.raw_count(_message_text(m)) for m in messages)
+        return math.ceil(raw * factor) + MESSAGE_OVERHEAD * len(messages)
+
+    def observe(self, model: str, messages: List[Dict[str, Any]], prompt_tokens: int) -> None:
+        """
+        実際の usage.prompt_tokens からモデルの補正係数を更新する。
+
+        prompt_tokens ≈ factor × 素のカウント + オーバーヘッド × メッセージ数 になるように
+        factor を指数移動平均で合わせる。
+        """
+        self.active_model = model
+        if not messages or prompt_tokens < _MIN_CALIBRATION_TOKENS:
+            return
+        raw = sum(self.raw_count(_message_text(m)) for m in messages)
+        if raw <= 0:
+            return
+        measured = (prompt_tokens - MESSAGE_OVERHEAD * len(messages)) / raw
+        measured = min(max(measured, _FACTOR_RANGE[0]), _FACTOR_RANGE[1])
+        with self._lock:
+            previous = self._factors.get(model)
+            factor = measured if previous is None else previous + _ALPHA * (measured - previous)
+            self._factors[model] = factor
+            self._samples[model] = self._samples.get(model, 0) + 1
+        logger.debug(f"Token counter calibration for {model}: factor={factor:.3f} (measured {measured:.3f})")
+
+    def calibration(self) -> Dict[str, Dict[str, float]]:
+        """モデルごとの {factor, samples}（/status 表示・デバッグ用）。"""
+        with self._lock:
+            return {m: {"factor": f, "samples": self._samples.get(m, 0)} for m, f in self._factors.items()}
+
+
+_counter: Optional[TokenCounter] = None
+
+
+def get_token_counter() -> TokenCounter:
+    """プロセス共有の TokenCounter を返す。"""
+    global _counter
+    if _counter is None:
+        _counter = TokenCounter()
+    return _counter
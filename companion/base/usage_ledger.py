@@ -0,0 +1,212 @@
+"""
+Per-call LLM usage ledger.
+
+chat() / chat_stream() の1呼び出しごとに、待ち時間（レート制限）・TTFT・全体のレイテンシ・
+トークン数（入力 / 出力 / キャッシュ読み出し）・リトライ回数・呼び出し元・コストを記録し、
+~/.duckflow/usage_ledger.jsonl に追記する。/usage コマンドでセッション・日ごとに集計して表示する。
+ファイルへの追記は I/O スレッドでまとめて行う（chat() の finally からイベントループ上で呼ばれるため）。
+
+価格（USD / 100万トークン）は duckflow.yaml の llm.pricing で指定する:
+    llm.pricing.<model>: {prompt: 3.0, completion: 15.0, cached: 0.3}
+指定がない OpenRouter のモデルは /model refresh で取得したモデル一覧の価格を使う。
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from companion.base.io_executor import get_io_executor
+from companion.config.config_loader import config
+
+logger = logging.getLogger(__name__)
+
+# このプロセスのセッションID（ledger の per-session 集計に使う）
+SESSION_ID = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+@dataclass
+class CallMetrics:
+    """1回の chat 呼び出しの計測値（リトライ・ヘッジを含む）。"""
+    caller: str
+    provider: str
+    model: str
+    started: float = field(default_factory=time.monotonic)
+    queue_wait: float = 0.0
+    ttft: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    retries: int = 0
+    cost: float = 0.0
+    cache_hit: bool = False
+
+    def mark_first_token(self) -> None:
+        if self.ttft is None:
+            self.ttft = time.monotonic() - self.started
+
+    def add_usage(self, prompt_tokens: int, completion_tokens: int, cached_tokens: int, cost: float) -> None:
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cached_tokens += cached_tokens
+        self.cost += cost
+
+
+def _openrouter_price(model: str) -> Optional[Tuple[float, float, float]]:
+    """OpenRouter のモデル一覧キャッシュから (prompt, completion, cached) の 1トークンあたり価格を引く。"""
+    from companion.modules.model_manager import model_manager
+    for m in model_manager.models:
+        if m.get("id") == model:
+            try:
+                prompt = float(m.get("prompt_price") or 0)
+                completion = float(m.get("completion_price") or 0)
+                cached = float(m.get("cached_price") or prompt)
+                return prompt, completion, cached
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def estimate_cost(provider: str, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """価格表からコスト（USD）を計算する。価格が不明なら 0.0。"""
+    prices = (config.get("llm.pricing", None) or {}).get(model)
+    if isinstance(prices, dict):
+        prompt = float(prices.get("prompt", 0)) / 1_000_000
+        completion = float(prices.get("completion", 0)) / 1_000_000
+        cached = float(prices.get("cached", prices.get("prompt", 0))) / 1_000_000
+    elif provider == "openrouter":
+        found = _openrouter_price(model)
+        if found is None:
+            return 0.0
+        prompt, completion, cached = found
+    else:
+        return 0.0
+    uncached = max(0, prompt_tokens - cached_tokens)
+    return uncached * prompt + cached_tokens * cached + completion_tokens * completion
+
+
+class UsageLedger:
+    """Append-only JSONL ledger with per-session and per-day rollups."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.session_records: List[Dict[str, Any]] = []
+        # まだファイルに書いていない行（flush が I/O スレッドで順に書き出す）
+        self._pending: List[str] = []
+        self._flush_scheduled = False
+        self._write_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def record(self, metrics: CallMetrics, ok: bool = True) -> Dict[str, Any]:
+        """計測値を1レコードとして追記し、そのレコードを返す（ファイルへの書き込みは待たない）。"""
+        record = {
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "session": SESSION_ID,
+            "caller": metrics.caller,
+            "provider": metrics.provider,
+            "model": metrics.model,
+            "queue_wait": round(metrics.queue_wait, 3),
+            "ttft": round(metrics.ttft, 3) if metrics.ttft is not None else None,
+            "latency": round(time.monotonic() - metrics.started, 3),
+            "prompt_tokens": metrics.prompt_tokens,
+            "completion_tokens": metrics.completion_tokens,
+            "cached_tokens": metrics.cached_tokens,
+            "retries": metrics.retries,
+            "cache_hit": metrics.cache_hit,
+            "cost": round(metrics.cost, 6),
+            "ok": ok,
+        }
+        with self._lock:
+            self.session_records.append(record)
+            self._pending.append(json.dumps(record, ensure_ascii=False) + "\n")
+            schedule = not self._flush_scheduled
+            self._flush_scheduled = True
+        if schedule:
+            try:
+                get_io_executor().io_pool.submit(self.flush)
+            except RuntimeError:
+                # プールが閉じられた後（終了処理中）はその場で書く
+                self.flush()
+        return record
+
+    def flush(self) -> None:
+        """溜まっている行をファイルに追記する（I/O スレッドから、または終了時・読み込み前に呼ぶ）。"""
+        with self._write_lock:
+            with self._lock:
+                lines, self._pending = self._pending, []
+                self._flush_scheduled = False
+            if not lines:
+                return
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(lines))
+            except OSError as e:
+                logger.warning(f"Failed to write usage ledger: {e}")
+
+    def read(self, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """ledger の全レコード（since 以降）を読む。壊れた行は読み飛ばす。"""
+        self.flush()
+        if not self.path.exists():
+            return []
+        cutoff = since.isoformat(timespec="seconds") if since else None
+        records = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if cutoff is None or record.get("ts", "") >= cutoff:
+                    records.append(record)
+        return records
+
+    @staticmethod
+    def rollup(records: List[Dict[str, Any]], key: str) -> Dict[str, Dict[str, float]]:
+        """
+        レコードを key（"caller" / "day" / "session" / "model"）ごとに集計する。
+
+        Returns:
+            {key の値: {calls, prompt_tokens, completion_tokens, cached_tokens, retries, cost,
+                        latency_avg, ttft_avg, queue_wait}}
+        """
+        totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        ttft_counts: Dict[str, int] = defaultdict(int)
+        for r in records:
+            group = r.get("ts", "")[:10] if key == "day" else str(r.get(key, "?"))
+            t = totals[group]
+            t["calls"] += 1
+            for name in ("prompt_tokens", "completion_tokens", "cached_tokens", "retries", "cost", "queue_wait"):
+                t[name] += r.get(name) or 0
+            t["latency_avg"] += r.get("latency") or 0
+            if r.get("ttft") is not None:
+                t["ttft_avg"] += r["ttft"]
+                ttft_counts[group] += 1
+        for group, t in totals.items():
+            t["latency_avg"] /= t["calls"]
+            if ttft_counts[group]:
+                t["ttft_avg"] /= ttft_counts[group]
+        return {group: dict(t) for group, t in sorted(totals.items())}
+
+    def recent_days(self, days: int = 7) -> List[Dict[str, Any]]:
+        return self.read(since=datetime.now() - timedelta(days=days))
+
+
+_ledger: Optional[UsageLedger] = None
+
+
+def get_usage_ledger() -> UsageLedger:
+    """プロセス共有の UsageLedger を返す。"""
+    global _ledger
+    if _ledger is None:
+        path = config.get("llm.usage_ledger.path", None)
+        _ledger = UsageLedger(Path(os.path.expanduser(path)) if path else Path.home() / ".duckflow" / "usage_ledger.jsonl")
+    return _ledger
@@ -73,7 +73,17 @@ class ConfigLoader:
                 return default
         
         return value
-    
+
+    def get_bool(self, key_path: str, default: bool = False) -> bool:
+        """
+        Get a boolean config value.
+        環境変数経由の "true" / "false" などの文字列も bool に正規化する。
+        """
+        value = self.get(key_path, default)
+        if isinstance(value, str):
+            return value.strip().lower() in ("1", "true", "yes", "on")
+        return bool(value)
+
     def update_config(self, key_path: str, value: Any) -> bool:
         """
         Update config value and persist to YAML file.
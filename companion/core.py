@@ -1,11 +1,18 @@
 import asyncio
+import copy
 import logging
 import json
-from typing import Dict, Any, Callable, List
+from typing import Dict, Any, Callable, List, Optional, Tuple
 
 from companion.state.agent_state import AgentState, ActionList, Action, AgentPhase, TaskStatus, AgentMode, SyntaxErrorInfo
+from companion.state.conversation_history import FILE_WRITE_TOOLS
 from companion.base.llm_client import default_client, LLMClient
+from companion.base.action_stream import ActionStream
+from companion.config.config_loader import config
 from companion.prompts.builder import PromptBuilder
+from companion.prompts.cache_planner import CacheBreakpointPlanner
+from companion.base.cache_keepalive import CacheKeepAlive
+from companion.base.token_counter import get_token_counter
 from companion.tools.file_ops import file_ops
 from companion.tools.plan_tool import PlanTool
 from companion.tools.task_tool import TaskTool
@@ -13,6 +20,7 @@ from companion.tools.approval import ApprovalTool
 from companion.tools.memory_tool import MemoryTool
 from companion.execution.task_executor import TaskExecutor
 from companion.execution.result_summarizer import ResultSummarizer
+from companion.execution.batch_scheduler import BatchScheduler, DependencyCycleError
 from companion.modules.pacemaker import DuckPacemaker
 from companion.modules.memory import MemoryManager
 from companion.ui import ui
@@ -67,6 +75,10 @@ class DuckAgent:
         
         # Initialize Pacemaker
         self.pacemaker = DuckPacemaker(self.state)
+        # 会話履歴上のプロンプトキャッシュのブレークポイント（ターンをまたいで前に進める）
+        self.cache_planner = CacheBreakpointPlanner()
+        # 入力待ちの間にプロンプトキャッシュを延命する（llm.cache_keepalive）
+        self.cache_keepalive = CacheKeepAlive(self.llm)
         
         # Initialize Memory Manager
         self.memory_manager = MemoryManager(
@@ -177,7 +189,7 @@ class DuckAgent:
             self.memory_manager.llm_client = self.llm
             try:
                 ctx_len = await self.llm.get_context_length()
-                self.memory_manager.configure_from_context_length(ctx_len)
+                self.memory_manager.configure_from_context_length(ctx_len, self._prompt_reserve_tokens())
             except Exception as e:
                 logger.warning(f"Failed to update memory budget after model switch: {e}")
 
@@ -196,6 +208,19 @@ class DuckAgent:
     # モード別ツールマッピング
     # カテゴリ別にツールを分類し、各モードで公開するツールを定義
     
+    # ターミナルアクション（実行するとループを終了してユーザーに戻る）
+    TERMINAL_ACTIONS = {"response", "exit", "duck_call", "finish"}
+    # 1ターンあたりのアクション数上限（LLMの投機的大量実行を防止）
+    MAX_ACTIONS_PER_TURN = 6
+    # Fail-fast: この回数だけ連続でエラーになったら残りを中断
+    MAX_CONSECUTIVE_ERRORS = 2
+    # 副作用のない読み取り専用ツール（連続する場合は並列実行する）
+    READ_ONLY_TOOLS = {"read_file", "grep_files", "find_files", "list_directory", "get_project_tree"}
+    # 読み取り専用ツールの同時実行数のデフォルト（llm.agent.max_parallel_reads で上書き）
+    DEFAULT_MAX_PARALLEL_READS = 4
+    # execute_batch の同時実行数のデフォルト（llm.agent.max_parallel_batch で上書き）
+    DEFAULT_MAX_PARALLEL_BATCH = 4
+
     # 全モード共通の基本ツール
     UNIVERSAL_TOOLS = {
         "note", "response", "exit", "duck_call",
@@ -311,7 +336,7 @@ class DuckAgent:
         # モデルのコンテキスト長を取得して MemoryManager の max_tokens を動的設定
         try:
             context_length = await self.llm.get_context_length()
-            configured = self.memory_manager.configure_from_context_length(context_length)
+            configured = self.memory_manager.configure_from_context_length(context_length, self._prompt_reserve_tokens())
             logger.info(f"Dynamic memory budget: {configured:,} tokens (model context: {context_length:,})")
         except Exception as e:
             logger.warning(f"Failed to configure dynamic memory budget: {e}")
@@ -351,7 +376,8 @@ class DuckAgent:
                     # Resume from user input (handled by tools usually, but here for safety)
                     pass
                 
-                user_input = await ui.get_user_input()
+                async with self.cache_keepalive.idle(self._build_keepalive_messages):
+                    user_input = await ui.get_user_input()
                 if not user_input.strip():
                     continue
                 
@@ -403,12 +429,13 @@ class DuckAgent:
                         self.state.phase = AgentPhase.THINKING
 
                         # system_promptを介入・通常両方で使うため先に生成
-                        prompt_builder = PromptBuilder(self.state)
+                        prompt_builder = PromptBuilder(self.state, cache_planner=self.cache_planner)
                         base_messages = prompt_builder.build_messages(self.get_tool_descriptions(self.state.current_mode.value))
                         # エラーフィードバックはプロンプトに注入済み。1ターン限りなのでクリア
                         self.state.last_syntax_errors = []
 
                         # --- Pacemaker Health Check (Before LLM Call) ---
+                        streamed = False
                         intervention = self.pacemaker.check_health()
                         if intervention:
                             # ハイブリッド介入: 履歴サマリー + LLMによる状況説明
@@ -429,9 +456,10 @@ class DuckAgent:
                                     "3. 続行/中止/方針変更の選択肢を提示\n"
                                     "::response で返答してください。"
                                 )
-                                messages = base_messages + self.state.conversation_history + [
-                                    {"role": "user", "content": intervention_prompt}
-                                ]
+                                messages = prompt_builder.assemble(
+                                    base_messages, self.state.conversation_history,
+                                    trailing=[{"role": "user", "content": intervention_prompt}]
+                                )
                                 with ui.create_spinner("Analyzing intervention..."):
                                     action_list = await self.llm.chat(messages, response_model=ActionList)
                             except Exception as e:
@@ -441,11 +469,24 @@ class DuckAgent:
                                     actions=[self.pacemaker.intervene(intervention, summary=summary)],
                                     reasoning=f"Pacemaker intervention (fallback): {intervention.type}"
                                 )
+                        elif config.get_bool("llm.stream", False):
+                            # Streaming LLM call: 閉じたアクションから順に実行する
+                            messages = prompt_builder.assemble(base_messages, self.state.conversation_history)
+                            if self.debug_context_mode:
+                                ui.print_debug_context(messages, mode=self.debug_context_mode)
+
+                            ui.update_status("Thinking... (streaming)")
+                            self.state.phase = AgentPhase.EXECUTING
+                            action_list = await self.execute_action_stream(self.llm.stream_actions(messages))
+                            streamed = True
+
+                            logger.info(f"Agent proposed actions: {[a.name for a in action_list.actions]}")
+                            self._apply_vitals(action_list.vitals)
                         else:
                             # Normal LLM call
                             with ui.create_spinner("Thinking..."):
                                 # Prepare messages
-                                messages = base_messages + self.state.conversation_history
+                                messages = prompt_builder.assemble(base_messages, self.state.conversation_history)
 
                                 # Debug output
                                 if self.debug_context_mode:
@@ -457,16 +498,7 @@ class DuckAgent:
                             logger.info(f"Agent proposed actions: {[a.name for a in action_list.actions]}")
                             
                             # Sym-Ops v3.1: バイタルを更新 (c=confidence, s=safety, m=memory, f=focus)
-                            if action_list.vitals:
-                                logger.info(f"Updating vitals from response: {action_list.vitals}")
-                                if "confidence" in action_list.vitals:
-                                    self.state.vitals.confidence = action_list.vitals["confidence"]
-                                if "safety" in action_list.vitals:
-                                    self.state.vitals.safety = action_list.vitals["safety"]
-                                if "memory" in action_list.vitals:
-                                    self.state.vitals.memory = action_list.vitals["memory"]
-                                if "focus" in action_list.vitals:
-                                    self.state.vitals.focus = action_list.vitals["focus"]
+                            self._apply_vitals(action_list.vitals)
                             
                             # Display reasoning
                             ui.print_thinking(action_list.reasoning)
@@ -474,7 +506,8 @@ class DuckAgent:
                         # 3. Execute Actions
                         self.state.phase = AgentPhase.EXECUTING
                         if action_list.actions:
-                            await self.execute_actions(action_list)
+                            if not streamed:
+                                await self.execute_actions(action_list)
 
 
                             # Decide next action: Continue loop OR return to user
@@ -485,7 +518,7 @@ class DuckAgent:
                             # 'note' does NOT end the loop - it's for progress notifications while continuing execution
                             should_return_to_user = False
                             for action in action_list.actions:
-                                if action.name in ["response", "exit", "duck_call", "finish"]:
+                                if action.name in self.TERMINAL_ACTIONS:
                                     should_return_to_user = True
                                     break
 
@@ -522,43 +555,56 @@ class DuckAgent:
                 logger.error("Error in main loop", exc_info=True)
                 ui.print_error(str(e))
 
-    async def execute_actions(self, action_list: ActionList):
-        """Dispatch and execute a list of actions."""
-        logger.info(f"Executing actions: {[a.name for a in action_list.actions]}")
-        results = []
+    def _prompt_reserve_tokens(self) -> int:
+        """履歴以外に必要なトークン数: 静的プロンプト（実測）+ 出力の上限。"""
+        prompt_builder = PromptBuilder(self.state)
+        static_messages = prompt_builder.build_static_messages(self.get_tool_descriptions(self.state.current_mode.value))
+        static_tokens = get_token_counter().count_messages(static_messages, self.llm.model)
+        return static_tokens + int(config.get("llm.max_output_tokens", 4096))
 
-        # --- Unknown Tool Filter ---
-        # LLMがハルシネーションで存在しないツールを呼ぶことがあるため、
-        # 実行前にフィルタリングする（会話履歴を汚染しない）
-        known_actions = []
-        for action in action_list.actions:
-            if action.name in self.tools:
-                known_actions.append(action)
-            else:
-                logger.warning(f"Filtered out unknown tool: {action.name}")
-                ui.print_warning(f"Unknown tool '{action.name}' was ignored.")
-                available = ', '.join(self.tools.keys())
-                self.state.last_syntax_errors.append(SyntaxErrorInfo(
-                    error_type='unknown_tool',
-                    raw_snippet=action.name,
-                    correction_hint=f'Use only registered tools: {available}',
-                ))
-        action_list.actions = known_actions
+    def _build_keepalive_messages(self) -> List[Dict[str, Any]]:
+        """
+        キャッシュ延命用のメッセージ。次のターンと同じプレフィックス（静的部分 + 会話履歴）に
+        ブレークポイントを付け、末尾に短い指示を置く。履歴が空ならキャッシュするものがないので空。
+        """
+        if not self.state.conversation_history:
+            return []
+        # 計画のコピーを使う（延命リクエストで次のターンのブレークポイント位置を動かさない）
+        prompt_builder = PromptBuilder(self.state, cache_planner=copy.deepcopy(self.cache_planner))
+        base_messages = prompt_builder.build_messages(self.get_tool_descriptions(self.state.current_mode.value))
+        prompt_builder.dynamic_context = ""
+        return prompt_builder.assemble(
+            base_messages, self.state.conversation_history,
+            trailing=[{"role": "user", "content": "[SYSTEM]\nCache keep-alive. Reply with a single character."}]
+        )
 
-        # --- Action Count Limiter ---
-        # 1ターンあたりのアクション数を制限（LLMの投機的大量実行を防止）
-        MAX_ACTIONS_PER_TURN = 6
-        if len(action_list.actions) > MAX_ACTIONS_PER_TURN:
-            dropped = len(action_list.actions) - MAX_ACTIONS_PER_TURN
-            logger.warning(f"Action limit exceeded: {len(action_list.actions)} actions, dropping last {dropped}")
-            ui.print_warning(f"アクション数が上限({MAX_ACTIONS_PER_TURN})を超えたため、末尾{dropped}件を切り捨てました。")
-            action_list.actions = action_list.actions[:MAX_ACTIONS_PER_TURN]
+    def _is_known_action(self, action: Action) -> bool:
+        """
+        登録済みツールかどうかを判定する。
+        LLMがハルシネーションで存在しないツールを呼ぶことがあるため、
+        未知のツールは実行せず構文エラーとして記録する（会話履歴を汚染しない）。
+        """
+        if action.name in self.tools:
+            return True
+        logger.warning(f"Filtered out unknown tool: {action.name}")
+        ui.print_warning(f"Unknown tool '{action.name}' was ignored.")
+        available = ', '.join(self.tools.keys())
+        self.state.last_syntax_errors.append(SyntaxErrorInfo(
+            error_type='unknown_tool',
+            raw_snippet=action.name,
+            correction_hint=f'Use only registered tools: {available}',
+        ))
+        return False
 
-        # --- Safety Score Interceptor (Sym-Ops v3.1) ---
-        # safety スコアが 0.5 未満の場合、実行前にユーザー確認を求める
+    def _confirm_safety(self, vitals: Dict[str, float]) -> bool:
+        """
+        Safety Score Interceptor (Sym-Ops v3.1)
+        safety スコアが 0.5 未満の場合、実行前にユーザー確認を求める。
+        キャンセルされた場合は False を返す。
+        """
         safety_score = 1.0
-        if action_list.vitals:
-            safety_score = action_list.vitals.get("safety", 1.0)
+        if vitals:
+            safety_score = vitals.get("safety", 1.0)
         if safety_score < 0.5:
             ui.print_safety_warning(safety_score)
             if not ui.request_confirmation("低い Safety Score で実行を続けますか？"):
@@ -568,200 +614,76 @@ class DuckAgent:
                     "安全な代替手段を検討してください。"
                 )
                 self.state.add_message("user", cancel_msg)
-                return results
-        # ------------------------------------------------
+                return False
+        return True
+
+    def _apply_vitals(self, vitals: Dict[str, float]) -> None:
+        """Sym-Ops v3.1: バイタルを更新 (c=confidence, s=safety, m=memory, f=focus)"""
+        if not vitals:
+            return
+        logger.info(f"Updating vitals from response: {vitals}")
+        if "confidence" in vitals:
+            self.state.vitals.confidence = vitals["confidence"]
+        if "safety" in vitals:
+            self.state.vitals.safety = vitals["safety"]
+        if "memory" in vitals:
+            self.state.vitals.memory = vitals["memory"]
+        if "focus" in vitals:
+            self.state.vitals.focus = vitals["focus"]
+
+    def _abort_remaining(self, consecutive_errors: int, remaining: int) -> None:
+        """Fail-fast: 連続エラーで残りのアクションを中断したことを通知する。"""
+        if remaining > 0:
+            logger.warning(f"Fail-fast: {consecutive_errors} consecutive errors, aborting {remaining} remaining actions")
+            ui.print_warning(f"連続{consecutive_errors}回エラーのため、残り{remaining}件のアクションを中断しました。")
+            self.state.add_message(
+                "user",
+                f"[SYSTEM] 連続{consecutive_errors}回のエラーにより残り{remaining}件のアクションを中断しました。"
+                "原因を確認してから再試行してください。"
+            )
+
+    async def execute_actions(self, action_list: ActionList):
+        """Dispatch and execute a list of actions."""
+        logger.info(f"Executing actions: {[a.name for a in action_list.actions]}")
+        results = []
+
+        # --- Unknown Tool Filter ---
+        action_list.actions = [a for a in action_list.actions if self._is_known_action(a)]
+
+        # --- Action Count Limiter ---
+        # 1ターンあたりのアクション数を制限（LLMの投機的大量実行を防止）
+        if len(action_list.actions) > self.MAX_ACTIONS_PER_TURN:
+            dropped = len(action_list.actions) - self.MAX_ACTIONS_PER_TURN
+            logger.warning(f"Action limit exceeded: {len(action_list.actions)} actions, dropping last {dropped}")
+            ui.print_warning(f"アクション数が上限({self.MAX_ACTIONS_PER_TURN})を超えたため、末尾{dropped}件を切り捨てました。")
+            action_list.actions = action_list.actions[:self.MAX_ACTIONS_PER_TURN]
+
+        # --- Safety Score Interceptor (Sym-Ops v3.1) ---
+        if not self._confirm_safety(action_list.vitals):
+            return results
 
         # --- Fail-fast: 連続エラーカウンター ---
-        MAX_CONSECUTIVE_ERRORS = 2
         consecutive_errors = 0
 
         # ターミナルアクション（ループを終了するアクション）を末尾に並べ替え
         # 例: [report, replace_in_file] → [replace_in_file, report]
         # これにより実行系アクションが先に処理され、最後にユーザーへ報告される
-        TERMINAL_ACTIONS = {"response", "exit", "duck_call", "finish"}
-        non_terminal = [a for a in action_list.actions if a.name not in TERMINAL_ACTIONS]
-        terminal = [a for a in action_list.actions if a.name in TERMINAL_ACTIONS]
+        non_terminal = [a for a in action_list.actions if a.name not in self.TERMINAL_ACTIONS]
+        terminal = [a for a in action_list.actions if a.name in self.TERMINAL_ACTIONS]
         action_list.actions = non_terminal + terminal
 
         try:
-            for action in action_list.actions:
-                ui.print_action(action.name, action.parameters, action.thought)
-
-                # --- Approval Check ---
-                requires_approval = False
-                was_approved = False
-                warning_msg = ""
-                
-                if action.name in ["delete_file", "delete_lines", "edit_file"]:
-                    requires_approval = True
-                    warning_msg = f"This action will modify/delete '{action.parameters.get('path', 'unknown')}'. Are you sure?"
-                
-                elif action.name == "write_file":
-                    path = action.parameters.get("path")
-                    if path and file_ops.file_exists(path):
-                        requires_approval = True
-                        warning_msg = f"File '{path}' already exists. Overwrite?"
-                
-                if requires_approval:
-                    if not ui.request_confirmation(warning_msg):
-                        msg = f"Action '{action.name}' denied by user."
-                        ui.print_result(msg, is_error=True)
-                        self.state.last_action_result = msg
-                        
-                        # Add denial to conversation history so LLM knows what happened
-                        denial_context = (
-                            f"[User denied approval for action '{action.name}'] "
-                            f"Reason: {warning_msg}. "
-                            f"The user refused to proceed with this operation. "
-                            f"Please either: 1) Ask the user what to do instead, "
-                            f"2) Try a different approach, or 3) Explain the situation."
-                        )
-                        self.state.add_message("user", denial_context)
-                        
-                        # Update Pacemaker vitals (denial is treated as an error)
-                        self.pacemaker.update_vitals(action, msg, is_error=True)
-                        
-                        results.append(msg)
-                        continue
-                    else:
-                        # User approved - mark this action as approved
-                        was_approved = True
-                        logger.info(f"User approved action: {action.name}")
-                # ----------------------
-                
-                if action.name in self.tools:
-                    try:
-                        # Execute tool
-                        func = self.tools[action.name]
-                        logger.info(f"Calling tool: {action.name}")
-
-                        # --- シグネチャフィルタ ---
-                        # 関数が受け付けないkwargs（例: content）を除去してTypeErrorを防ぐ
-                        import inspect as _inspect
-                        _sig = _inspect.signature(func)
-                        _has_var_kw = any(
-                            p.kind == _inspect.Parameter.VAR_KEYWORD
-                            for p in _sig.parameters.values()
-                        )
-                        if _has_var_kw:
-                            # **kwargs を受け付ける関数はすべて渡す
-                            call_params = action.parameters
-                        else:
-                            _valid = set(_sig.parameters.keys())
-                            _dropped = set(action.parameters.keys()) - _valid
-                            if _dropped:
-                                logger.warning(
-                                    f"Tool '{action.name}': dropping unexpected params: {_dropped}"
-                                )
-                            call_params = {k: v for k, v in action.parameters.items() if k in _valid}
-                        # -----------------------
-
-                        # Check if function is async
-                        if asyncio.iscoroutinefunction(func):
-                            result = await func(**call_params)
-                        else:
-                            result = func(**call_params)
-                        
-                        logger.info(f"Tool {action.name} returned. Result length: {len(str(result))}")
-                        
-                        # Record result
-                        self.state.last_action_result = f"Action '{action.name}' succeeded: {result}"
-                        
-                        # Add result to conversation history (for LLM context in next cycle)
-                        if action.name not in ("response",):
-                            # Prepare tool result for conversion
-                            tool_status = ToolStatus.OK
-                            # We could implement truncation check here if needed later
-                            
-                            tool_res = ToolResult(
-                                status=tool_status,
-                                tool_name=action.name,
-                                target=action.parameters.get("path", action.parameters.get("command", "task")),
-                                content=result
-                            )
-                            formatted_res = format_symops_response(tool_res)
-
-                            # If this action required approval, add explicit completion message
-                            if was_approved:
-                                completion_msg = (
-                                    f"{formatted_res}\n\n"
-                                    f"[System: User approved action. Proceed with next steps.]"
-                                )
-                                self.state.add_message("user", completion_msg)
-                            else:
-                                self.state.add_message("user", formatted_res)
-                            
-                            if isinstance(result, str):
-                                ui.print_result(result)
-                            else:
-                                ui.print_result(serialize_to_text(result))
-                        
-                        results.append(result)
-
-                        # Update Pacemaker vitals (success)
-                        self.pacemaker.update_vitals(action, result, is_error=False)
-                        consecutive_errors = 0  # 成功したらリセット
-
-                    except Exception as e:
-                        error_msg = f"Action '{action.name}' failed: {str(e)}"
-                        logger.error(error_msg, exc_info=True)
-                        self.state.last_action_result = error_msg
-                        ui.print_result(str(e), is_error=True)
-
-                        # 引数不足などの TypeError を構文エラーとして記録
-                        if isinstance(e, TypeError):
-                            self.state.last_syntax_errors.append(SyntaxErrorInfo(
-                                error_type='missing_param',
-                                raw_snippet=str(e)[:200],
-                                correction_hint='Required parameter is missing. Check the tool signature.',
-                            ))
-
-                        # Add error to conversation history in Sym-Ops format
-                        err_res = ToolResult(
-                            status=ToolStatus.ERROR,
-                            tool_name=action.name,
-                            target=action.parameters.get("path", action.parameters.get("command", "task")),
-                            content=e
-                        )
-                        self.state.add_message("user", format_symops_response(err_res))
-
-                        results.append(error_msg)
-
-                        # Update Pacemaker vitals (error)
-                        self.pacemaker.update_vitals(action, error_msg, is_error=True)
-
-                        # --- Fail-fast: 連続エラーで残りのアクションを中断 ---
-                        consecutive_errors += 1
-                        if consecutive_errors >= MAX_CONSECUTIVE_ERRORS:
-                            remaining = len(action_list.actions) - action_list.actions.index(action) - 1
-                            if remaining > 0:
-                                logger.warning(f"Fail-fast: {consecutive_errors} consecutive errors, aborting {remaining} remaining actions")
-                                ui.print_warning(f"連続{consecutive_errors}回エラーのため、残り{remaining}件のアクションを中断しました。")
-                                self.state.add_message(
-                                    "user",
-                                    f"[SYSTEM] 連続{consecutive_errors}回のエラーにより残り{remaining}件のアクションを中断しました。"
-                                    "原因を確認してから再試行してください。"
-                                )
-                            break
-                else:
-                    msg = f"Unknown tool: {action.name}"
-                    logger.warning(msg)
-                    self.state.last_action_result = msg
-                    ui.print_result(msg, is_error=True)
-                    
-                    # Add unknown tool error to conversation history
-                    available_tools = ", ".join(self.tools.keys())
-                    self.state.add_message(
-                        "user", 
-                        f"[Error] Tool '{action.name}' does not exist. "
-                        f"Available tools: {available_tools}. "
-                        f"Please use one of the available tools."
-                    )
-                    
-                    results.append(msg)
-                    
-                    # Update Pacemaker vitals (error - unknown tool)
-                    self.pacemaker.update_vitals(action, msg, is_error=True)
+            actions = action_list.actions
+            index = 0
+            while index < len(actions):
+                recorded, consecutive_errors, aborted = await self._execute_group(
+                    actions, index, results, consecutive_errors
+                )
+                index += recorded
+                if aborted:
+                    # --- Fail-fast: 連続エラーで残りのアクションを中断 ---
+                    self._abort_remaining(consecutive_errors, len(actions) - index)
+                    break
         except KeyboardInterrupt:
             ui.print_warning("Execution interrupted by user.")
             self.state.add_message("user", "[System: Execution was interrupted by the user (Ctrl+C). Please wait for new instructions.]")
@@ -774,6 +696,498 @@ class DuckAgent:
         logger.info("Finished executing actions")
         return results
 
+    async def execute_action_stream(self, stream: ActionStream) -> ActionList:
+        """
+        Dispatch actions from a streaming LLM response as soon as each one is closed.
+
+        execute_actions と同じ規則（未知ツール除外・上限・Safety確認・
+        ターミナルアクションは最後・Fail-fast）を逐次適用する。
+        ターミナルアクションはストリーム完了まで保留される。
+        ::execute_batch のアクションと連続する読み取り専用アクションは、グループが閉じる
+        （別のアクションが届くかストリームが終わる）まで溜め、execute_actions と同じく並列実行する。
+
+        Returns:
+            実行対象となったアクションを持つ最終 ActionList
+        """
+        results = []
+        executed: List[Action] = []
+        deferred_terminal: List[Action] = []
+        accepted = 0
+        dropped = 0
+        skipped = 0
+        consecutive_errors = 0
+        started = False
+        cancelled = False
+        aborted = False
+        # 実行待ちのグループ（同じ ::execute_batch、または連続する読み取り専用アクション）
+        pending: List[Action] = []
+
+        async def flush() -> None:
+            nonlocal consecutive_errors, aborted, skipped
+            index = 0
+            while index < len(pending):
+                recorded, consecutive_errors, aborted = await self._execute_group(
+                    pending, index, results, consecutive_errors
+                )
+                index += recorded
+                if aborted:
+                    # 中断で記録しなかった分は実行対象から外す（pending は executed の末尾）
+                    unrecorded = len(pending) - index
+                    skipped += unrecorded
+                    if unrecorded:
+                        del executed[-unrecorded:]
+                    break
+            pending.clear()
+
+        try:
+            async for action in stream:
+                if cancelled or aborted:
+                    # ストリームは最後まで読み切り、最終パース結果を確定させる
+                    skipped += 1
+                    continue
+                if not self._is_known_action(action):
+                    continue
+                if accepted >= self.MAX_ACTIONS_PER_TURN:
+                    dropped += 1
+                    continue
+                accepted += 1
+
+                if not started:
+                    # 最初のアクション到着時点で思考を表示し、Safety を確認する
+                    started = True
+                    ui.print_thinking("\n".join(stream.thoughts))
+                    if not self._confirm_safety(stream.vitals):
+                        cancelled = True
+                        continue
+
+                if action.name in self.TERMINAL_ACTIONS:
+                    deferred_terminal.append(action)
+                    continue
+                if pending and not self._joins_group(pending[-1], action):
+                    await flush()
+                    if aborted:
+                        skipped += 1
+                        continue
+                executed.append(action)
+                pending.append(action)
+                if action.batch is None and not self._read_only_group([action], 0):
+                    await flush()
+
+            if pending:
+                await flush()
+
+            if dropped:
+                logger.warning(f"Action limit exceeded: dropping last {dropped} streamed actions")
+                ui.print_warning(f"アクション数が上限({self.MAX_ACTIONS_PER_TURN})を超えたため、末尾{dropped}件を切り捨てました。")
+
+            if aborted:
+                self._abort_remaining(consecutive_errors, skipped + len(deferred_terminal))
+            elif not cancelled:
+                for index, action in enumerate(deferred_terminal):
+                    is_error = await self._execute_single_action(action, results)
+                    if is_error is None:
+                        continue
+                    if not is_error:
+                        consecutive_errors = 0
+                        continue
+                    consecutive_errors += 1
+                    if consecutive_errors >= self.MAX_CONSECUTIVE_ERRORS:
+                        self._abort_remaining(consecutive_errors, len(deferred_terminal) - index - 1)
+                        break
+        except KeyboardInterrupt:
+            ui.print_warning("Execution interrupted by user.")
+            self.state.add_message("user", "[System: Execution was interrupted by the user (Ctrl+C). Please wait for new instructions.]")
+
+        if stream.error is not None:
+            # 途中で切れたアクションは実行していない。モデルに再送させる
+            ui.print_warning(f"応答のストリームが途中で切れたため、未完了のアクションを破棄しました: {stream.error}")
+            self.state.add_message(
+                "user",
+                f"[System: The response stream was interrupted ({stream.error}). "
+                f"Only the actions that were complete were executed; the unfinished action was discarded. "
+                f"Re-send it if it is still needed.]"
+            )
+
+        action_list = stream.action_list or ActionList(
+            actions=[],
+            reasoning="\n".join(stream.thoughts) or "No reasoning provided.",
+            vitals=stream.vitals,
+        )
+        if not started:
+            ui.print_thinking(action_list.reasoning)
+        if cancelled:
+            action_list.actions = []
+        else:
+            action_list.actions = executed + deferred_terminal
+
+        ui.print_token_usage(self.llm.usage_stats)
+        logger.info("Finished executing streamed actions")
+        return action_list
+
+    async def _execute_group(
+        self, actions: List[Action], index: int, results: list, consecutive_errors: int
+    ) -> Tuple[int, int, bool]:
+        """
+        actions[index] から始まる1グループを実行して記録する。
+        ::execute_batch は依存関係に沿って、連続する読み取り専用アクションはまとめて並列実行し、
+        結果は元の順序で記録する。それ以外は1件ずつ実行する。
+
+        Returns:
+            (記録したアクション数, 連続エラー数, Fail-fast で中断したか)。
+            中断した場合の連続エラー数は中断した時点のもの。
+        """
+        outcomes = None
+        approved: set = set()
+        in_batch = False
+        group = self._batch_group(actions, index)
+        if len(group) > 1:
+            batch_run = await self._invoke_batch(group)
+            if batch_run is not None:
+                outcomes, approved = batch_run
+                in_batch = True
+        else:
+            group = self._read_only_group(actions, index)
+            if len(group) > 1:
+                outcomes = await self._invoke_read_only_group(group)
+        if outcomes is None:
+            group = [actions[index]]
+
+        aborted = False
+        abort_errors = 0
+        for offset, action in enumerate(group):
+            if outcomes is None:
+                is_error = await self._execute_single_action(action, results)
+            else:
+                is_error = self._record_outcome(action, outcomes[offset], results, offset in approved)
+            if is_error is None:
+                # ユーザー拒否はカウンターに影響しない
+                continue
+            if not is_error:
+                consecutive_errors = 0  # 成功したらリセット
+                continue
+
+            # 読み取り専用グループの実行済みの後続結果は記録しない（逐次実行時と同じ履歴にする）。
+            # バッチは書き込みを含むため、実行済みの結果はすべて記録してからバッチの後ろを中断する
+            consecutive_errors += 1
+            if consecutive_errors >= self.MAX_CONSECUTIVE_ERRORS and not aborted:
+                aborted = True
+                abort_errors = consecutive_errors
+                if not in_batch:
+                    return offset + 1, abort_errors, True
+        if aborted:
+            return len(group), abort_errors, True
+        return len(group), consecutive_errors, False
+
+    async def _execute_single_action(self, action: Action, results: list) -> Optional[bool]:
+        """
+        Execute one action (approval check, tool call, history update).
+
+        Returns:
+            True: エラー / False: 成功 / None: ユーザーが承認を拒否
+        """
+        ui.print_action(action.name, action.parameters, action.thought)
+
+        # --- Approval Check ---
+        was_approved = False
+        warning_msg = self._approval_warning(action)
+        if warning_msg is not None:
+            if not ui.request_confirmation(warning_msg):
+                self._record_denial(action, warning_msg, results)
+                return None
+            # User approved - mark this action as approved
+            was_approved = True
+            logger.info(f"User approved action: {action.name}")
+        # ----------------------
+
+        if action.name not in self.tools:
+            msg = f"Unknown tool: {action.name}"
+            logger.warning(msg)
+            self.state.last_action_result = msg
+            ui.print_result(msg, is_error=True)
+            
+            # Add unknown tool error to conversation history
+            available_tools = ", ".join(self.tools.keys())
+            self.state.add_message(
+                "user", 
+                f"[Error] Tool '{action.name}' does not exist. "
+                f"Available tools: {available_tools}. "
+                f"Please use one of the available tools."
+            )
+            
+            results.append(msg)
+            
+            # Update Pacemaker vitals (error - unknown tool)
+            self.pacemaker.update_vitals(action, msg, is_error=True)
+            return True
+
+        try:
+            result = await self._invoke_tool(action)
+        except Exception as e:
+            return self._record_error(action, e, results)
+        return self._record_success(action, result, was_approved, results)
+
+    def _approval_warning(self, action: Action, written: Optional[set] = None) -> Optional[str]:
+        """
+        ユーザー承認が必要なアクションなら確認メッセージを返す（不要なら None）。
+        written: 同じバッチ内で先に書き込まれるパス（まだ存在しなくても上書き扱い）
+        """
+        if action.name in ["delete_file", "delete_lines", "edit_file"]:
+            return f"This action will modify/delete '{action.parameters.get('path', 'unknown')}'. Are you sure?"
+
+        if action.name == "write_file":
+            path = action.parameters.get("path")
+            if path and (file_ops.file_exists(path) or (written and path in written)):
+                return f"File '{path}' already exists. Overwrite?"
+        return None
+
+    def _record_denial(self, action: Action, warning_msg: str, results: list) -> None:
+        """ユーザーが承認を拒否したアクションを会話履歴・UI・Pacemaker に反映する。"""
+        msg = f"Action '{action.name}' denied by user."
+        ui.print_result(msg, is_error=True)
+        self.state.last_action_result = msg
+
+        # Add denial to conversation history so LLM knows what happened
+        denial_context = (
+            f"[User denied approval for action '{action.name}'] "
+            f"Reason: {warning_msg}. "
+            f"The user refused to proceed with this operation. "
+            f"Please either: 1) Ask the user what to do instead, "
+            f"2) Try a different approach, or 3) Explain the situation."
+        )
+        self.state.add_message("user", denial_context)
+
+        # Update Pacemaker vitals (denial is treated as an error)
+        self.pacemaker.update_vitals(action, msg, is_error=True)
+
+        results.append(msg)
+
+    def _batch_group(self, actions: List[Action], start: int) -> List[Action]:
+        """actions[start] から連続する、同じ ::execute_batch から展開されたアクションを返す。"""
+        batch = actions[start].batch
+        if batch is None:
+            return []
+        group = []
+        for action in actions[start:]:
+            if action.batch != batch:
+                break
+            group.append(action)
+        return group
+
+    async def _invoke_batch(self, actions: List[Action]) -> Optional[tuple]:
+        """
+        ::execute_batch のアクションを depends_on の DAG に沿って並列実行する。
+        承認が必要なものは実行前に元の順序でまとめて確認する。
+        履歴・UIへの記録は行わず、(outcomes, approved) を返す。
+        depends_on が循環している場合は構文エラーとして記録し、None を返す（呼び出し側で逐次実行）。
+        """
+        try:
+            scheduler = BatchScheduler(
+                actions,
+                max_parallel=int(config.get("llm.agent.max_parallel_batch", self.DEFAULT_MAX_PARALLEL_BATCH)),
+            )
+        except DependencyCycleError as e:
+            cycle = e.description
+            logger.warning(f"execute_batch dependency cycle: {cycle}")
+            ui.print_warning(f"execute_batch の依存関係が循環しているため、書かれた順に逐次実行します: {cycle}")
+            self.state.last_syntax_errors.append(SyntaxErrorInfo(
+                error_type='dependency_cycle',
+                raw_snippet=cycle[:200],
+                correction_hint='"> dependency" in execute_batch must not form a cycle. '
+                                'Point each action only at actions it really needs to run after.',
+            ))
+            return None
+
+        denied: Dict[int, str] = {}
+        approved: set = set()
+        written: set = set()
+        for i, action in enumerate(actions):
+            warning_msg = self._approval_warning(action, written)
+            if action.name == "write_file" and action.parameters.get("path"):
+                written.add(action.parameters["path"])
+            if warning_msg is None:
+                continue
+            if ui.request_confirmation(warning_msg):
+                approved.add(i)
+                logger.info(f"User approved action: {action.name}")
+            else:
+                denied[i] = warning_msg
+
+        logger.info(f"Running execute_batch with {len(actions)} actions (limit={scheduler.max_parallel})")
+        outcomes = await scheduler.run(lambda i, action: self._invoke_outcome(action), skip=set(denied))
+        for i, warning_msg in denied.items():
+            outcomes[i] = (None, warning_msg)
+        return outcomes, approved
+
+    def _joins_group(self, previous: Action, action: Action) -> bool:
+        """ストリーム実行用: action が previous と同じグループ（_batch_group / _read_only_group）に入るか。"""
+        if previous.batch is not None:
+            return action.batch == previous.batch
+        return action.batch is None and len(self._read_only_group([previous, action], 0)) == 2
+
+    def _read_only_group(self, actions: List[Action], start: int) -> List[Action]:
+        """actions[start] から連続する読み取り専用アクションを返す（該当しなければ空）。"""
+        group = []
+        for action in actions[start:]:
+            if action.name not in self.READ_ONLY_TOOLS or action.name not in self.tools:
+                break
+            group.append(action)
+        return group
+
+    async def _invoke_read_only_group(self, actions: List[Action]) -> List[tuple]:
+        """
+        読み取り専用アクションを並列に実行する（同時実行数は llm.agent.max_parallel_reads）。
+        履歴・UIへの記録は行わず、(成功したか, 結果または例外) を元の順序で返す。
+        """
+        limit = max(1, int(config.get("llm.agent.max_parallel_reads", self.DEFAULT_MAX_PARALLEL_READS)))
+        semaphore = asyncio.Semaphore(limit)
+        logger.info(f"Running {len(actions)} read-only actions in parallel (limit={limit})")
+
+        async def run(action: Action) -> tuple:
+            async with semaphore:
+                return await self._invoke_outcome(action)
+
+        return await asyncio.gather(*(run(a) for a in actions))
+
+    async def _invoke_outcome(self, action: Action) -> tuple:
+        """並列実行用: ツールを呼び出し、(成功したか, 結果または例外) を返す。"""
+        try:
+            return True, await self._invoke_tool(action)
+        except Exception as e:
+            return False, e
+
+    def _record_outcome(self, action: Action, outcome: tuple, results: list, was_approved: bool = False) -> Optional[bool]:
+        """
+        並列実行したアクションの結果を、逐次実行時と同じ形で記録する。
+        outcome の先頭が None の場合は承認拒否（2番目は確認メッセージ）。
+        """
+        ui.print_action(action.name, action.parameters, action.thought)
+        ok, value = outcome
+        if ok is None:
+            self._record_denial(action, value, results)
+            return None
+        if ok:
+            return self._record_success(action, value, was_approved, results)
+        return self._record_error(action, value, results)
+
+    async def _invoke_tool(self, action: Action) -> Any:
+        """
+        ツールを呼び出して結果を返す（履歴・UIへの記録はしない）。
+        ファイル系ツールはブロッキング I/O を自分で I/O スレッドに逃がす（companion.base.io_executor）ので、
+        並列実行時もそのまま await すればよい。
+        """
+        # Execute tool
+        func = self.tools[action.name]
+        logger.info(f"Calling tool: {action.name}")
+
+        # --- シグネチャフィルタ ---
+        # 関数が受け付けないkwargs（例: content）を除去してTypeErrorを防ぐ
+        import inspect as _inspect
+        _sig = _inspect.signature(func)
+        _has_var_kw = any(
+            p.kind == _inspect.Parameter.VAR_KEYWORD
+            for p in _sig.parameters.values()
+        )
+        if _has_var_kw:
+            # **kwargs を受け付ける関数はすべて渡す
+            call_params = action.parameters
+        else:
+            _valid = set(_sig.parameters.keys())
+            _dropped = set(action.parameters.keys()) - _valid
+            if _dropped:
+                logger.warning(
+                    f"Tool '{action.name}': dropping unexpected params: {_dropped}"
+                )
+            call_params = {k: v for k, v in action.parameters.items() if k in _valid}
+        # -----------------------
+
+        # Check if function is async
+        if asyncio.iscoroutinefunction(func):
+            return await func(**call_params)
+        return func(**call_params)
+
+    def _record_success(self, action: Action, result: Any, was_approved: bool, results: list) -> bool:
+        """成功したツール結果を会話履歴・UI・Pacemaker に反映する。常に False（エラーなし）を返す。"""
+        logger.info(f"Tool {action.name} returned. Result length: {len(str(result))}")
+        
+        # Record result
+        self.state.last_action_result = f"Action '{action.name}' succeeded: {result}"
+        
+        # Add result to conversation history (for LLM context in next cycle)
+        if action.name not in ("response",):
+            # Prepare tool result for conversion
+            tool_status = ToolStatus.OK
+            # We could implement truncation check here if needed later
+            
+            tool_res = ToolResult(
+                status=tool_status,
+                tool_name=action.name,
+                target=action.parameters.get("path", action.parameters.get("command", "task")),
+                content=result
+            )
+            formatted_res = format_symops_response(tool_res)
+
+            # ファイルが書き換わったら、それ以前の read_file 結果をスタブに畳む（全文はアーカイブへ）
+            if (
+                action.name in FILE_WRITE_TOOLS
+                and isinstance(tool_res.target, str)
+                and config.get_bool("llm.agent.collapse_stale_reads", True)
+            ):
+                superseded = self.state.conversation_history.record_file_change(tool_res.target)
+                if superseded:
+                    self.memory_manager.archive_storage.archive_messages(superseded)
+                    logger.info(f"Collapsed {len(superseded)} stale read(s) of {tool_res.target}")
+
+            # If this action required approval, add explicit completion message
+            if was_approved:
+                completion_msg = (
+                    f"{formatted_res}\n\n"
+                    f"[System: User approved action. Proceed with next steps.]"
+                )
+                self.state.add_message("user", completion_msg, tool=action.name, target=tool_res.target)
+            else:
+                self.state.add_message("user", formatted_res, tool=action.name, target=tool_res.target)
+            
+            if isinstance(result, str):
+                ui.print_result(result)
+            else:
+                ui.print_result(serialize_to_text(result))
+        
+        results.append(result)
+
+        # Update Pacemaker vitals (success)
+        self.pacemaker.update_vitals(action, result, is_error=False)
+        return False
+
+    def _record_error(self, action: Action, e: Exception, results: list) -> bool:
+        """失敗したツール呼び出しを会話履歴・UI・Pacemaker に反映する。常に True（エラー）を返す。"""
+        error_msg = f"Action '{action.name}' failed: {str(e)}"
+        logger.error(error_msg, exc_info=e)
+        self.state.last_action_result = error_msg
+        ui.print_result(str(e), is_error=True)
+
+        # 引数不足などの TypeError を構文エラーとして記録
+        if isinstance(e, TypeError):
+            self.state.last_syntax_errors.append(SyntaxErrorInfo(
+                error_type='missing_param',
+                raw_snippet=str(e)[:200],
+                correction_hint='Required parameter is missing. Check the tool signature.',
+            ))
+
+        # Add error to conversation history in Sym-Ops format
+        err_res = ToolResult(
+            status=ToolStatus.ERROR,
+            tool_name=action.name,
+            target=action.parameters.get("path", action.parameters.get("command", "task")),
+            content=e
+        )
+        self.state.add_message("user", format_symops_response(err_res), tool=action.name, target=err_res.target)
+
+        results.append(error_msg)
+
+        # Update Pacemaker vitals (error)
+        self.pacemaker.update_vitals(action, error_msg, is_error=True)
+        return True
+
     # --- No-op (LLMのプロトコル的出力を吸収) ---
 
     async def _noop(self, **kwargs) -> str:
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from companion.state.agent_state import Action
+
+logger = logging.getLogger(__name__)
+
+# 触れるファイルが分からないため、バッチの中で並列実行しないアクション
+BARRIER_ACTIONS = frozenset({"run_command"})
+
+
+class DependencyCycleError(Exception):
+    """Raised when depends_on inside a batch forms a cycle."""
+    def __init__(self, cycle: List[int], description: str):
+        self.cycle = cycle
+        self.description = description
+        super().__init__(f"Dependency cycle in execute_batch: {description}")
+
+
+class DependencyFailedError(Exception):
+    """依存先が失敗・拒否されたため実行しなかったアクション。"""
+    def __init__(self, action: Action, dependency: Action):
+        self.dependency = dependency
+        super().__init__(
+            f"Skipped '{action.name}' because its dependency "
+            f"'{dependency.name} @{_target(dependency)}' did not succeed."
+        )
+
+
+def _target(action: Action) -> str:
+    return str(action.parameters.get("path", action.parameters.get("command", "")))
+
+
+def _normalize_path(path: str) -> str:
+    path = path.strip().strip('"\'').replace('\\', '/')
+    while path.startswith('./'):
+        path = path[2:]
+    return path
+
+
+class BatchScheduler:
+    """
+    Dependency-aware scheduler for actions expanded from ::execute_batch.
+
+    depends_on（"@path > dependency"）から DAG を組み立て、
+    依存関係のないアクション同士を並列に実行する。
+    depends_on には同じバッチ内のアクションの @target（パス）か 1始まりの番号を指定する。
+    カンマ区切りで複数指定可能。該当するアクションがない依存は無視する。
+    同じパスを対象とするアクション同士は、書かれた順に直列化する（書き込みの競合防止）。
+    run_command はどのファイルに触れるか分からないので、バッチ内の前後のアクションとの間の仕切りにする
+    （それより前のアクションがすべて終わってから実行し、後のアクションはその完了を待つ）。
+    仕切りは順序だけを決める（逐次実行と同じく、前のアクションが失敗・拒否されても実行する）。
+    """
+
+    def __init__(self, actions: List[Action], max_parallel: int = 4):
+        self.actions = actions
+        self.max_parallel = max(1, max_parallel)
+        self.dependencies = self.build_graph(actions)
+        # 仕切りによる依存（失敗を伝播しない）
+        explicit = self.build_graph(actions, barriers=False)
+        self.ordering_only = {i: deps - explicit[i] for i, deps in self.dependencies.items()}
+
+    @staticmethod
+    def build_graph(actions: List[Action], barriers: bool = True) -> Dict[int, Set[int]]:
+        """
+        Build {index: indices it depends on}.
+        barriers=False なら run_command の仕切りによる依存を含めない。
+
+        Raises:
+            DependencyCycleError: depends_on が循環している場合
+        """
+        by_path: Dict[str, List[int]] = {}
+        for i, action in enumerate(actions):
+            path = action.parameters.get("path")
+            if isinstance(path, str) and path:
+                by_path.setdefault(_normalize_path(path), []).append(i)
+
+        graph: Dict[int, Set[int]] = {i: set() for i in range(len(actions))}
+        for indices in by_path.values():
+            for prev, cur in zip(indices, indices[1:]):
+                graph[cur].add(prev)
+
+        # run_command は前後のアクションとの仕切り
+        last_command: Optional[int] = None
+        for i, action in enumerate(actions):
+            if not barriers:
+                break
+            if action.name in BARRIER_ACTIONS:
+                graph[i].update(range(0 if last_command is None else last_command, i))
+                last_command = i
+            elif last_command is not None:
+                graph[i].add(last_command)
+
+        for i, action in enumerate(actions):
+            if not action.depends_on:
+                continue
+            for token in action.depends_on.split(','):
+                token = token.strip()
+                if not token:
+                    continue
+                if token.isdigit():
+                    targets = [int(token) - 1] if 0 < int(token) <= len(actions) else []
+                else:
+                    targets = by_path.get(_normalize_path(token), [])
+                targets = [t for t in targets if t != i]
+                if not targets:
+                    logger.warning(f"Batch action '{action.name}': unresolved dependency '{token}' ignored")
+                graph[i].update(targets)
+
+        cycle = BatchScheduler._find_cycle(graph)
+        if cycle:
+            description = " -> ".join(f"{actions[i].name} @{_target(actions[i])}" for i in cycle)
+            raise DependencyCycleError(cycle, description)
+        return graph
+
+    @staticmethod
+    def _find_cycle(graph: Dict[int, Set[int]]) -> Optional[List[int]]:
+        """循環があればそれを構成するインデックスの列（先頭に戻る）を返す。"""
+        WHITE, GREY, BLACK = 0, 1, 2
+        color = {node: WHITE for node in graph}
+        stack: List[int] = []
+
+        def visit(node: int) -> Optional[List[int]]:
+            color[node] = GREY
+            stack.append(node)
+            for dep in sorted(graph[node]):
+                if color[dep] == GREY:
+                    return stack[stack.index(dep):] + [dep]
+                if color[dep] == WHITE:
+                    found = visit(dep)
+                    if found:
+                        return found
+            stack.pop()
+            color[node] = BLACK
+            return None
+
+        for node in sorted(graph):
+            if color[node] == WHITE:
+                found = visit(node)
+                if found:
+                    return found
+        return None
+
+    async def run(
+        self,
+        invoke: Callable[[int, Action], Awaitable[Tuple[bool, Any]]],
+        skip: Optional[Set[int]] = None,
+    ) -> List[Tuple[bool, Any]]:
+        """
+        全アクションを依存順に実行し、(成功したか, 結果または例外) を元の順序で返す。
+
+        Args:
+            invoke: 1アクションを実行するコルーチン関数。例外を送出せず (ok, value) を返すこと
+            skip: 実行しないアクションのインデックス（承認拒否など）。失敗扱いで依存先にも伝播する
+        """
+        skip = skip or set()
+        semaphore = asyncio.Semaphore(self.max_parallel)
+        done: Dict[int, asyncio.Future] = {
+            i: asyncio.get_running_loop().create_future() for i in range(len(self.actions))
+        }
+        outcomes: List[Optional[Tuple[bool, Any]]] = [None] * len(self.actions)
+
+        async def run_one(index: int) -> None:
+            action = self.actions[index]
+            try:
+                for dep in sorted(self.dependencies[index]):
+                    if not await done[dep] and dep not in self.ordering_only[index]:
+                        outcomes[index] = (False, DependencyFailedError(action, self.actions[dep]))
+                        return
+                if index in skip:
+                    return
+                async with semaphore:
+                    outcomes[index] = await invoke(index, action)
+            finally:
+                ok = outcomes[index] is not None and outcomes[index][0] and index not in skip
+                done[index].set_result(ok)
+
+        await asyncio.gather(*(run_one(i) for i in range(len(self.actions))))
+        return outcomes
@@ -46,7 +46,7 @@ class ResultSummarizer:
         
         try:
             # Call LLM for summary
-            summary_obj = await self.llm.chat(messages, response_model=ExecutionSummary)
+            summary_obj = await self.llm.chat(messages, response_model=ExecutionSummary, priority="background", caller="summarizer")
             
             # Format the summary nicely
             formatted_summary = self._format_summary(summary_obj, execution_data)
@@ -46,16 +46,21 @@ class ArchiveStorage:
         try:
             with open(file_path, "a", encoding="utf-8") as f:
                 for msg in messages:
-                    # Add timestamp if missing
-                    if "timestamp" not in msg:
-                        msg["timestamp"] = datetime.now().isoformat()
-                    
+                    # 履歴のレコード（MessageRecord）は時刻・ツール名・対象を属性で持つ
+                    timestamp = getattr(msg, "timestamp", None) or msg.get("timestamp")
+                    if isinstance(timestamp, (int, float)):
+                        timestamp = datetime.fromtimestamp(timestamp).isoformat()
+                    metadata = dict(msg.get("metadata", {}))
+                    for key in ("tool", "target"):
+                        if getattr(msg, key, None):
+                            metadata[key] = getattr(msg, key)
+
                     # Create a record wrapper
                     record = {
-                        "timestamp": msg.get("timestamp"),
+                        "timestamp": timestamp or datetime.now().isoformat(),
                         "role": msg.get("role", "unknown"),
                         "content": msg.get("content", ""),
-                        "metadata": msg.get("metadata", {})
+                        "metadata": metadata
                     }
                     
                     f.write(json.dumps(record, ensure_ascii=False) + "\n")
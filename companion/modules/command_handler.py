@@ -6,6 +6,7 @@ from rich.panel import Panel
 from rich.syntax import Syntax
 
 from companion.config.config_loader import config
+from companion.base.usage_ledger import SESSION_ID, get_usage_ledger
 from companion.ui import ui
 from companion.modules.model_manager import model_manager
 from companion.tools import get_project_tree
@@ -26,6 +27,7 @@ class CommandHandler:
             "/scan": self.handle_scan,
             "/log": self.handle_log,
             "/config": self.handle_config,
+            "/usage": self.handle_usage,
         }
 
     def is_command(self, input_text: str) -> bool:
@@ -213,6 +215,7 @@ class CommandHandler:
         [cyan]/scan <depth>[/cyan]     - Show project tree (default depth: 3)
         [cyan]/log[/cyan]              - Toggle full log verbosity (Alt+V also works)
         [cyan]/config[/cyan]           - Show/set configuration or run setup wizard
+        [cyan]/usage [days][/cyan]       - Show LLM usage by caller (session) and by day
         [cyan]/help[/cyan]               - Show this help
         """
         if hasattr(ui, 'console'):
@@ -220,6 +223,45 @@ class CommandHandler:
         else:
             print(help_text)
 
+    async def handle_usage(self, args: List[str]):
+        """LLM 使用量（呼び出し元別のセッション集計と日別集計）を表示する。"""
+        days = int(args[0]) if args and args[0].isdigit() else 7
+        ledger = get_usage_ledger()
+
+        def build_table(title: str, label: str, rollup: Dict[str, Dict[str, float]]) -> Table:
+            table = Table(title=title, show_header=True, header_style="bold magenta", box=None)
+            table.add_column(label, style="cyan")
+            for column in ("Calls", "Prompt", "Cached", "Cache %", "Completion", "Retries", "Avg latency", "Avg TTFT", "Queue", "Cost"):
+                table.add_column(column, justify="right")
+            for group, t in rollup.items():
+                table.add_row(
+                    group,
+                    f"{int(t['calls']):,}",
+                    f"{int(t['prompt_tokens']):,}",
+                    f"{int(t['cached_tokens']):,}",
+                    f"{t['cached_tokens'] / t['prompt_tokens']:.0%}" if t['prompt_tokens'] else "-",
+                    f"{int(t['completion_tokens']):,}",
+                    f"{int(t['retries'])}",
+                    f"{t['latency_avg']:.1f}s",
+                    f"{t.get('ttft_avg', 0.0):.1f}s",
+                    f"{t['queue_wait']:.1f}s",
+                    f"${t['cost']:.4f}",
+                )
+            return table
+
+        session = ledger.rollup(ledger.session_records, "caller")
+        daily = ledger.rollup(ledger.recent_days(days), "day")
+        if not hasattr(ui, 'console'):
+            print(json.dumps({"session": session, "daily": daily}, indent=2))
+            return
+        if session:
+            ui.console.print(build_table(f"This session ({SESSION_ID})", "Caller", session))
+        else:
+            ui.print_info("No LLM calls in this session yet.")
+        if daily:
+            ui.console.print(build_table(f"Last {days} days", "Day", daily))
+        ui.print_info(f"Ledger: {ledger.path}")
+
     async def handle_exit(self, args: List[str]):
         ui.print_info("Exiting agent...")
         self.agent.running = False
@@ -1,8 +1,12 @@
 from typing import List, Dict, Optional, Tuple
 from pydantic import BaseModel, Field
+import json
 import logging
+import re
 from companion.base.llm_client import get_default_client, LLMClient
+from companion.base.token_counter import get_token_counter
 from companion.modules.archive import ArchiveStorage
+from companion.state.conversation_history import ConversationHistory
 
 logger = logging.getLogger(__name__)
 
@@ -50,26 +54,29 @@ class MemoryManager:
         self.prune_count = 0  # 整理実行回数（統計用）
         self.archive_storage = ArchiveStorage()
 
-    def configure_from_context_length(self, context_length: int) -> int:
+    def configure_from_context_length(self, context_length: int, prompt_reserve: Optional[int] = None) -> int:
         """
         モデルのコンテキスト長から max_tokens を動的に計算・設定する。
 
         計算式:
-            max_tokens = (context_length - SYSTEM_PROMPT_RESERVE) * HISTORY_RATIO
+            max_tokens = (context_length - prompt_reserve) * HISTORY_RATIO
 
         下限 8,000 / 上限 200,000 でクランプ。
 
         Args:
             context_length: モデルのコンテキスト長（トークン数）
+            prompt_reserve: 履歴以外に必要なトークン数（実測した静的プロンプト + 出力上限）。
+                省略時は SYSTEM_PROMPT_RESERVE
 
         Returns:
             設定された max_tokens 値
         """
-        raw = int((context_length - self.SYSTEM_PROMPT_RESERVE) * self.HISTORY_RATIO)
+        reserve = prompt_reserve if prompt_reserve is not None else self.SYSTEM_PROMPT_RESERVE
+        raw = int((context_length - reserve) * self.HISTORY_RATIO)
         self.max_tokens = max(8_000, min(raw, 200_000))
         logger.info(
             f"MemoryManager max_tokens configured: {self.max_tokens:,} "
-            f"(from context_length={context_length:,})"
+            f"(from context_length={context_length:,}, reserve={reserve:,})"
         )
         return self.max_tokens
         
@@ -98,7 +105,8 @@ class MemoryManager:
             (pruned_history, stats)
         """
         self.prune_count += 1
-        
+        conversation_history = self._tracked(conversation_history)
+
         original_count = len(conversation_history)
         original_tokens = self._estimate_tokens(conversation_history)
         
@@ -122,8 +130,9 @@ class MemoryManager:
         # トークン予算内で選択
         target_tokens = self.max_tokens * 0.7  # 70%使用を目標
         selected_messages = self._select_within_budget(
-            scored_messages, 
-            target_tokens
+            scored_messages,
+            target_tokens,
+            [conversation_history.message_tokens(i) for i in range(original_count)]
         )
         
         # インデックス順に並び替え
@@ -150,6 +159,8 @@ class MemoryManager:
                 conversation_history,
                 selected_messages
             )
+        # 残したレコードはトークン数を持っているので、数えるのは挿入した要約だけ
+        result_history = ConversationHistory(result_history)
         
         final_count = len(result_history)
         final_tokens = self._estimate_tokens(result_history)
@@ -241,14 +252,15 @@ class MemoryManager:
     def _select_within_budget(
         self,
         scored_messages: List[Tuple[float, int, Dict]],
-        budget: int
+        budget: int,
+        token_counts: List[int]
     ) -> List[Tuple[int, Dict]]:
-        """トークン予算内で高スコアメッセージを選択"""
+        """トークン予算内で高スコアメッセージを選択（token_counts はインデックスごとのトークン数）"""
         selected = []
         remaining_budget = budget
         
         for score, idx, msg in scored_messages:
-            msg_tokens = self._estimate_tokens([msg])
+            msg_tokens = token_counts[idx]
             
             if remaining_budget - msg_tokens > 0:
                 selected.append((idx, msg))
@@ -309,10 +321,14 @@ class MemoryManager:
             response = await self.llm.chat(
                 [{"role": "user", "content": prompt}],
                 max_tokens=150,
-                temperature=0.3
+                temperature=0.3,
+                priority="background",
+                raw=True,
+                cache=True,
+                caller="memory"
             )
             
-            summary_text = response.get("summary", "（要約失敗）")
+            summary_text = self._extract_summary(response)
             
             return {
                 "role": "assistant",
@@ -344,19 +360,21 @@ class MemoryManager:
             [セッション要約メッセージ（省略なし）] + [最近N件] の圧縮済み履歴。
             サイズがしきい値以下の場合はそのまま返す。
         """
+        conversation_history = self._tracked(conversation_history)
         if not self.should_prune(conversation_history):
             return conversation_history  # サイズが小さければそのまま使用
 
         # 最近N件をトークン上限70%で切り出す（新しい方から逆順に積む）
         target_tokens = int(self.max_tokens * 0.7)
-        recent_messages: List[Dict] = []
+        keep = 0
         total = 0
-        for msg in reversed(conversation_history):
-            t = self._estimate_tokens([msg])
+        for i in range(len(conversation_history) - 1, -1, -1):
+            t = conversation_history.message_tokens(i)
             if total + t > target_tokens:
                 break
-            recent_messages.insert(0, msg)
+            keep += 1
             total += t
+        recent_messages = conversation_history[len(conversation_history) - keep:]
 
         # 保持できる分だけ残った場合はそのまま返す
         if len(recent_messages) >= len(conversation_history):
@@ -369,7 +387,7 @@ class MemoryManager:
             f"keeping {len(recent_messages)} recent messages"
         )
         summary_msg = await self._summarize_session(old_messages)
-        return [summary_msg] + recent_messages
+        return ConversationHistory([summary_msg] + recent_messages)
 
     async def _summarize_session(self, messages: List[Dict]) -> Dict:
         """
@@ -401,9 +419,13 @@ class MemoryManager:
             response = await self.llm.chat(
                 [{"role": "user", "content": prompt}],
                 max_tokens=300,
-                temperature=0.3
+                temperature=0.3,
+                priority="background",
+                raw=True,
+                cache=True,
+                caller="memory"
             )
-            summary_text = response.get("summary", "（要約失敗）")
+            summary_text = self._extract_summary(response)
             return {
                 "role": "system",
                 "content": (
@@ -418,8 +440,31 @@ class MemoryManager:
                 "content": f"[前回セッションの{len(messages)}件のメッセージが省略されました]"
             }
 
+    @staticmethod
+    def _extract_summary(response: str) -> str:
+        """要約レスポンス（{"summary": ...} 形式のJSON、コードフェンス付きも可）から本文を取り出す"""
+        text = (response or "").strip()
+        match = re.search(r"\{.*\}", text, re.DOTALL)
+        if match:
+            try:
+                data = json.loads(match.group(0))
+                if isinstance(data, dict) and data.get("summary"):
+                    return str(data["summary"])
+            except json.JSONDecodeError:
+                pass
+        # JSONで返らなかった場合はテキストをそのまま使う
+        return text or "（要約失敗）"
+
     def _estimate_tokens(self, messages: List[Dict]) -> int:
-        """トークン数を概算"""
-        total_chars = sum(len(msg.get("content", "")) for msg in messages)
-        # 1文字 ≈ 0.5トークン（日本語・英語混在を考慮）
-        return int(total_chars * 0.5)
+        """
+        トークン数を見積もる（実際の usage で補正済みのトークンカウンター）。
+        ConversationHistory なら追跡済みの合計を返す（O(1)）。
+        """
+        if isinstance(messages, ConversationHistory):
+            return messages.total_tokens()
+        return get_token_counter().count_messages(messages)
+
+    @staticmethod
+    def _tracked(messages: List[Dict]) -> ConversationHistory:
+        """トークン数を追跡していない list を ConversationHistory にする。"""
+        return messages if isinstance(messages, ConversationHistory) else ConversationHistory(messages)
@@ -1,12 +1,12 @@
 import os
 import json
 import logging
-import asyncio
 from typing import List, Dict, Any, Optional
 from pathlib import Path
-import urllib.request
 from datetime import datetime, timedelta
 
+from companion.base.http_pool import get_http_client
+
 logger = logging.getLogger(__name__)
 
 class ModelManager:
@@ -72,16 +72,12 @@ class ModelManager:
         logger.info("📡 Fetching OpenRouter model list...")
         
         try:
-            # Using urllib.request for minimal dependencies
             # OpenRouter models endpoint doesn't require API key for listing
+            # LLM 呼び出しと同じ接続プールを使う（TLS 接続を再利用）
             url = "https://openrouter.ai/api/v1/models"
-            
-            def _fetch():
-                with urllib.request.urlopen(url, timeout=10) as response:
-                    return json.loads(response.read().decode())
-
-            # Run synchronous urllib in thread pool
-            data = await asyncio.to_thread(_fetch)
+            response = await get_http_client(url).get(url, timeout=10.0)
+            response.raise_for_status()
+            data = response.json()
             
             raw_models = data.get("data", [])
             processed_models = []
@@ -96,6 +92,8 @@ class ModelManager:
                 pricing = m.get("pricing", {})
                 prompt_price = pricing.get("prompt", "0")
                 completion_price = pricing.get("completion", "0")
+                # プロンプトキャッシュ読み出しの価格（対応モデルのみ）
+                cached_price = pricing.get("input_cache_read", prompt_price)
                 
                 # Description
                 description = m.get("description", "")
@@ -107,6 +105,7 @@ class ModelManager:
                     "context_length": context_length,
                     "prompt_price": prompt_price,
                     "completion_price": completion_price,
+                    "cached_price": cached_price,
                     "description": description
                 })
             
@@ -56,11 +56,7 @@ class SessionManager:
         """
         session_file = self.session_dir / f"{state.session_id}.json"
         try:
-            data = state.to_session_dict()
-            session_file.write_text(
-                json.dumps(data, ensure_ascii=False, indent=2),
-                encoding='utf-8'
-            )
+            session_file.write_text(state.to_session_json(), encoding='utf-8')
             self._update_index(state)
             logger.debug(f"Session saved: {state.session_id} (turn={state.turn_count})")
         except Exception as e:
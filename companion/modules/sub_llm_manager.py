@@ -4,6 +4,7 @@
 import logging
 from typing import Optional, Dict, Any
 from companion.base.llm_client import LLMClient
+from companion.base.token_counter import get_token_counter
 from companion.prompts.sub_llm_prompts import (
     SUMMARIZER_SYSTEM_PROMPT,
     ANALYZER_SYSTEM_PROMPT,
@@ -17,8 +18,8 @@ class SubLLMManager:
     Manages delegation of tasks to specialized Sub-LLMs with guardrails.
     """
     
-    # 1 character ≈ 0.25 tokens. 32,000 chars ≈ 8,000 tokens.
-    MAX_CHAR_LIMIT = 32000 
+    # Input guardrail in tokens (counted with the calibrated token counter).
+    MAX_INPUT_TOKENS = 8000
     
     def __init__(self, llm_client: LLMClient):
         self.llm = llm_client
@@ -27,21 +28,23 @@ class SubLLMManager:
         """
         Check if the input size is within safety limits.
         """
-        return len(text) <= self.MAX_CHAR_LIMIT
+        return get_token_counter().count_text(text, self.llm.model) <= self.MAX_INPUT_TOKENS
 
     async def call_worker(
         self, 
         system_prompt: str, 
         user_content: str,
-        temperature: float = 0.2
+        temperature: float = 0.2,
+        cache: bool = False
     ) -> str:
         """
         Invoke a Sub-LLM worker.
+        cache=True なら同一入力のレスポンスをディスクキャッシュから返す（llm.response_cache.enabled が true のときのみ）。
         """
         # Guardrail check
         if not self.validate_input_size(user_content):
             error_msg = (
-                f"Error: Input context size exceeded the safety limit ({self.MAX_CHAR_LIMIT} chars).\n"
+                f"Error: Input context size exceeded the safety limit ({self.MAX_INPUT_TOKENS} tokens).\n"
                 "Please reduce the context range or split the task."
             )
             logger.error(error_msg)
@@ -61,7 +64,9 @@ class SubLLMManager:
             response = await self.llm.chat(
                 messages=messages,
                 temperature=temperature,
-                raw=True
+                raw=True,
+                cache=cache,
+                caller="sub_llm"
             )
             return response.strip()
         except Exception as e:
@@ -71,11 +76,11 @@ class SubLLMManager:
 
     async def summarize(self, text: str) -> str:
         """Compress text using Summarization Sub-LLM."""
-        return await self.call_worker(SUMMARIZER_SYSTEM_PROMPT, text)
+        return await self.call_worker(SUMMARIZER_SYSTEM_PROMPT, text, cache=True)
 
     async def analyze_structure(self, code: str) -> str:
         """Analyze code structure using Analyzer Sub-LLM."""
-        return await self.call_worker(ANALYZER_SYSTEM_PROMPT, code)
+        return await self.call_worker(ANALYZER_SYSTEM_PROMPT, code, cache=True)
 
     async def generate_code(self, instruction: str, context: str) -> str:
         """Generate code using CodeGen Sub-LLM."""
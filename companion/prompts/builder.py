@@ -6,8 +6,11 @@ AgentState を受け取り、動的にシステムプロンプトを組み立て
 動的な部分を後半に配置する階層構造を持つ。
 """
 
-from typing import List
+from typing import List, Optional, Sequence
 
+from companion.config.config_loader import config
+from companion.prompts.cache_planner import CacheBreakpointPlanner
+from companion.state.conversation_history import MessageView
 from companion.state.agent_state import AgentState
 from companion.prompts.templates import SYSTEM_PROMPT_TEMPLATE, MODE_MAP
 from companion.prompts.few_shot import get_examples_for_mode
@@ -17,10 +20,28 @@ from companion.utils.response_format import SYMOPS_SYSTEM_PROMPT
 class PromptBuilder:
     """
     AgentState からシステムプロンプトを組み立てるビルダー。
+
+    レイアウト（duckflow.yaml の llm.prompt_layout）:
+        cache_stable: [静的プレフィックス] + [会話履歴] + [動的な状態コンテキスト]
+            履歴がターン間でバイト単位で変わらないため、プロバイダーのプロンプトキャッシュに
+            履歴まで含めたプレフィックスが乗る。状態コンテキストは [SYSTEM] 付きの user メッセージ
+            （途中の system メッセージは先頭にまとめるプロバイダーがあり、プレフィックスが崩れるため）。
+        legacy: [静的プレフィックス] + [動的な状態コンテキスト] + [会話履歴]
+            状態コンテキストが毎ターン変わるため、キャッシュは静的プレフィックスまで。
+
+    cache_planner を渡すと、cache_stable レイアウトで会話履歴にも cache_control の
+    ブレークポイントを置く（ターンをまたいで使い回すため、呼び出し側が保持する）。
     """
 
-    def __init__(self, state: AgentState) -> None:
+    LAYOUTS = ("cache_stable", "legacy")
+
+    def __init__(self, state: AgentState, layout: Optional[str] = None, cache_planner: Optional[CacheBreakpointPlanner] = None) -> None:
         self.state = state
+        self.cache_planner = cache_planner
+        self.layout = layout or config.get("llm.prompt_layout", "cache_stable")
+        if self.layout not in self.LAYOUTS:
+            self.layout = "cache_stable"
+        self.dynamic_context = ""
 
     def build_messages(self, tool_descriptions: str) -> List[dict]:
         """
@@ -30,8 +51,40 @@ class PromptBuilder:
         1. system: 静的なプロトコル指示（常にキャッシュ）
         2. system: モード固有のツール説明（同一モード内ではキャッシュ）
         3. user/assistant: モード固有の Few-shot 例（同一モード内ではキャッシュ）
-        4. system: 動的な状態コンテキスト（ターンごとに変化）
+        4. system: 動的な状態コンテキスト（ターンごとに変化。legacy レイアウトのみ）
+
+        cache_stable レイアウトでは 4 を含めず self.dynamic_context に保持し、
+        assemble() で会話履歴の後ろに付ける。状態はこの呼び出し時点のものを使う。
+        """
+        messages = self.build_static_messages(tool_descriptions)
+        self.dynamic_context = self.build_dynamic_context()
+
+        if self.layout == "legacy" and self.dynamic_context:
+            messages.append({"role": "system", "content": self.dynamic_context})
+
+        return messages
+
+    def assemble(self, base_messages: List[dict], history: Sequence[dict], trailing: Optional[List[dict]] = None) -> MessageView:
         """
+        build_messages() の結果と会話履歴から、LLM に送るメッセージ列を組み立てる。
+        会話履歴はコピーせずにビューとして連結する（履歴が数千件でも組み立てのコストは一定）。
+
+        Args:
+            base_messages: build_messages() の戻り値
+            history: 会話履歴（変更しない）
+            trailing: 末尾に付けるメッセージ（Pacemaker 介入の指示など）
+        """
+        if self.layout == "cache_stable" and self.cache_planner is not None:
+            history = self.cache_planner.apply(base_messages, history)
+        tail = []
+        if self.layout == "cache_stable" and self.dynamic_context:
+            tail.append({"role": "user", "content": f"[SYSTEM]\n{self.dynamic_context}"})
+        if trailing:
+            tail.extend(trailing)
+        return MessageView(base_messages, history, tail)
+
+    def build_static_messages(self, tool_descriptions: str) -> List[dict]:
+        """ターン間で変わらないプレフィックス（プロトコル・モード指示・Few-shot）。"""
         mode = self.state.get_context_mode()
         
         # 1. 静的なシステム指示（最上位：哲学とプロトコル）
@@ -50,18 +103,16 @@ class PromptBuilder:
             few_shots = [msg.copy() for msg in few_shots]
             few_shots[-1]["cache_control"] = {"type": "ephemeral"}
             messages.extend(few_shots)
-        
-        # 4. 動的なコンテキスト（ここから毎ターン確実に変動する）
-        dynamic_context = (
+
+        return messages
+
+    def build_dynamic_context(self) -> str:
+        """毎ターン変動する状態コンテキスト（状態・バイタル・直前のエラーの修正ガイド）。"""
+        return (
             "## Current State & Context\n" +
             self.state.to_prompt_context() + "\n\n" +
             self._build_error_feedback()
         ).strip()
-        
-        if dynamic_context:
-            messages.append({"role": "system", "content": dynamic_context})
-            
-        return messages
 
     def _build_mode_static(self, tool_descriptions: str) -> str:
         """
@@ -0,0 +1,124 @@
+"""
+Rolling prompt-cache breakpoints for conversation history.
+
+Anthropic（OpenRouter 経由を含む）のプロンプトキャッシュは cache_control を付けた位置までの
+プレフィックスを保存し、次のリクエストではブレークポイント（と、その手前の一定数のブロック）で
+一致するプレフィックスを探す。ブレークポイントは1リクエストあたり最大4つ。
+
+CacheBreakpointPlanner はターンをまたいで状態を持ち、
+    1. 静的プレフィックスの末尾（Few-shot の最後。PromptBuilder が付与済み）
+    2. 会話履歴の最新の末尾（今回のプレフィックスをキャッシュに書き込む）
+    3. 前のターンまでに付けた履歴上の位置（前ターンが書き込んだプレフィックスを読む）
+の順にブレークポイントを置く。履歴が伸びるとブレークポイントも前に進む。
+前回の位置はメッセージ内容のハッシュで覚えるので、メモリの枝刈りで履歴が書き換わって
+見つからなくなった位置は自動的に捨てられる。
+
+設定（duckflow.yaml の llm.prompt_cache）:
+    max_breakpoints:   1リクエストあたりのブレークポイント数の上限（Anthropic は 4）
+    min_prefix_tokens: これより短いプレフィックスにはブレークポイントを置かない（キャッシュされないため）
+    min_block_tokens:  ブレークポイント同士の最小間隔（短すぎる区間に枠を使わない）
+"""
+import hashlib
+from typing import Dict, List, Optional, Sequence
+
+from companion.base.token_counter import get_token_counter
+from companion.config.config_loader import config
+from companion.state.conversation_history import ConversationHistory, MessageRecord, MessageView
+
+CACHE_MARKER = {"type": "ephemeral"}
+
+
+def _fingerprint(message: Dict) -> str:
+    if isinstance(message, MessageRecord):
+        return message.fingerprint
+    content = message.get("content", "")
+    digest = hashlib.sha1(f"{message.get('role', '')}\x00{content}".encode("utf-8", "replace"))
+    return digest.hexdigest()
+
+
+class CacheBreakpointPlanner:
+    """Places cache_control breakpoints on stable history boundaries, turn after turn."""
+
+    def __init__(
+        self,
+        max_breakpoints: Optional[int] = None,
+        min_prefix_tokens: Optional[int] = None,
+        min_block_tokens: Optional[int] = None,
+    ):
+        self.max_breakpoints = int(
+            max_breakpoints if max_breakpoints is not None else config.get("llm.prompt_cache.max_breakpoints", 4)
+        )
+        self.min_prefix_tokens = int(
+            min_prefix_tokens if min_prefix_tokens is not None else config.get("llm.prompt_cache.min_prefix_tokens", 1024)
+        )
+        self.min_block_tokens = int(
+            min_block_tokens if min_block_tokens is not None else config.get("llm.prompt_cache.min_block_tokens", 1024)
+        )
+        # 前のターンまでにブレークポイントを置いた履歴メッセージ（新しい順）
+        self.anchors: List[str] = []
+
+    def plan(self, prefix: Sequence[Dict], history: Sequence[Dict]) -> List[int]:
+        """
+        history のうちブレークポイントを置くインデックス（昇順）を返し、次のターン用に記憶する。
+
+        Args:
+            prefix: 履歴の前に置くメッセージ（静的プレフィックス）。cache_control 付きのものは枠を消費する
+            history: 会話履歴
+        """
+        budget = self.max_breakpoints - sum(1 for m in prefix if "cache_control" in m)
+        if budget <= 0 or not history:
+            return []
+
+        # 新しい方から遡り、各メッセージ末尾までの累積トークン数と前回の位置を求める。
+        # 前回の位置がすべて見つかったら止める（ブレークポイントは最近の履歴にあるので、長い履歴でも一定の手間）
+        counter = get_token_counter()
+        base = counter.count_messages(prefix)
+        tracked = isinstance(history, ConversationHistory)
+        end_total = base + (history.total_tokens() if tracked else counter.count_messages(history))
+        cumulative: Dict[int, int] = {}
+        fingerprints: Dict[int, str] = {}
+        positions: Dict[str, int] = {}
+        wanted = set(self.anchors)
+        total = end_total
+        for i in range(len(history) - 1, -1, -1):
+            cumulative[i] = total
+            fp = _fingerprint(history[i])
+            fingerprints[i] = fp
+            if fp in wanted and fp not in positions:
+                positions[fp] = i
+            if len(positions) == len(wanted):
+                break
+            total -= history.message_tokens(i) if tracked else counter.count_message(history[i])
+
+        # 最新の末尾 → 前のターンの位置（新しい順）
+        candidates = [len(history) - 1]
+        candidates += [positions[fp] for fp in self.anchors if fp in positions]
+
+        chosen: List[int] = []
+        for index in candidates:
+            if len(chosen) >= budget:
+                break
+            if index in chosen or cumulative[index] < self.min_prefix_tokens:
+                continue
+            # 既に選んだ位置や静的プレフィックスとの間隔が短すぎるものは飛ばす
+            if any(abs(cumulative[index] - cumulative[c]) < self.min_block_tokens for c in chosen):
+                continue
+            if cumulative[index] - base < self.min_block_tokens and index != candidates[0]:
+                continue
+            chosen.append(index)
+
+        # 新しい順に記憶する（次のターンで古い位置から枠が足りなくなって外れる）
+        self.anchors = [fingerprints[i] for i in sorted(chosen, reverse=True)]
+        return sorted(chosen)
+
+    def apply(self, prefix: Sequence[Dict], history: Sequence[Dict]) -> MessageView:
+        """
+        ブレークポイントを付けた履歴のビューを返す（元の履歴は変更もコピーもしない）。
+        ブレークポイントの位置だけ cache_control 付きの dict に差し替える。
+        """
+        marked = self.plan(prefix, history)
+        overrides = {i: {**history[i], "cache_control": dict(CACHE_MARKER)} for i in marked}
+        return MessageView(history, overrides=overrides)
+
+    def reset(self) -> None:
+        self.anchors = []
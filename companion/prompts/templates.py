@@ -60,7 +60,7 @@ not just the output.
 ## Memory & Context
 - You have access to the full conversation history.
 - `read_file` results are in the history. It uses pagination (start, end).
-  For large files, it returns `size_bytes` and `has_more`.
+  For large files, it returns `size_bytes`, `total_lines` and `has_more`.
 - All sensitive values (API keys, secrets, tokens) must remain redacted in output.
 </memory_and_context>
 
@@ -200,8 +200,10 @@ TASK_MODE_INSTRUCTIONS = """
 Execute the current plan step. Keep moving until the step is complete.
 
 1. Break the step into atomic tasks with `::generate_tasks`.
-2. Use Fast Path (`::execute_batch`) for independent tasks.
-   Use sequential execution for dependent tasks.
+2. Use Fast Path (`::execute_batch`) for independent tasks; they run in parallel.
+   Inside a batch, mark an action that must wait for another with `@path > dependency`
+   (the other action's path, or its 1-based position in the batch).
+   `run_command` in a batch always waits for every action before it, and later actions wait for it.
 3. After each action, use `::note` to state:
    - What you just did
    - What you will do next
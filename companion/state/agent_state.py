@@ -1,9 +1,12 @@
 from typing import List, Optional, Dict, Any, Literal, Union
 from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
+import json
 import uuid
 from enum import Enum
 
+from companion.state.conversation_history import ConversationHistory
+
 # --- Enums ---
 
 class SyntaxErrorInfo(BaseModel):
@@ -126,6 +129,8 @@ class Action(BaseModel):
     name: str = Field(..., description="実行するツール/アクションの名前")
     parameters: Dict[str, Any] = Field(default_factory=dict, description="アクションの引数")
     thought: str = Field(default="", description="このアクションを選んだ理由")
+    depends_on: Optional[str] = Field(default=None, description="同じバッチ内の依存先（@target または 1始まりの番号）")
+    batch: Optional[int] = Field(default=None, description="::execute_batch から展開された場合のバッチ番号")
 
 class ActionList(BaseModel):
     """LLMの出力全体"""
@@ -144,8 +149,8 @@ class AgentState(BaseModel):
     current_mode: AgentMode = AgentMode.PLANNING
     investigation_state: Optional[InvestigationState] = None
 
-    # Context
-    conversation_history: List[Dict[str, str]] = Field(default_factory=list)
+    # Context（メッセージごとのトークン数と合計を追加・枝刈りのたびに更新する）
+    conversation_history: ConversationHistory = Field(default_factory=ConversationHistory)
     current_plan: Optional[Plan] = None
 
     # Working Memory
@@ -167,8 +172,18 @@ class AgentState(BaseModel):
     last_active: datetime = Field(default_factory=datetime.now, description='最終アクティブ日時')
     turn_count: int = Field(default=0, description='ターン数（ユーザー入力回数）')
     
-    def add_message(self, role: str, content: str):
-        self.conversation_history.append({"role": role, "content": content})
+    def __setattr__(self, name: str, value: Any) -> None:
+        # 枝刈り・セッション復元・/clear で list を代入されてもトークン数の追跡を続ける
+        if name == "conversation_history" and not isinstance(value, ConversationHistory):
+            value = ConversationHistory(value)
+        super().__setattr__(name, value)
+
+    def add_message(self, role: str, content: str, tool: Optional[str] = None, target: Optional[str] = None):
+        """
+        会話履歴にメッセージを追加する。
+        ツール結果なら tool（ツール名）と target（対象パスなど）を渡すと履歴のレコードに残る。
+        """
+        self.conversation_history.add(role, content, tool=tool, target=target)
         
     async def add_message_with_pruning(
         self, 
@@ -264,6 +279,16 @@ class AgentState(BaseModel):
         self.last_active = datetime.now()
         self.turn_count += 1
 
+    def to_session_json(self) -> str:
+        """
+        セッションファイル用の JSON 文字列。会話履歴はレコードごとにキャッシュした JSON を連結するので、
+        毎ターンの保存で履歴全体をシリアライズし直さない。
+        """
+        data = self.model_dump(mode='json', exclude={'conversation_history'})
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+        # 末尾の "\n}" の前に会話履歴を差し込む
+        return f'{text[:-2]},\n  "conversation_history": {self.conversation_history.to_json()}\n}}'
+
     def to_session_dict(self) -> dict:
         """
         セッションファイルへの保存用にJSONシリアライズする。
@@ -0,0 +1,362 @@
+"""
+Compact conversation history with incremental token accounting.
+
+AgentState.conversation_history は MessageRecord（__slots__ の軽量レコード）を並べた
+ConversationHistory（list のサブクラス）。レコードは role / content / トークン数 / 元のツール /
+対象パス / 時刻を持ち、dict と同じように読める（msg["content"], msg.get("role"), {**msg}）。
+dict を append しても自動でレコードに変換されるので、既存の呼び出し元はそのまま動く。
+
+    - トークン数はレコードに持たせ、履歴は合計を追加・削除のたびに更新する（しきい値チェックは O(1)）。
+      枝刈りでレコードを組み替えてもカウントはそのまま使える。
+      素のカウント（補正前）なので、補正係数が変わっても数え直す必要はない。
+    - role・ツール名・対象パスは sys.intern で共有する（同じツール・同じファイルの結果が繰り返し入るため）。
+    - レコードの JSON 表現はキャッシュし、セッション保存では連結するだけにする（to_json）。
+    - MessageView はプロンプト組み立て用のコピーしない連結ビュー（静的プレフィックス + 履歴 + 末尾）。
+    - ファイルごとのバージョンを数え、read_file の結果にそのときのバージョンを付ける。編集系ツールで
+      ファイルが変わると（record_file_change）、古いバージョンの読み取り結果は短いスタブに畳む。
+
+レコードは変更不可。内容を差し替えるときは history[i] = {...} のように入れ替える。
+"""
+import hashlib
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, SupportsIndex, Union
+
+from pydantic_core import core_schema
+
+from companion.base.token_counter import MESSAGE_OVERHEAD, get_token_counter
+
+# セッションファイルにだけ保存するメタデータのキー（LLM には送らない）
+_META_KEYS = ("tool", "target", "timestamp", "version", "stale")
+
+# 結果がファイルの内容そのもの（古くなりうる）のツールと、ファイルを書き換えるツール
+FILE_READ_TOOLS = frozenset({"read_file"})
+FILE_WRITE_TOOLS = frozenset({"write_file", "edit_file", "delete_lines", "delete_file"})
+
+STALE_READ_TEMPLATE = "[stale read of {path} v{version} — superseded by v{current}. Use read_file for the current content.]"
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class MessageRecord(Mapping):
+    """Immutable, slotted conversation message that reads like a dict."""
+
+    __slots__ = (
+        "role", "content", "tokens", "tool", "target", "timestamp", "version", "stale", "extra", "_json", "_fingerprint",
+    )
+
+    def __init__(
+        self,
+        role: str,
+        content: Any,
+        tool: Optional[str] = None,
+        target: Optional[str] = None,
+        timestamp: Optional[float] = None,
+        extra: Optional[Dict[str, Any]] = None,
+        tokens: Optional[int] = None,
+        version: Optional[int] = None,
+        stale: Optional[bool] = None,
+    ):
+        set_ = object.__setattr__
+        set_(self, "role", sys.intern(role))
+        set_(self, "content", content)
+        set_(self, "tool", _intern(tool))
+        set_(self, "target", _intern(target))
+        set_(self, "timestamp", timestamp if timestamp is not None else time.time())
+        set_(self, "version", version)
+        set_(self, "stale", stale or None)
+        set_(self, "extra", extra or None)
+        set_(self, "tokens", tokens if tokens is not None else get_token_counter().raw_message_count({"content": content}))
+        set_(self, "_json", None)
+        set_(self, "_fingerprint", None)
+
+    @classmethod
+    def from_dict(cls, message: Mapping) -> "MessageRecord":
+        if isinstance(message, MessageRecord):
+            return message
+        extra = {k: v for k, v in message.items() if k not in ("role", "content") and k not in _META_KEYS}
+        return cls(
+            message.get("role", "user"),
+            message.get("content", ""),
+            tool=message.get("tool"),
+            target=message.get("target"),
+            timestamp=message.get("timestamp"),
+            extra=extra,
+            version=message.get("version"),
+            stale=message.get("stale"),
+        )
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("MessageRecord is immutable; replace the history item instead")
+
+    def __reduce__(self) -> Any:
+        return (
+            MessageRecord,
+            (self.role, self.content, self.tool, self.target, self.timestamp, self.extra, self.tokens, self.version, self.stale),
+        )
+
+    # --- Mapping（LLM に送るキーだけを見せる） ---
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield "role"
+        yield "content"
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return 2 + (len(self.extra) if self.extra else 0)
+
+    def copy(self) -> Dict[str, Any]:
+        """LLM に送る dict（dict.copy() と同じ使い方ができる）。"""
+        return dict(self)
+
+    def to_session_dict(self) -> Dict[str, Any]:
+        data = dict(self)
+        for key in _META_KEYS:
+            value = getattr(self, key)
+            if value is not None:
+                data[key] = value
+        return data
+
+    @property
+    def fingerprint(self) -> str:
+        """role と content のハッシュ（プロンプトキャッシュのブレークポイント位置の追跡用。キャッシュする）。"""
+        if self._fingerprint is None:
+            digest = hashlib.sha1(f"{self.role}\x00{self.content}".encode("utf-8", "replace"))
+            object.__setattr__(self, "_fingerprint", digest.hexdigest())
+        return self._fingerprint
+
+    def to_json(self) -> str:
+        """セッション保存用の JSON（キャッシュする）。"""
+        if self._json is None:
+            object.__setattr__(self, "_json", json.dumps(self.to_session_dict(), ensure_ascii=False))
+        return self._json
+
+    def __repr__(self) -> str:
+        preview = str(self.content)[:40].replace("\n", " ")
+        return f"MessageRecord(role={self.role!r}, tool={self.tool!r}, target={self.target!r}, content={preview!r}...)"
+
+    def stale_stub(self, current: int) -> "MessageRecord":
+        """古くなった読み取り結果の代わりに履歴に残すスタブ（メタデータは引き継ぐ）。"""
+        content = STALE_READ_TEMPLATE.format(path=self.target, version=self.version, current=current)
+        return MessageRecord(
+            self.role, content, tool=self.tool, target=self.target, timestamp=self.timestamp,
+            extra=self.extra, version=self.version, stale=True,
+        )
+
+
+Message = Union[MessageRecord, Dict[str, Any]]
+
+
+def _record(message: Message) -> MessageRecord:
+    return MessageRecord.from_dict(message)
+
+
+def _path_key(path: str) -> str:
+    # "./src/a.py" と "src/a.py" を同じファイルとして扱う（相対パスはワークスペース基準のまま）
+    return os.path.normcase(os.path.normpath(path))
+
+
+class ConversationHistory(List[MessageRecord]):
+    """Append-mostly list of MessageRecords with a running token total."""
+
+    def __init__(self, messages: Iterable[Message] = ()):
+        super().__init__(_record(m) for m in messages)
+        self._raw_total = sum(r.tokens for r in self)
+        # パス → 現在のバージョン（復元時はレコードに残ったバージョンから作り直す）
+        self.file_versions: Dict[str, int] = {}
+        for r in self:
+            if r.version is not None and r.target:
+                key = _path_key(r.target)
+                self.file_versions[key] = max(self.file_versions.get(key, 1), r.version)
+
+    def add(self, role: str, content: str, tool: Optional[str] = None, target: Optional[str] = None) -> MessageRecord:
+        """メタデータ付きでメッセージを追加する。ファイルの読み書きなら現在のバージョンを付ける。"""
+        version = None
+        if target and (tool in FILE_READ_TOOLS or tool in FILE_WRITE_TOOLS):
+            version = self.file_versions.get(_path_key(target), 1)
+        record = MessageRecord(role, content, tool=tool, target=target, version=version)
+        self.append(record)
+        return record
+
+    # --- file versions ---
+
+    def record_file_change(self, path: str) -> List[MessageRecord]:
+        """
+        path が書き換えられたことを記録し、古いバージョンの read_file 結果をスタブに畳む。
+
+        書き込みツールの結果を add する前に呼ぶ（その結果には新しいバージョンが付く）。
+        畳んだ元のレコードを返すので、呼び出し元でアーカイブに残す。
+        """
+        key = _path_key(path)
+        current = self.file_versions.get(key, 1) + 1
+        self.file_versions[key] = current
+
+        superseded: List[MessageRecord] = []
+        for i, record in enumerate(self):
+            if (
+                record.tool in FILE_READ_TOOLS
+                and not record.stale
+                and record.target
+                and record.version is not None
+                and record.version < current
+                and _path_key(record.target) == key
+            ):
+                self[i] = record.stale_stub(current)
+                superseded.append(record)
+        return superseded
+
+    def file_version(self, path: str) -> int:
+        return self.file_versions.get(_path_key(path), 1)
+
+    # --- token accounting ---
+
+    def total_tokens(self, model: Optional[str] = None) -> int:
+        """補正済みの合計トークン数（O(1)）。"""
+        factor = get_token_counter().factor(model)
+        return math.ceil(self._raw_total * factor) + MESSAGE_OVERHEAD * len(self)
+
+    def message_tokens(self, index: int, model: Optional[str] = None) -> int:
+        """index 番目のメッセージの補正済みトークン数（O(1)）。"""
+        factor = get_token_counter().factor(model)
+        return math.ceil(self[index].tokens * factor) + MESSAGE_OVERHEAD
+
+    def recount(self) -> None:
+        self._raw_total = sum(r.tokens for r in self)
+
+    # --- list mutations ---
+
+    def append(self, message: Message) -> None:
+        record = _record(message)
+        super().append(record)
+        self._raw_total += record.tokens
+
+    def extend(self, messages: Iterable[Message]) -> None:
+        records = [_record(m) for m in messages]
+        super().extend(records)
+        self._raw_total += sum(r.tokens for r in records)
+
+    def __iadd__(self, messages: Iterable[Message]) -> "ConversationHistory":
+        self.extend(messages)
+        return self
+
+    def insert(self, index: SupportsIndex, message: Message) -> None:
+        record = _record(message)
+        super().insert(index, record)
+        self._raw_total += record.tokens
+
+    def pop(self, index: SupportsIndex = -1) -> MessageRecord:
+        record = super().pop(index)
+        self._raw_total -= record.tokens
+        return record
+
+    def remove(self, message: Message) -> None:
+        self.pop(self.index(message))
+
+    def clear(self) -> None:
+        super().clear()
+        self._raw_total = 0
+
+    def __setitem__(self, index: Union[SupportsIndex, slice], value: Any) -> None:
+        if isinstance(index, slice):
+            super().__setitem__(index, [_record(m) for m in value])
+            self.recount()
+            return
+        record = _record(value)
+        self._raw_total += record.tokens - self[index].tokens
+        super().__setitem__(index, record)
+
+    def __delitem__(self, index: Union[SupportsIndex, slice]) -> None:
+        removed = self[index]
+        super().__delitem__(index)
+        self._raw_total -= sum(r.tokens for r in removed) if isinstance(index, slice) else removed.tokens
+
+    def copy(self) -> "ConversationHistory":
+        return ConversationHistory(self)
+
+    def __reduce_ex__(self, protocol: SupportsIndex) -> Any:
+        # copy / pickle は既定だと復元後に append し直して合計が二重になるため、セッション表現から作り直す
+        return (ConversationHistory, ([r.to_session_dict() for r in self],))
+
+    # --- serialization ---
+
+    def to_session_list(self) -> List[Dict[str, Any]]:
+        return [r.to_session_dict() for r in self]
+
+    def to_json(self) -> str:
+        """セッション保存用の JSON 配列（レコードごとのキャッシュを連結するだけ）。"""
+        return "[" + ", ".join(r.to_json() for r in self) + "]"
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source: Any, handler: Any) -> core_schema.CoreSchema:
+        # 受け付けるのは ConversationHistory か dict のリスト。保存時はメタデータ付きの dict のリストにする
+        list_schema = core_schema.no_info_after_validator_function(cls, handler(List[Dict[str, Any]]))
+        return core_schema.json_or_python_schema(
+            json_schema=list_schema,
+            python_schema=core_schema.union_schema([core_schema.is_instance_schema(cls), list_schema]),
+            serialization=core_schema.plain_serializer_function_ser_schema(cls.to_session_list),
+        )
+
+
+class MessageView(Sequence):
+    """
+    Read-only concatenation of message sequences for prompt assembly.
+
+    セグメント（静的プレフィックス・会話履歴・末尾のメッセージ）をコピーせずに1つの列として見せる。
+    overrides は履歴全体での位置 → 差し替えるメッセージ（cache_control を付けたものなど）。
+    """
+
+    __slots__ = ("_segments", "_overrides", "_len")
+
+    def __init__(self, *segments: Sequence, overrides: Optional[Dict[int, Dict[str, Any]]] = None):
+        self._segments = tuple(s for s in segments if len(s))
+        self._overrides = overrides or {}
+        self._len = sum(len(s) for s in self._segments)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._len))]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("MessageView index out of range")
+        if index in self._overrides:
+            return self._overrides[index]
+        for segment in self._segments:
+            if index < len(segment):
+                return segment[index]
+            index -= len(segment)
+        raise IndexError("MessageView index out of range")
+
+    def __iter__(self) -> Iterator[Any]:
+        if not self._overrides:
+            return itertools.chain.from_iterable(self._segments)
+        return (self._overrides.get(i, m) for i, m in enumerate(itertools.chain.from_iterable(self._segments)))
+
+    def __add__(self, other: Sequence) -> "MessageView":
+        return MessageView(self, other)
+
+    def __radd__(self, other: Sequence) -> "MessageView":
+        return MessageView(other, self)
+
+    def __repr__(self) -> str:
+        return f"MessageView({self._len} messages, {len(self._overrides)} overridden)"
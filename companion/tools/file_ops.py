@@ -1,12 +1,32 @@
+import asyncio
 import os
 import shutil
-from typing import List, Optional
+import tempfile
+import uuid
+from typing import List, Optional, Tuple
 from pathlib import Path
+
+from companion.base.io_executor import blocking_io, get_io_executor
+from companion.config.config_loader import config
+from companion.utils.line_index import get_line_index_cache
+from companion.utils.text_search import grep_paths
+from companion.utils.trigram_index import TrigramIndex, get_trigram_index
+from companion.utils.workspace_inventory import get_workspace_inventory
 from .hashline import HashlineHelper
 
+# ファイル数がこれ以上なら grep をプロセスプールでチャンクに分けて検索する
+GREP_PROCESS_MIN_FILES = 256
+# プロセスプールに1回で渡すファイル数（小さいほど max_results に達したときの無駄な検索が減る）と、
+# 同時に投げておくチャンク数の下限
+GREP_CHUNK_FILES = 64
+GREP_CHUNKS_IN_FLIGHT = 8
+
 class FileOps:
     """
     File Operations with Duck Keeper Safety.
+
+    ツールのメソッドは async だが、中身のブロッキング I/O は I/O スレッドで実行する（@blocking_io）。
+    grep の正規表現はファイル数が多いときプロセスプールで実行する。
     """
     def __init__(self, workspace_root: str = "."):
         self.workspace_root = Path(workspace_root).resolve()
@@ -32,6 +52,13 @@ class FileOps:
             raise PermissionError(f"Duck Keeper Alert: Access denied to {path} (Outside workspace)")
         return (self.workspace_root / path).resolve()
 
+    def _file_changed(self, full_path: Path) -> None:
+        """書き込み後に行インデックス・trigram インデックス・ディレクトリ一覧を更新させる（mtime の分解能が粗いと同じサイズの書き換えを見逃すため）。"""
+        get_line_index_cache().invalidate(str(full_path))
+        get_workspace_inventory().invalidate(str(full_path))
+        if config.get_bool("llm.grep.trigram_index", False):
+            self._trigram_index().mark_dirty(str(full_path))
+
     def file_exists(self, path: str) -> bool:
         """Check if a file exists within the workspace."""
         try:
@@ -39,7 +66,8 @@ class FileOps:
         except Exception:
             return False
 
-    async def read_file(self, path: str, start: int = 1, end: int = 300) -> dict:
+    @blocking_io
+    def read_file(self, path: str, start: int = 1, end: int = 300) -> dict:
         """
         Read file content with hashline format for precise editing.
 
@@ -59,12 +87,11 @@ class FileOps:
                 "path": str,
                 "size_bytes": int,
                 "showing_lines": str,
+                "total_lines": int,
                 "content": str,  # hashline 形式
                 "has_more": bool
             }
         """
-        import itertools
-
         start_line = max(1, int(start))
         max_lines = max(1, int(end))
 
@@ -74,22 +101,11 @@ class FileOps:
         if not full_path.is_file():
             raise IsADirectoryError(f"Path is a directory: {path}")
 
-        size_bytes = os.path.getsize(full_path)
+        # 行オフセットのインデックスでページの位置へ直接 seek する（巨大なファイルの末尾でも先頭と同じコスト）
+        index = get_line_index_cache().get(str(full_path))
 
         try:
-            with open(full_path, "r", encoding="utf-8") as f:
-                # 1-indexed to 0-indexed slice
-                # islice(iterable, start, stop)
-                # To read lines from start_line, we skip start_line - 1 lines.
-                lines_it = itertools.islice(f, start_line - 1, start_line - 1 + max_lines)
-                content_lines = [line.rstrip('\n') for line in lines_it]
-
-                # Check if there is more content (has_more)
-                try:
-                    next(f)
-                    has_more = True
-                except StopIteration:
-                    has_more = False
+            content_lines, has_more = index.read_lines(start_line, max_lines)
 
             # hashline 形式に変換
             if content_lines:
@@ -99,8 +115,9 @@ class FileOps:
 
             return {
                 "path": path,
-                "size_bytes": size_bytes,
+                "size_bytes": index.size,
                 "showing_lines": f"{start_line}-{start_line + len(content_lines) - 1}",
+                "total_lines": index.line_count,
                 "content": content,
                 "has_more": has_more
             }
@@ -108,7 +125,8 @@ class FileOps:
         except UnicodeDecodeError:
             return {"error": f"File {path} is not a valid UTF-8 text file (encoding error)."}
 
-    async def write_file(self, path: str, content: str) -> str:
+    @blocking_io
+    def write_file(self, path: str, content: str) -> str:
         """
         :: write @ or overwrite a file with the provided content.
         Creates parent directories automatically.
@@ -121,9 +139,11 @@ class FileOps:
         full_path.parent.mkdir(parents=True, exist_ok=True)
         with open(full_path, "w", encoding="utf-8") as f:
             f.write(content)
+        self._file_changed(full_path)
         return f"Successfully wrote to {path}"
 
-    async def edit_file(self, path: str, anchors: str = "", content: str = "") -> str:
+    @blocking_io
+    def edit_file(self, path: str, anchors: str = "", content: str = "") -> str:
         '''
         Hashline-based file editing with precise line identification.
         Supports multi-edit via %%% segment separators.
@@ -269,6 +289,7 @@ class FileOps:
         # 書き込み
         with open(full_path, "w", encoding="utf-8") as f:
             f.write('\n'.join(file_lines))
+        self._file_changed(full_path)
 
         # 結果サマリーと最終コンテキストを生成
         if len(results_info) == 1:
@@ -297,7 +318,8 @@ class FileOps:
                 f"--- End of Context ---"
             )
 
-    async def list_files(self, path: str = ".") -> List[str]:
+    @blocking_io
+    def list_files(self, path: str = ".") -> List[str]:
         """
         List files and directories in a path.
         隠しファイル（.で始まるもの）は除外される。
@@ -312,21 +334,24 @@ class FileOps:
         if not full_path.exists():
             raise FileNotFoundError(f"Path not found: {path}")
         results = []
-        for item in full_path.iterdir():
-            if item.name.startswith("."):
+        for item in get_workspace_inventory().listing(str(full_path)):
+            if item.hidden:
                 continue
-            prefix = "[DIR] " if item.is_dir() else "[FILE]"
-            rel_path = item.relative_to(self.workspace_root)
+            prefix = "[DIR] " if item.is_dir else "[FILE]"
+            rel_path = os.path.relpath(item.path, self.workspace_root)
             results.append(f"{prefix} {rel_path}")
         return sorted(results)
 
-    async def mkdir(self, path: str) -> str:
+    @blocking_io
+    def mkdir(self, path: str) -> str:
         """Create a directory (mkdir -p)."""
         full_path = self._get_full_path(path)
         full_path.mkdir(parents=True, exist_ok=True)
+        get_workspace_inventory().invalidate(str(full_path))
         return f"Created directory {path}"
 
-    async def replace_in_file(self, path: str, search: str, replace: str) -> str:
+    @blocking_io
+    def replace_in_file(self, path: str, search: str, replace: str) -> str:
         """
         Perform a simple string replacement in a file.
         Replaces ALL occurrences of 'search' with 'replace'.
@@ -371,10 +396,12 @@ class FileOps:
         # Write back
         with open(full_path, "w", encoding="utf-8") as f:
             f.write(new_content)
+        self._file_changed(full_path)
         
         return f"Replaced {count} occurrence(s) of '{search}' in {path}"
 
-    async def edit_lines(self, path: str, start: int, end: int, content: str, dry_run: bool = True) -> str:
+    @blocking_io
+    def edit_lines(self, path: str, start: int, end: int, content: str, dry_run: bool = True) -> str:
         """ 
         行番号ベースのファイル編集（事前・事後検証プレビュー付き）。
 
@@ -457,6 +484,7 @@ class FileOps:
         
         with open(full_path, 'w', encoding='utf-8') as f:
             f.writelines(lines)
+        self._file_changed(full_path)
         
         # --- 事後検証プレビュー（Post-edit Preview） ---
         post_preview_start = max(1, start - 5)
@@ -480,7 +508,8 @@ class FileOps:
         )
 
 
-    async def find_files(self, pattern: str = "*", recursive: bool = True, path: str = ".") -> List[str]:
+    @blocking_io
+    def find_files(self, pattern: str = "*", recursive: bool = True, path: str = ".") -> List[str]:
         """
         Find files matching a pattern.
         Supports wildcards like *.py, test_*.md, etc.
@@ -511,35 +540,18 @@ class FileOps:
             # pathがファイルの場合、その親ディレクトリを検索対象にする
             start_dir = start_dir.parent
 
-        results = []
-
-        def search_dir(directory: Path, depth: int = 0):
-            if depth > 10:  # Prevent infinite recursion
-                return
-
-            try:
-                for item in directory.iterdir():
-                    # Skip hidden files/dirs
-                    if item.name.startswith("."):
-                        continue
-
-                    # Check if it's within workspace
-                    try:
-                        rel_path = item.relative_to(self.workspace_root)
-                    except ValueError:
-                        continue  # Outside workspace
-
-                    # Match files
-                    if item.is_file() and fnmatch(item.name, pattern):
-                        results.append(str(rel_path))
-
-                    # Recurse into directories
-                    if item.is_dir() and recursive:
-                        search_dir(item, depth + 1)
-            except PermissionError:
-                pass  # Skip directories we can't access
-
-        search_dir(start_dir)
+        # ワークスペース外は検索しない
+        if start_dir != self.workspace_root and self.workspace_root not in start_dir.parents:
+            return []
+
+        # ディレクトリ一覧は共有のインベントリから（変わっていないディレクトリは走査し直さない）
+        # エントリのパスはすべてルートの下なので、相対パスは先頭を切り落とすだけ（relpath は件数が多いと重い）
+        prefix_len = len(os.path.join(str(self.workspace_root), ""))
+        results = [
+            entry.path[prefix_len:]
+            for entry in get_workspace_inventory().iter_files(str(start_dir), 10, recursive)
+            if fnmatch(entry.name, pattern)
+        ]
         return sorted(results)
 
     async def grep_files(
@@ -573,9 +585,11 @@ class FileOps:
 
         Returns:
             "filepath:line_num: content" 形式のマッチ行一覧と件数サマリー
+
+        先頭 8KB に NUL を含むファイル（.pyc・画像などのバイナリ）は検索せず、結果にも注記しない。
+        llm.grep.max_file_size_mb を超えるテキストファイルも検索しないが、その件数は末尾に注記する。
         """
         import re as _re
-        from fnmatch import fnmatch
 
         # 正規表現コンパイル
         try:
@@ -583,55 +597,28 @@ class FileOps:
         except _re.error as e:
             return f"::status error\nReason: Invalid regex pattern '{pattern}': {e}"
 
-        # 検索開始ディレクトリ
-        start_dir = (self.workspace_root / path).resolve()
-        if not start_dir.exists():
-            return f"::status error\nReason: Path not found: {path}"
-
-        # 検索対象ファイルの収集
-        if start_dir.is_file():
-            files_to_search: List[Path] = [start_dir]
-        else:
-            files_to_search = []
+        executor = get_io_executor()
+        max_results = int(max_results)
+        max_bytes = int(float(config.get("llm.grep.max_file_size_mb", 10)) * 1024 * 1024)
 
-            def collect_files(directory: Path, depth: int = 0) -> None:
-                if depth > 15:
-                    return
-                try:
-                    for item in sorted(directory.iterdir(), key=lambda x: x.name):
-                        if item.name.startswith('.'):
-                            continue
-                        if item.is_file() and fnmatch(item.name, include):
-                            try:
-                                item.relative_to(self.workspace_root)
-                                files_to_search.append(item)
-                            except ValueError:
-                                pass  # ワークスペース外はスキップ
-                        elif item.is_dir() and recursive:
-                            collect_files(item, depth + 1)
-                except PermissionError:
-                    pass
+        # 検索対象ファイルの収集（ディレクトリ走査は I/O スレッドで）
+        files_to_search = await executor.run_io(self._collect_grep_files, path, include, recursive)
+        if files_to_search is None:
+            return f"::status error\nReason: Path not found: {path}"
 
-            collect_files(start_dir)
+        # trigram インデックスで候補のファイルに絞る（llm.grep.trigram_index。パターンから絞れなければ全ファイル）
+        if config.get_bool("llm.grep.trigram_index", False):
+            candidates = await executor.run_io(self._trigram_candidates, regex, files_to_search, max_bytes)
+            if candidates is not None:
+                files_to_search = candidates
 
         # 各ファイルを検索
-        results: List[str] = []
-        total_matches = 0
-
-        for file_path in files_to_search:
-            if total_matches >= max_results:
-                break
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    for line_num, line in enumerate(f, 1):
-                        if regex.search(line):
-                            rel_path = file_path.relative_to(self.workspace_root)
-                            results.append(f"{rel_path}:{line_num}: {line.rstrip()}")
-                            total_matches += 1
-                            if total_matches >= max_results:
-                                break
-            except (OSError, PermissionError):
-                pass
+        root = str(self.workspace_root)
+        if len(files_to_search) < GREP_PROCESS_MIN_FILES:
+            results, oversized = await executor.run_io(grep_paths, regex, files_to_search, root, max_results, max_bytes)
+        else:
+            results, oversized = await self._grep_chunked(regex, files_to_search, root, max_results, max_bytes)
+        total_matches = len(results)
 
         if not results:
             return f"No matches found for pattern '{pattern}' in '{path}' (include='{include}')"
@@ -641,11 +628,85 @@ class FileOps:
                 f"\n(Results truncated at {max_results}. "
                 f"Use a more specific pattern or path to narrow results.)"
             )
+        if oversized:
+            # バイナリは黙って飛ばす。大きすぎるテキストファイルは検索していないことを伝える
+            results.append(
+                f"\n(Skipped {oversized} file(s) larger than {max_bytes / (1024 * 1024):g} MB "
+                f"(llm.grep.max_file_size_mb); they were not searched.)"
+            )
 
         results.append(f"\n{total_matches} match(es) found.")
         return '\n'.join(results)
 
-    async def delete_lines(self, path: str, content: str) -> str:
+    def _collect_grep_files(self, path: str, include: str, recursive: bool) -> Optional[List[str]]:
+        """grep_files の検索対象（絶対パス、名前順）。path が存在しなければ None。"""
+        from fnmatch import fnmatch
+
+        # 検索開始ディレクトリ（ワークスペース外は PermissionError。ファイル指定の場合も先に確認する）
+        start_dir = self._get_full_path(path)
+        if not start_dir.exists():
+            return None
+        if start_dir.is_file():
+            return [str(start_dir)]
+
+        # ディレクトリ一覧は共有のインベントリから（名前順の深さ優先）
+        return [
+            entry.path
+            for entry in get_workspace_inventory().iter_files(str(start_dir), 15, recursive)
+            if fnmatch(entry.name, include)
+        ]
+
+    def _trigram_index(self) -> TrigramIndex:
+        return get_trigram_index(str(self.workspace_root), config.get("llm.grep.index_dir", "logs/trigram_index"))
+
+    def _trigram_candidates(self, regex, files: List[str], max_bytes: int) -> Optional[List[str]]:
+        return self._trigram_index().candidates(regex, files, max_bytes)
+
+    async def _grep_chunked(
+        self, regex, files: List[str], root: str, max_results: int, max_bytes: int
+    ) -> Tuple[List[str], int]:
+        """
+        ファイルをチャンクに分けてプロセスプールで並列に検索する。
+        結果はファイル順に連結する（決定的な順序）。max_results に達した時点で、
+        残りのチャンクは投げず、投げ済みのチャンクには停止用のファイルを作って知らせ、
+        次のファイルに進む前に打ち切らせる。
+        """
+        executor = get_io_executor()
+        chunks = [files[i:i + GREP_CHUNK_FILES] for i in range(0, len(files), GREP_CHUNK_FILES)]
+        in_flight = max(GREP_CHUNKS_IN_FLIGHT, executor.cpu_processes * 2)
+        pending: List[asyncio.Future] = []
+        results: List[str] = []
+        oversized = 0
+        next_chunk = 0
+        stop_path = os.path.join(tempfile.gettempdir(), f"duckflow-grep-stop-{uuid.uuid4().hex}")
+        try:
+            while len(results) < max_results and (pending or next_chunk < len(chunks)):
+                while next_chunk < len(chunks) and len(pending) < in_flight:
+                    pending.append(asyncio.ensure_future(
+                        executor.run_cpu(grep_paths, regex, chunks[next_chunk], root, max_results, max_bytes, stop_path)
+                    ))
+                    next_chunk += 1
+                # 順序を保つため先頭のチャンクから受け取る
+                chunk_results, chunk_oversized = await pending.pop(0)
+                results.extend(chunk_results)
+                oversized += chunk_oversized
+        finally:
+            if pending:
+                # asyncio 側の取り消しでは実行中のワーカーは止まらないので、フラグを作って打ち切らせる。
+                # まだ始まっていないチャンクも最初のファイルの前に止まる。全部戻ってきてからフラグを消す
+                try:
+                    open(stop_path, "x").close()
+                except OSError:
+                    pass
+                await asyncio.gather(*pending, return_exceptions=True)
+                try:
+                    os.remove(stop_path)
+                except OSError:
+                    pass
+        return results[:max_results], oversized
+
+    @blocking_io
+    def delete_lines(self, path: str, content: str) -> str:
         """
         Hashline アンカーで指定した行範囲をファイルから削除する。
 
@@ -732,6 +793,7 @@ class FileOps:
 
         # ファイル書き込み
         full_path.write_text('\n'.join(file_lines), encoding='utf-8')
+        self._file_changed(full_path)
 
         # 編集後コンテキストを返す（削除位置の前後）
         # 削除後は start_idx が次の行を指すため end_idx は start_idx - 1 とみなす
@@ -749,7 +811,8 @@ class FileOps:
             f"--- End of Context ---"
         )
 
-    async def delete_file(self, path: str) -> str:
+    @blocking_io
+    def delete_file(self, path: str) -> str:
         """
         Delete a file. This is a dangerous operation - use with caution.
         実行前にユーザー承認が必要。ディレクトリの削除には対応しない。
@@ -769,6 +832,7 @@ class FileOps:
         
         # Delete the file
         full_path.unlink()
+        self._file_changed(full_path)
         return f"Deleted file: {path}"
 
 # Global instance
@@ -1,12 +1,21 @@
 import os
-import subprocess
-from typing import List, Dict, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+
+from companion.base.io_executor import get_io_executor
+from companion.utils.gitignore import GitIgnoreMatcher, IgnoreRules
+from companion.utils.workspace_inventory import RACY_NS, get_workspace_inventory
 
 DEFAULT_EXCLUDES = [
     'node_modules', 'venv', '__pycache__', '.venv', 'vendor', 'site-packages',
     '.git', '.svn', 'dist', 'build', 'out', 'target', 'bin', 'obj', '.next',
     '.env', '.idea', '.vscode'
 ]
+_EXCLUDED_NAMES = frozenset(DEFAULT_EXCLUDES)
+# 描画済みのツリーを覚えておく (パス, 深さ, respect_gitignore) の数
+_MAX_CACHED_TREES = 16
 
 async def get_project_tree(  # ← async追加
     path: str = '.', 
@@ -28,59 +37,115 @@ async def get_project_tree(  # ← async追加
     depth = int(depth) if isinstance(depth, str) else depth
     respect_gitignore = bool(respect_gitignore) if isinstance(respect_gitignore, str) else respect_gitignore
 
+    # ディレクトリ走査はブロッキングなので I/O スレッドで実行する
+    return await get_io_executor().run_io(_build_project_tree, path, depth, respect_gitignore)
+
+
+class ProjectTreeCache:
+    """
+    Rendered trees per (path, depth, respect_gitignore).
+
+    ツリーを作るときに一覧を読んだディレクトリと読んだ無視ファイルの mtime_ns を覚えておき、
+    どれも変わっていなければ描画済みの文字列を返す（/scan と get_project_tree ツールで共有）。
+    """
+
+    def __init__(self, max_trees: int = _MAX_CACHED_TREES):
+        self.max_trees = max_trees
+        self._trees: "OrderedDict[Tuple[str, int, bool], Tuple[str, Dict[str, int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, abs_path: str, depth: int, respect_gitignore: bool) -> str:
+        key = (abs_path, depth, respect_gitignore)
+        with self._lock:
+            cached = self._trees.get(key)
+        if cached is not None and all(_mtime_ns(path) == mtime_ns for path, mtime_ns in cached[1].items()):
+            with self._lock:
+                if key in self._trees:
+                    self._trees.move_to_end(key)
+            return cached[0]
+        tree, watched, cacheable = _render_tree(abs_path, depth, respect_gitignore)
+        with self._lock:
+            self._trees.pop(key, None)
+            if cacheable:
+                self._trees[key] = (tree, watched)
+                while len(self._trees) > self.max_trees:
+                    self._trees.popitem(last=False)
+        return tree
+
+
+def _mtime_ns(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return -1
+
+
+_tree_cache: Optional[ProjectTreeCache] = None
+
+
+def get_project_tree_cache() -> ProjectTreeCache:
+    """プロセス共有の ProjectTreeCache を返す。"""
+    global _tree_cache
+    if _tree_cache is None:
+        _tree_cache = ProjectTreeCache()
+    return _tree_cache
+
+
+def _build_project_tree(path: str, depth: int, respect_gitignore: bool) -> str:
     abs_path = os.path.abspath(path)
     if not os.path.exists(abs_path):
         return f"Error: Path not found - {abs_path}"
+    return get_project_tree_cache().get(abs_path, depth, respect_gitignore)
 
-    # .gitignore処理
-    ignored_files = set()
-    if respect_gitignore:
-        try:
-            result = subprocess.run(
-                ['git', 'ls-files', '--others', '--ignored', '--exclude-standard'],
-                cwd=abs_path,
-                capture_output=True,
-                text=True,
-                check=False
-            )
-            ignored_files = set(result.stdout.splitlines())
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            pass  # gitコマンドがない場合は無視
+
+def _render_tree(abs_path: str, depth: int, respect_gitignore: bool) -> Tuple[str, Dict[str, int], bool]:
+    """(ツリー, 読んだディレクトリ・無視ファイルの mtime_ns, キャッシュしてよいか) を返す。"""
+    inventory = get_workspace_inventory()
+    # .gitignore / .git/info/exclude / global excludes（無視されたディレクトリの中には降りない）
+    matcher = GitIgnoreMatcher(abs_path) if respect_gitignore else None
+    watched: Dict[str, int] = {}
+    cacheable = True
 
     # ツリー構築
-    def build_tree(current: str, current_depth: int) -> List[str]:
+    def build_tree(current: str, current_depth: int, rules: Optional[Tuple[IgnoreRules, ...]]) -> List[str]:
+        nonlocal cacheable
         if current_depth > depth:
             return []
         
         items = []
         try:
-            with os.scandir(current) as it:
-                for entry in sorted(it, key=lambda e: (not e.is_dir(), e.name.lower())):
-                    rel_path = os.path.relpath(entry.path, abs_path)
-                    
-                    # 除外判定
-                    if (
-                        entry.name in DEFAULT_EXCLUDES or
-                        any(exclude in rel_path.split(os.sep) for exclude in DEFAULT_EXCLUDES) or
-                        rel_path in ignored_files
-                    ):
-                        continue
-                    
-                    # ディレクトリ処理
-                    if entry.is_dir():
-                        children = build_tree(entry.path, current_depth + 1)
-                        if children:
-                            items.append(f"{entry.name}/")
-                            items.extend([f"{'  ' * (current_depth)}{child}" for child in children])
-                        else:
-                            items.append(f"{entry.name}/")
-                    # ファイル処理
-                    elif current_depth <= depth:
-                        items.append(entry.name)
-        except PermissionError:
-            pass
+            listing = inventory.listing_state(current)
+        except OSError:
+            watched[current] = -1
+            return items
+        watched[current] = listing.mtime_ns
+        cacheable = cacheable and not listing.racy
+        if matcher is not None:
+            rules = matcher.rules_for(current, [entry.name for entry in listing.entries], rules)
+
+        for entry in sorted(listing.entries, key=lambda e: (not e.is_dir, e.name.lower())):
+            # 除外判定
+            if entry.name in _EXCLUDED_NAMES or (matcher is not None and matcher.is_ignored(entry.path, entry.is_dir, rules)):
+                continue
+            
+            # ディレクトリ処理
+            if entry.is_dir:
+                children = build_tree(entry.path, current_depth + 1, rules)
+                if children:
+                    items.append(f"{entry.name}/")
+                    items.extend([f"{'  ' * (current_depth)}{child}" for child in children])
+                else:
+                    items.append(f"{entry.name}/")
+            # ファイル処理
+            elif current_depth <= depth:
+                items.append(entry.name)
         
         return items
 
-    tree = build_tree(abs_path, 1)
-    return "\n".join(tree) if tree else "No visible files/directories found"
\ No newline at end of file
+    tree = build_tree(abs_path, 1, None)
+    if matcher is not None:
+        watched.update(matcher.watched)
+        # mtime の分解能より短い間隔で書き換えられた無視ファイルは見逃しうるのでキャッシュしない
+        now_ns = time.time_ns()
+        cacheable = cacheable and all(now_ns - m >= RACY_NS for m in matcher.watched.values() if m >= 0)
+    return ("\n".join(tree) if tree else "No visible files/directories found"), watched, cacheable
@@ -82,7 +82,7 @@ class TaskTool:
         
         try:
             # Call LLM
-            proposal = await self.llm.chat(messages, response_model=TaskListProposal)
+            proposal = await self.llm.chat(messages, response_model=TaskListProposal, caller="task_generation")
             
             # Add tasks to step
             tasks_formatted = []
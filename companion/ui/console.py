@@ -198,7 +198,15 @@ class DuckUI:
 
     def print_token_usage(self, stats: Dict[str, Any]):
         total = stats.get("total_tokens", 0)
-        self.console.print(f"[thought]📊 Tokens: {total:,}[/thought]", justify="right")
+        retries = stats.get("retries", 0)
+        suffix = ""
+        input_tokens = stats.get("input_tokens", 0)
+        if input_tokens and stats.get("cached_tokens"):
+            # プロンプトキャッシュから読まれた入力トークンの割合
+            suffix += f" | Cache: {stats['cached_tokens'] / input_tokens:.0%}"
+        if retries:
+            suffix += f" | Retries: {retries}"
+        self.console.print(f"[thought]📊 Tokens: {total:,}{suffix}[/thought]", justify="right")
 
     def create_spinner(self, text: str):
         self.update_status(text)
@@ -226,6 +234,7 @@ class DuckUI:
             '/help': None,
             '/exit': None,
             '/status': None,
+            '/usage': None,
             '/model': {'list': None, 'current': None},
         })
 
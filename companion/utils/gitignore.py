@@ -0,0 +1,280 @@
+"""
+In-process .gitignore matching (no git subprocess).
+
+get_project_tree は毎回 `git ls-files --others --ignored --exclude-standard` を実行して無視されるパスを
+全部集めていた（git リポジトリの外では動かず、node_modules のような巨大な無視ディレクトリがあると遅い）。
+GitIgnoreMatcher は git と同じ規則のファイルを読んで正規表現にコンパイルし、走査しながら判定する。
+無視されたディレクトリの中には降りない。
+
+    matcher = GitIgnoreMatcher("/repo/src")
+    rules = matcher.rules_for("/repo/src", names)            # そのディレクトリの .gitignore を足した規則の列
+    matcher.is_ignored("/repo/src/build", True, rules)
+
+読むファイル（後のものほど優先）:
+    core.excludesFile（未設定なら $XDG_CONFIG_HOME/git/ignore）/ .git/info/exclude /
+    リポジトリのルートから各ディレクトリまでの .gitignore
+
+リポジトリの外（.git が見つからない）では起点のディレクトリをルートとして .gitignore と global excludes だけ使う。
+コンパイルした規則はファイルごとに (mtime_ns, サイズ) で検証してキャッシュする。
+git と違い、追跡済みのファイルでも規則に当たれば無視する（インデックスは読まない）。
+"""
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+GITIGNORE_NAME = ".gitignore"
+
+
+def _translate(pattern: str) -> str:
+    """gitignore の glob（先頭の / と末尾の / は取り除いたもの）を正規表現に変換する。"""
+    out: List[str] = []
+    i, n = 0, len(pattern)
+    while i < n:
+        ch = pattern[i]
+        if ch == "*":
+            j = i
+            while j < n and pattern[j] == "*":
+                j += 1
+            # "**" はパスの区切りに挟まれているときだけ「任意の階層」、それ以外は "*" と同じ
+            if j - i >= 2 and (i == 0 or pattern[i - 1] == "/") and (j == n or pattern[j] == "/"):
+                if j == n:
+                    out.append(".*")
+                    i = j
+                else:
+                    out.append("(?:.*/)?")
+                    i = j + 1
+                continue
+            out.append("[^/]*")
+            i = j
+        elif ch == "?":
+            out.append("[^/]")
+            i += 1
+        elif ch == "[":
+            j = i + 1
+            if j < n and pattern[j] in "!^":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            while j < n and pattern[j] != "]":
+                j += 2 if pattern[j] == "\\" else 1
+            if j >= n:
+                out.append(re.escape(ch))
+                i += 1
+                continue
+            body = pattern[i + 1:j]
+            if body[0] in "!^":
+                body = "^" + body[1:]
+            out.append("(?!/)[" + body.replace("[", "\\[") + "]")
+            i = j + 1
+        elif ch == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(ch))
+            i += 1
+    return "".join(out)
+
+
+def compile_rule(line: str) -> Optional[Tuple["re.Pattern[str]", bool, bool]]:
+    """1行を (正規表現, 否定か, ディレクトリだけか) にする。空行・コメント・不正なパターンは None。"""
+    line = line.rstrip("\r\n")
+    # 末尾の空白はエスケープされていなければ無視する
+    while line.endswith(" ") and not line.endswith("\\ "):
+        line = line[:-1]
+    if not line or line.startswith("#"):
+        return None
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+    dir_only = line.endswith("/")
+    if dir_only:
+        line = line[:-1]
+    # 区切りの / を含むパターンは .gitignore のあるディレクトリからの相対パスに、含まなければ任意の階層の名前に当たる
+    anchored = "/" in line
+    line = line.lstrip("/")
+    if not line:
+        return None
+    try:
+        regex = re.compile(("" if anchored else "(?:.*/)?") + _translate(line), re.DOTALL)
+    except re.error:
+        return None
+    return regex, negate, dir_only
+
+
+class IgnoreRules:
+    """Compiled rules of one ignore file, matched against paths relative to its base directory."""
+
+    __slots__ = ("base", "prefix", "rules")
+
+    def __init__(self, base: str, rules: Sequence[Tuple["re.Pattern[str]", bool, bool]]):
+        self.base = base
+        self.prefix = base.rstrip(os.sep) + os.sep
+        self.rules = tuple(rules)
+
+    @classmethod
+    def parse(cls, base: str, text: str) -> "IgnoreRules":
+        return cls(base, [rule for rule in map(compile_rule, text.splitlines()) if rule is not None])
+
+    def match(self, path: str, is_dir: bool) -> Optional[bool]:
+        """無視なら True、否定パターンで戻されたなら False、どの規則にも当たらなければ None（後の行ほど優先）。"""
+        if not path.startswith(self.prefix):
+            return None
+        rel = path[len(self.prefix):]
+        if os.sep != "/":
+            rel = rel.replace(os.sep, "/")
+        for regex, negate, dir_only in reversed(self.rules):
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(rel):
+                return not negate
+        return None
+
+
+# 無視ファイルのパス -> (mtime_ns, サイズ, 規則)
+_compiled: Dict[str, Tuple[int, int, IgnoreRules]] = {}
+_compiled_lock = threading.Lock()
+
+
+def load_ignore_file(path: str, base: str) -> Tuple[Optional[IgnoreRules], int]:
+    """path の規則（base からの相対パスで判定）と mtime_ns。ファイルがなければ (None, -1)。"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None, -1
+    with _compiled_lock:
+        cached = _compiled.get(path)
+    if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size and cached[2].base == base:
+        return cached[2], st.st_mtime_ns
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            rules = IgnoreRules.parse(base, f.read())
+    except OSError:
+        return None, -1
+    with _compiled_lock:
+        _compiled[path] = (st.st_mtime_ns, st.st_size, rules)
+    return rules, st.st_mtime_ns
+
+
+def _config_value(path: str, section: str, key: str) -> Optional[str]:
+    """git config ファイルから [section] key の値を読む（include やサブセクションには対応しない）。"""
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    value = None
+    current = None
+    for raw in lines:
+        line = raw.strip()
+        if not line or line[0] in "#;":
+            continue
+        if line.startswith("["):
+            current = line[1:line.find("]")].strip().lower() if "]" in line else None
+            continue
+        if current != section or "=" not in line:
+            continue
+        name, _, rest = line.partition("=")
+        if name.strip().lower() == key:
+            value = rest.split(" #")[0].split(" ;")[0].strip().strip('"')
+    return value
+
+
+def find_repo_root(start: str) -> Optional[str]:
+    """start から上に辿って .git のあるディレクトリを返す（なければ None）。"""
+    current = os.path.abspath(start)
+    while True:
+        if os.path.exists(os.path.join(current, ".git")):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+def _git_dir(repo_root: str) -> str:
+    git_path = os.path.join(repo_root, ".git")
+    if os.path.isfile(git_path):
+        # worktree / submodule では .git は "gitdir: <path>" を書いたファイル
+        try:
+            with open(git_path, "r", encoding="utf-8", errors="ignore") as f:
+                first = f.readline().strip()
+        except OSError:
+            return git_path
+        if first.startswith("gitdir:"):
+            return os.path.join(repo_root, first[len("gitdir:"):].strip())
+    return git_path
+
+
+def global_excludes_path(repo_root: Optional[str] = None) -> str:
+    """core.excludesFile（リポジトリの設定 > ~/.gitconfig > $XDG_CONFIG_HOME/git/config）。未設定なら既定のパス。"""
+    xdg = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+    configs = [os.path.join(xdg, "git", "config"), os.path.join(os.path.expanduser("~"), ".gitconfig")]
+    if repo_root is not None:
+        configs.append(os.path.join(_git_dir(repo_root), "config"))
+    configured = None
+    for config_path in configs:
+        value = _config_value(config_path, "core", "excludesfile")
+        if value:
+            configured = value
+    if configured:
+        return os.path.expanduser(configured)
+    return os.path.join(xdg, "git", "ignore")
+
+
+class GitIgnoreMatcher:
+    """
+    Ignore rules for one walk rooted at `root`.
+
+    watched には読んだ（または存在しなかった）無視ファイルの mtime_ns（なければ -1）が入る。
+    結果をキャッシュする側はこれとディレクトリの mtime で有効性を確かめる。
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.repo_root = find_repo_root(self.root)
+        base = self.repo_root or self.root
+        self.watched: Dict[str, int] = {}
+        rules: List[IgnoreRules] = []
+        # global excludes と info/exclude は .gitignore より優先度が低いので先に入れる
+        self._add(rules, global_excludes_path(self.repo_root), base)
+        if self.repo_root is not None:
+            self._add(rules, os.path.join(_git_dir(self.repo_root), "info", "exclude"), base)
+            # リポジトリのルートから起点の親までの .gitignore（起点のものは rules_for で読む）
+            if self.root != self.repo_root:
+                directory = self.repo_root
+                self._add(rules, os.path.join(directory, GITIGNORE_NAME), directory)
+                rel_parent = os.path.relpath(os.path.dirname(self.root), self.repo_root)
+                for part in ([] if rel_parent == "." else rel_parent.split(os.sep)):
+                    directory = os.path.join(directory, part)
+                    self._add(rules, os.path.join(directory, GITIGNORE_NAME), directory)
+        self.base_rules: Tuple[IgnoreRules, ...] = tuple(rules)
+
+    def _add(self, rules: List[IgnoreRules], path: str, base: str) -> None:
+        loaded, mtime_ns = load_ignore_file(path, base)
+        self.watched[path] = mtime_ns
+        if loaded is not None and loaded.rules:
+            rules.append(loaded)
+
+    def rules_for(
+        self, directory: str, names: Sequence[str], parent_rules: Optional[Tuple[IgnoreRules, ...]] = None
+    ) -> Tuple[IgnoreRules, ...]:
+        """directory の中を判定する規則の列（親の規則 + directory の .gitignore）。names は directory の中の名前。"""
+        rules = self.base_rules if parent_rules is None else parent_rules
+        if GITIGNORE_NAME not in names:
+            return rules
+        path = os.path.join(directory, GITIGNORE_NAME)
+        loaded, mtime_ns = load_ignore_file(path, directory)
+        self.watched[path] = mtime_ns
+        if loaded is None or not loaded.rules:
+            return rules
+        return rules + (loaded,)
+
+    @staticmethod
+    def is_ignored(path: str, is_dir: bool, rules: Tuple[IgnoreRules, ...]) -> bool:
+        # 深いディレクトリの規則ほど優先（最初に当たった判定を使う）
+        for ignore in reversed(rules):
+            decision = ignore.match(path, is_dir)
+            if decision is not None:
+                return decision
+        return False
@@ -0,0 +1,148 @@
+"""
+Byte-offset line index for random-access paging of large text files.
+
+read_file の start/end ページングは、従来 islice で先頭から全行をデコードして捨てていたため、
+大きなログの末尾のページほど遅く、ページを読むたびに同じ走査を繰り返していた。
+LineIndex はファイルを1回だけバイナリで走査して各行の先頭バイト位置を array('Q') に記録し、
+以降のページは seek + read で読む（最後のページも最初のページと同じコスト）。総行数もここから分かる。
+
+    index = get_line_index_cache().get(path)
+    lines, has_more = index.read_lines(start_line=200000, max_lines=300)
+    index.line_count
+
+インデックスは (パス, サイズ, mtime_ns) で検証し、ファイルが変わっていれば作り直す。
+行の区切りはテキストモードの読み込みに合わせる（"\\n" で区切り、行末の "\\r" は取り除く）。
+"""
+import itertools
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# 走査時に一度に読むバイト数
+_CHUNK_BYTES = 4 * 1024 * 1024
+# キャッシュするインデックスの合計行数の上限（8バイト/行 → 約 64MB）
+_MAX_CACHED_LINES = 8_000_000
+
+
+class LineIndex:
+    """Start offset of every line in a file, valid for one (size, mtime_ns)."""
+
+    __slots__ = ("path", "size", "mtime_ns", "offsets")
+
+    def __init__(self, path: str, size: int, mtime_ns: int, offsets: "array[int]"):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, path: str) -> "LineIndex":
+        """ファイルを1回走査してインデックスを作る。"""
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            offsets = array("Q")
+            pos = 0
+            while True:
+                chunk = f.read(_CHUNK_BYTES)
+                if not chunk:
+                    break
+                if pos == 0:
+                    offsets.append(0)
+                pieces = chunk.split(b"\n")
+                # 改行ごとに次の行の先頭位置を足していく（accumulate / map で C のループに任せる）
+                starts = itertools.accumulate(map((1).__add__, map(len, pieces[:-1])), initial=pos)
+                offsets.extend(itertools.islice(starts, 1, None))
+                pos += len(chunk)
+        # 改行で終わるファイルの最後の位置は「次の行」ではない
+        if offsets and offsets[-1] == pos:
+            offsets.pop()
+        return cls(path, pos, st.st_mtime_ns, offsets)
+
+    @property
+    def line_count(self) -> int:
+        return len(self.offsets)
+
+    def matches(self, st: os.stat_result) -> bool:
+        return self.size == st.st_size and self.mtime_ns == st.st_mtime_ns
+
+    def byte_range(self, start_idx: int, stop_idx: int) -> Tuple[int, int]:
+        """0始まりの行 [start_idx, stop_idx) のバイト範囲。"""
+        begin = self.offsets[start_idx]
+        end = self.offsets[stop_idx] if stop_idx < len(self.offsets) else self.size
+        return begin, end
+
+    def read_lines(self, start_line: int, max_lines: int, encoding: str = "utf-8") -> Tuple[List[str], bool]:
+        """
+        start_line（1始まり）から最大 max_lines 行を読み、(行のリスト, 後続の行があるか) を返す。
+        デコードできなければ UnicodeDecodeError。
+        """
+        start_idx = start_line - 1
+        if start_idx >= self.line_count or max_lines <= 0:
+            return [], False
+        stop_idx = min(self.line_count, start_idx + max_lines)
+        begin, end = self.byte_range(start_idx, stop_idx)
+        with open(self.path, "rb") as f:
+            f.seek(begin)
+            data = f.read(end - begin)
+        lines = data.decode(encoding).split("\n")
+        if data.endswith(b"\n"):
+            lines.pop()
+        return [line[:-1] if line.endswith("\r") else line for line in lines], stop_idx < self.line_count
+
+
+class LineIndexCache:
+    """LRU of LineIndex per path, bounded by the total number of indexed lines."""
+
+    def __init__(self, max_lines: int = _MAX_CACHED_LINES):
+        self.max_lines = max_lines
+        self._indexes: "OrderedDict[str, LineIndex]" = OrderedDict()
+        self._total_lines = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> LineIndex:
+        """path の最新のインデックス（キャッシュが古ければ作り直す）。"""
+        key = os.path.abspath(path)
+        st = os.stat(key)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None and index.matches(st):
+                self._indexes.move_to_end(key)
+                return index
+        index = LineIndex.build(key)
+        with self._lock:
+            self._store(key, index)
+        return index
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        with self._lock:
+            if path is None:
+                self._indexes.clear()
+                self._total_lines = 0
+                return
+            old = self._indexes.pop(os.path.abspath(path), None)
+            if old is not None:
+                self._total_lines -= old.line_count
+
+    def _store(self, key: str, index: LineIndex) -> None:
+        old = self._indexes.pop(key, None)
+        if old is not None:
+            self._total_lines -= old.line_count
+        self._indexes[key] = index
+        self._total_lines += index.line_count
+        # 上限を超えたら古いものから捨てる（今入れたものは残す）
+        while self._total_lines > self.max_lines and len(self._indexes) > 1:
+            _, evicted = self._indexes.popitem(last=False)
+            self._total_lines -= evicted.line_count
+
+
+_cache: Optional[LineIndexCache] = None
+
+
+def get_line_index_cache() -> LineIndexCache:
+    """プロセス共有の LineIndexCache を返す。"""
+    global _cache
+    if _cache is None:
+        _cache = LineIndexCache()
+    return _cache
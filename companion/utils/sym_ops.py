@@ -12,6 +12,7 @@ class Action:
     depends_on: Optional[str] = None
     confidence: float = 1.0
     params: Dict[str, str] = field(default_factory=dict)
+    batch: Optional[int] = None  # 同じ ::execute_batch ブロックから展開されたアクションの番号
 
 @dataclass
 class ParsedResult:
@@ -27,274 +28,398 @@ class ParseError(Exception):
     """Parse error"""
     pass
 
+# --- Precompiled patterns (AutoRepair) ---
+# 記号なしで書かれたアクション行の動詞（"read_file @x" → ":: read_file @ x"）
+_ACTION_VERBS = (
+    'create', 'edit', 'delete', 'remove', 'update', 'write', 'read',
+    'run', 'execute', 'test', 'check', 'verify', 'finish', 'response', 'report',
+    'propose_plan', 'duck_call', 'create_file', 'edit_file', 'delete_file',
+    'run_command', 'read_file', 'list_directory', 'get_project_tree',
+    'execute_batch', 'note', 'search_archives', 'recall',
+)
+# 動詞は \b で終わるため、選択肢の並び順は結果に影響しない
+_MISSING_SYMBOL_RE = re.compile(
+    r'^(' + '|'.join(sorted(_ACTION_VERBS)) + r')\b\s*(?:@\s*)?([^\n]+)?',
+    re.IGNORECASE,
+)
+# 行末の ```lang（次の1行が <<< ～ >>> に置き換わる）
+_FENCE_OPEN_RE = re.compile(r'```[\w\-]*\Z')
+_VITALS_PERCENT_RE = re.compile(r'\b(confidence|safety|memory|focus):\s*(\d+)%', re.IGNORECASE)
+_VITALS_PLAIN_RE = re.compile(r'\b(confidence|safety|memory|focus):\s*([\d.]+)', re.IGNORECASE)
+_VITALS_HASH_RE = re.compile(r'#([cmfs])\s*([\d.]+)')
+_VITALS_SPACING_RE = re.compile(r'::([cmfs])\s+([\d.]+)')
+# いずれかのバイタル正規化が適用されうる行、または値待ちで終わる行（大半の行はここで素通りする）
+_VITALS_HINT_RE = re.compile(r'\b(?:confidence|safety|memory|focus):|#[cmfs]|::[cmfs](?:\s|\Z)', re.IGNORECASE)
+# 行末で値を待っているバイタル表記（\s* が改行をまたいで次の行と結合しうる）
+_VITALS_SPLIT_RE = re.compile(r'(?:\b(?:confidence|safety|memory|focus):|#[cmfs]|::[cmfs])\s*\Z', re.IGNORECASE)
+_PROTOCOL_INDENT_RE = re.compile(r'^\s*[:>@!?<-]')
+# バッチ行の "@path > dependency"（> はパスの直後のときだけ依存の印。続く key=value はパラメータ）
+_BATCH_DEPENDS_RE = re.compile(r'([^\s>=]+)\s*>\s*(.*)\Z', re.DOTALL)
+# _MISSING_SYMBOL_RE の先頭文字（これ以外で始まる行は正規表現を試さない）
+_VERB_INITIALS = frozenset(v[0] for v in _ACTION_VERBS)
+_VITALS_KEY_MAP = {'confidence': 'c', 'safety': 's', 'memory': 'm', 'focus': 'f'}
+
+
 class AutoRepair:
     """
-    Pattern-based auto-repair engine v2.1
+    Pattern-based auto-repair engine v3
     Automatically fixes typical LLM output errors with higher tolerance.
+
+    修復ルール（markdown_blocks → missing_symbols → vitals_format →
+    delimiters → indentation → unclosed_blocks）を1行ずつのステートマシンとして
+    1パスで適用する。結果は各ルールを全文に順番に適用した場合と同一。
+
+    repair() は全文を一括で処理する。push_line() / flush() / close_blocks() は
+    ストリーミング用の行単位 API。
     """
-    
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear the per-text state."""
+        self._fence_pending = False     # markdown_blocks: 次の行を <<< >>> に取り込む
+        self._vitals_held: List[str] = []  # vitals_format: 次の行と結合しうる行
+        self._in_batch_block = False    # delimiters: ::execute_batch の <<< ～ >>> 内
+        self._delim_in_block = False    # delimiters: <<< ～ >>> 内
+        self._indent_in_block = False   # indentation: <<< ～ >>> 内
+        self.open_count = 0             # unclosed_blocks: '<<<' の出現数
+        self.close_count = 0            # unclosed_blocks: '>>>' の出現数
+
     def repair(self, text: str) -> str:
         """Apply all repair rules"""
-        text = self._fix_markdown_blocks(text)
-        text = self._fix_missing_symbols(text)
-        text = self._fix_vitals_format(text)
-        text = self._fix_delimiters(text)
-        text = self._fix_indentation(text)
-        text = self._fix_unclosed_blocks(text)
-        return text
-    
-    def _fix_unclosed_blocks(self, text: str) -> str:
-        """Ensure all <<< blocks are closed with >>> at the end of text."""
-        open_count = text.count('<<<')
-        close_count = text.count('>>>')
-        
-        if open_count > close_count:
-            # Add missing closing delimiters
-            text = text.rstrip() + '\n' + ('>>>\n' * (open_count - close_count))
-        return text
-
-    def _fix_markdown_blocks(self, text: str) -> str:
-        """Convert Markdown code blocks to v2 format"""
-        # Improved regex to handle language identifier better
-        pattern = r'```[\w\-]*\n(.*?)(?:```|$)'
-        
-        def replace_block(match):
-            content = match.group(1).rstrip('\n')
-            return f'<<<\n{content}\n>>>'
-        
-        return re.sub(pattern, replace_block, text, flags=re.DOTALL | re.MULTILINE)
-    
-    def _fix_missing_symbols(self, text: str) -> str:
-        """Complement missing symbols from action lines v2.1 v2.1"""
+        self.reset()
         lines = text.split('\n')
-        fixed_lines = []
-        
-        # Expanded action verbs with common variants
-        action_verbs = {
-            'create', 'edit', 'delete', 'remove', 'update', 'write', 'read',
-            'run', 'execute', 'test', 'check', 'verify', 'finish', 'response', 'report',
-            'propose_plan', 'duck_call', 'create_file', 'edit_file', 'delete_file',
-            'run_command', 'read_file', 'list_directory', 'get_project_tree',
-            'execute_batch', 'note', 'search_archives', 'recall'
-        }
-        
-        for line in lines:
-            stripped = line.strip()
-            
-            # Already has protocol prefix
-            if stripped.startswith('::') or stripped.startswith('>>') or stripped.startswith('<<<'):
-                fixed_lines.append(line)
-                continue
-            
-            # Support $ as a prefix (common LLM mistake)
-            if stripped.startswith('$'):
-                indent = line[:len(line) - len(line.lstrip())]
-                line = indent + ':: ' + line.lstrip().replace('$', '', 1).strip()
-                fixed_lines.append(line)
-                continue
-            
-            # Look for "verb @ path" or "verb path"
-            # Support case-insensitive and leading whitespace
-            match = re.match(r'^(' + '|'.join(action_verbs) + r')\b\s*(?:@\s*)?([^\n]+)?', stripped, re.IGNORECASE)
-            
-            if match:
-                action, rest = match.groups()
-                indent = line[:len(line) - len(line.lstrip())]
-                if rest:
-                    line = f'{indent}:: {action.lower()} @ {rest.strip()}'
-                else:
-                    line = f'{indent}:: {action.lower()}'
-            
-            fixed_lines.append(line)
-        
-        return '\n'.join(fixed_lines)
-    
-    def _fix_delimiters(self, text: str) -> str:
-        """Normalize delimiters to v3.2 format.
-        - `>>>` はインデントなし行頭のみをブロック終端として認識する（Python doctest保護）。
-        - execute_batch ブロック内の %%% はバッチ区切りとして保護する。
-        - `---` は変換せずコンテンツとして pass-through（Markdown水平線保護）。
+        last = len(lines) - 1
+        repaired: List[str] = []
+        for i, line in enumerate(lines):
+            repaired.extend(self.push_line(line, has_newline=i < last))
+        repaired.extend(self.flush())
+        return '\n'.join(self.close_blocks(repaired))
+
+    def push_line(self, line: str, has_newline: bool = True) -> List[str]:
         """
-        lines = text.split('\n')
-        fixed = []
-        in_batch_block = False   # ::execute_batch の <<< ～ >>> 内かどうか
-        in_block = False          # 通常の <<< ～ >>> 内かどうか
-
-        for line in lines:
-            stripped = line.strip()
+        1行を修復し、確定した行を返す。
+        has_newline: 入力上でこの行の後に改行があるか（最終行のみ False）
+        """
+        if self._fence_pending or '```' in line:
+            fenced = self._fix_markdown_blocks(line, has_newline)
+        else:
+            fenced = (line,)
 
-            # execute_batch ブロック追跡
-            if stripped == '::execute_batch':
-                in_batch_block = True
+        repaired: List[str] = []
+        for fixed in fenced:
+            fixed = self._fix_missing_symbols(fixed)
+            if self._vitals_held or (('#' in fixed or ':' in fixed) and _VITALS_HINT_RE.search(fixed)):
+                repaired.extend(self._finish_line(l) for l in self._fix_vitals_format(fixed))
+            else:
+                repaired.append(self._finish_line(fixed))
+        return repaired
+
+    def flush(self) -> List[str]:
+        """入力の終端。保留中の行を確定させて返す。"""
+        if not self._vitals_held:
+            return []
+        held = self._vitals_held
+        self._vitals_held = []
+        return [self._finish_line(l) for l in self._normalize_vitals('\n'.join(held)).split('\n')]
+
+    def close_blocks(self, tail: List[str]) -> List[str]:
+        """
+        _fix_unclosed_blocks: <<< が >>> より多ければ末尾を rstrip して >>> を補う。
+        tail には空白以外を含む行が1行以上必要（rstrip が tail の外に及ばないように）。
+        """
+        missing = self.open_count - self.close_count
+        if missing <= 0:
+            return tail
+        # Add missing closing delimiters
+        return ('\n'.join(tail).rstrip() + '\n' + ('>>>\n' * missing)).split('\n')
+
+    def _finish_line(self, line: str) -> str:
+        """delimiters → indentation を適用し、unclosed_blocks 用に <<< / >>> を数える。"""
+        line = self._fix_indentation(self._fix_delimiters(line))
+        if '<' in line:
+            self.open_count += line.count('<<<')
+        if '>' in line:
+            self.close_count += line.count('>>>')
+        return line
+
+    def _fix_markdown_blocks(self, line: str, has_newline: bool) -> List[str]:
+        """
+        Convert Markdown code blocks to v2 format
+        行末の ```lang に続く1行（次の ``` の手前まで）を <<< ～ >>> で囲む。
+        """
+        fixed: List[str] = []
+        current = ""
+        pos = 0
+        if self._fence_pending:
+            self._fence_pending = False
+            end = line.find('```')
+            if end >= 0:
+                fixed.append(line[:end])
+                pos = end + 3
+            else:
                 fixed.append(line)
-                continue
+                pos = len(line)
+            current = '>>>'
+
+        rest = line[pos:]
+        match = _FENCE_OPEN_RE.search(rest) if has_newline and '```' in rest else None
+        if match:
+            current += rest[:match.start()] + '<<<'
+            self._fence_pending = True
+        else:
+            current += rest
+        fixed.append(current)
+        return fixed
+
+    def _fix_missing_symbols(self, line: str) -> str:
+        """Complement missing symbols from action lines v2.1"""
+        stripped = line.strip()
+        if not stripped:
+            return line
+        head = stripped[0]
+        if head != '$' and head.lower() not in _VERB_INITIALS:
+            # プロトコル記号（::, >>, <<<）やコンテンツ行の大半はここで素通り
+            return line
+
+        # Already has protocol prefix
+        if stripped.startswith(('::', '>>', '<<<')):
+            return line
+
+        # Support $ as a prefix (common LLM mistake)
+        if stripped.startswith('$'):
+            indent = line[:len(line) - len(line.lstrip())]
+            return indent + ':: ' + line.lstrip().replace('$', '', 1).strip()
+
+        # Look for "verb @ path" or "verb path"
+        # Support case-insensitive and leading whitespace
+        match = _MISSING_SYMBOL_RE.match(stripped)
+        if match:
+            action, rest = match.groups()
+            indent = line[:len(line) - len(line.lstrip())]
+            if rest:
+                return f'{indent}:: {action.lower()} @ {rest.strip()}'
+            return f'{indent}:: {action.lower()}'
+        return line
+
+    def _fix_vitals_format(self, line: str) -> List[str]:
+        """
+        Normalize Duck Vitals format with tolerance for natural language and percentages.
+        "Confidence:" の直後で改行している場合などは値の行が来るまで保留し、まとめて正規化する。
+        """
+        if not self._vitals_held:
+            if _VITALS_SPLIT_RE.search(line):
+                self._vitals_held.append(line)
+                return []
+            return [self._normalize_vitals(line)]
+
+        self._vitals_held.append(line)
+        # 空白だけの行が続く間、または次の行も値待ちで終わる間は保留を続ける
+        if not line.strip() or _VITALS_SPLIT_RE.search(line):
+            return []
+        held = self._vitals_held
+        self._vitals_held = []
+        return self._normalize_vitals('\n'.join(held)).split('\n')
+
+    @staticmethod
+    def _normalize_vitals(text: str) -> str:
+        # 1. Natural language: "Confidence: 95%" -> "::c0.95"
+        def norm_percent(match):
+            key = match.group(1).lower()
+            val = float(match.group(2)) / 100.0
+            return f'::{_VITALS_KEY_MAP[key]}{val:.2f}'
 
-            if stripped == '<<<':
-                in_block = True
-                fixed.append(line)
-                continue
+        text = _VITALS_PERCENT_RE.sub(norm_percent, text)
 
-            # v3.2: >>> は行頭（column 0）のみブロック終端として認識する
-            if line.rstrip() == '>>>':
-                if in_batch_block and in_block:
-                    in_batch_block = False
-                in_block = False
-                fixed.append(line)
-                continue
+        # 2. Natural language: "Confidence: 0.95" -> "::c0.95"
+        def norm_plain(match):
+            key = match.group(1).lower()
+            return f'::{_VITALS_KEY_MAP[key]}{match.group(2)}'
 
-            # execute_batch ブロック内の %%% はバッチ区切りとして保護
-            if in_batch_block and in_block and stripped == '%%%':
-                fixed.append('%%%')
-                continue
+        text = _VITALS_PLAIN_RE.sub(norm_plain, text)
 
-            # バッククォートのコードブロックは <<< >>> に変換
-            if stripped.startswith('```'):
-                fixed.append('<<<')
-            else:
-                fixed.append(line)
+        # 3. Handle #c0.9 style
+        text = _VITALS_HASH_RE.sub(r'::\1\2', text)
 
-        return '\n'.join(fixed)
-    
-    def _fix_indentation(self, text: str) -> str:
+        # 4. Standardize spacing: "::c 0.9" -> "::c0.9"
+        return _VITALS_SPACING_RE.sub(r'::\1\2', text)
+
+    def _fix_delimiters(self, line: str) -> str:
+        """Normalize delimiters to v3.2 format.
+        - `>>>` はインデントなし行頭のみをブロック終端として認識する（Python doctest保護）。
+        - execute_batch ブロック内の %%% はバッチ区切りとして保護する。
+        - `---` は変換せずコンテンツとして pass-through（Markdown水平線保護）。
+        """
+        stripped = line.strip()
+
+        # execute_batch ブロック追跡
+        if stripped == '::execute_batch':
+            self._in_batch_block = True
+            return line
+
+        if stripped == '<<<':
+            self._delim_in_block = True
+            return line
+
+        # v3.2: >>> は行頭（column 0）のみブロック終端として認識する
+        if line.rstrip() == '>>>':
+            if self._in_batch_block and self._delim_in_block:
+                self._in_batch_block = False
+            self._delim_in_block = False
+            return line
+
+        # execute_batch ブロック内の %%% はバッチ区切りとして保護
+        if self._in_batch_block and self._delim_in_block and stripped == '%%%':
+            return '%%%'
+
+        # バッククォートのコードブロックは <<< >>> に変換
+        if stripped.startswith('```'):
+            return '<<<'
+        return line
+
+    def _fix_indentation(self, line: str) -> str:
         """Remove unnecessary indentation from protocol symbol lines v2.
 
         コンテンツブロック（<<< ～ >>>）の内側はインデントを保護する。
         LLMがプロトコル記号を誤ってインデントした場合のみ補正する。
         """
-        lines = text.split('\n')
-        fixed_lines = []
-        in_block = False  # <<< ～ >>> 内かどうか
+        stripped = line.strip()
 
-        for line in lines:
-            stripped = line.strip()
+        # <<< でブロック開始
+        if stripped == '<<<':
+            self._indent_in_block = True
+            return line
 
-            # <<< でブロック開始
-            if stripped == '<<<':
-                in_block = True
-                fixed_lines.append(line)
-                continue
+        # v3.2: >>> は行頭のみブロック終端として認識（doctest保護）
+        if line.rstrip() == '>>>':
+            self._indent_in_block = False
+            return line
 
-            # v3.2: >>> は行頭のみブロック終端として認識（doctest保護）
-            if line.rstrip() == '>>>':
-                in_block = False
-                fixed_lines.append(line)
-                continue
+        # コンテンツブロック内は一切変更しない（インデント保護）
+        if self._indent_in_block:
+            return line
 
-            # コンテンツブロック内は一切変更しない（インデント保護）
-            if in_block:
-                fixed_lines.append(line)
-                continue
+        # ブロック外のプロトコル記号の不要インデントを除去
+        if _PROTOCOL_INDENT_RE.match(line):
+            return line.lstrip()
+        return line
 
-            # ブロック外のプロトコル記号の不要インデントを除去
-            if re.match(r'^\s*[:>@!?<-]', line):
-                line = line.lstrip()
-            fixed_lines.append(line)
 
-        return '\n'.join(fixed_lines)
-    
-    def _fix_vitals_format(self, text: str) -> str:
-        """Normalize Duck Vitals format with tolerance for natural language and percentages."""
-        # 1. Natural language: "Confidence: 95%" -> "::c0.95"
-        def norm_percent(match):
-            key_map = {'confidence': 'c', 'safety': 's', 'memory': 'm', 'focus': 'f'}
-            key = match.group(1).lower()
-            val = float(match.group(2)) / 100.0
-            return f'::{key_map[key]}{val:.2f}'
+@dataclass
+class ParseEvent:
+    """A finalized element of the Sym-Ops output."""
+    kind: str   # "thought" | "vitals" | "action" | "question" | "error"
+    value: Any
 
-        text = re.sub(r'\b(confidence|safety|memory|focus):\s*(\d+)%', norm_percent, text, flags=re.IGNORECASE)
-        
-        # 2. Natural language: "Confidence: 0.95" -> "::c0.95"
-        def norm_plain(match):
-            key_map = {'confidence': 'c', 'safety': 's', 'memory': 'm', 'focus': 'f'}
-            key = match.group(1).lower()
-            val = match.group(2)
-            return f'::{key_map[key]}{val}'
 
-        text = re.sub(r'\b(confidence|safety|memory|focus):\s*([\d.]+)', norm_plain, text, flags=re.IGNORECASE)
+class StrictLineParser:
+    """
+    FuzzyParser.strict_parse の行単位ステートマシン。
+    push_line() ごとに確定した要素を ParseEvent として返す。
+    """
+
+    def __init__(self, parser: "FuzzyParser"):
+        self._parser = parser
+        self.result = ParsedResult(thoughts=[], vitals={}, actions=[], questions=[], errors=[])
+        self._current_action: Optional[Action] = None
+        self._in_content = False
+        self._content_buffer: List[str] = []   # <<< ～ >>>（execute_batch・YAMLフロントマター含む）
+        self._batch_count = 0
+
+    def push_line(self, line: str) -> List[ParseEvent]:
+        events: List[ParseEvent] = []
+        if self._in_content and not line.startswith('>>>') and '<<<' not in line:
+            # コンテンツ行（大半の行）
+            self._content_buffer.append(line)
+            return events
+
+        stripped = line.strip()
+        result = self.result
+
+        if stripped == '<<<':
+            if not self._current_action:
+                # Robustness: Create a default action if content starts without one
+                self._current_action = Action(type="response", path="")
+            self._in_content = True
+            return events
+
+        # v3.2: >>> は行頭（column 0）のみブロック終端として認識する（doctest保護）
+        if line.rstrip() == '>>>':
+            if not self._in_content:
+                return events  # Ignore orphan >>>
+
+            action = self._current_action
+            if action:
+                if action.type == 'execute_batch':
+                    # バッチブロックを %%% で分割してサブアクションに展開
+                    self._batch_count += 1
+                    for sub in self._parser._split_batch_content('\n'.join(self._content_buffer)):
+                        sub.batch = self._batch_count
+                        self._append_action(sub, events)
+                else:
+                    raw_content = '\n'.join(self._content_buffer)
+                    yaml_params, body = self._parser._extract_yaml_frontmatter(raw_content)
+                    action.content = body
+                    # YAML フロントマターのパラメーターをインライン params にマージ（YAML優先）
+                    action.params = {**action.params, **yaml_params}
+                    self._append_action(action, events)
+                self._current_action = None
+            self._content_buffer = []
+            self._in_content = False
+            return events
+
+        if self._in_content:
+            self._content_buffer.append(line)
+            return events
+
+        if stripped.startswith('>>'):
+            thought = stripped[2:].strip()
+            result.thoughts.append(thought)
+            events.append(ParseEvent("thought", thought))
+        elif stripped.startswith('::'):
+            if self._parser._is_vitals(stripped):
+                self._parser._parse_vitals(stripped, result.vitals)
+                events.append(ParseEvent("vitals", dict(result.vitals)))
+            else:
+                if self._current_action:
+                    # 前のアクションにコンテンツブロックがなかった
+                    # コンテンツなしの単体アクションとして追加する
+                    self._append_action(self._current_action, events)
+                self._current_action = self._parser._parse_action(stripped)
+        elif stripped.startswith('?'):
+            question = stripped[1:].strip()
+            result.questions.append(question)
+            events.append(ParseEvent("question", question))
+        elif stripped.startswith('!'):
+            error = stripped[1:].strip()
+            result.errors.append(error)
+            events.append(ParseEvent("error", error))
+        return events
+
+    def close(self) -> List[ParseEvent]:
+        """入力の終端。未追加のアクションがあれば追加する（コンテンツブロックなしの単体アクション）。"""
+        events: List[ParseEvent] = []
+        if self._current_action:
+            self._append_action(self._current_action, events)
+            self._current_action = None
+        return events
+
+    def _append_action(self, action: Action, events: List[ParseEvent]) -> None:
+        self.result.actions.append(action)
+        events.append(ParseEvent("action", action))
 
-        # 3. Handle #c0.9 style
-        text = re.sub(r'#([cmfs])\s*([\d.]+)', r'::\1\2', text)
-        
-        # 4. Standardize spacing: "::c 0.9" -> "::c0.9"
-        text = re.sub(r'::([cmfs])\s+([\d.]+)', r'::\1\2', text)
-        
-        return text
 
 class FuzzyParser:
     """Tolerant parser v2.1"""
     
     def strict_parse(self, text: str) -> ParsedResult:
         """Strict parse v3.1 format. execute_batch ブロックを認識する。"""
-        result = ParsedResult(thoughts=[], vitals={}, actions=[], questions=[], errors=[])
-        current_action = None
-        in_content = False
-        content_buffer = []
-        lines = text.split('\n')
-        i = 0
-
-        while i < len(lines):
-            line = lines[i]
-            stripped = line.strip()
-
-            if stripped == '<<<':
-                if not current_action:
-                    # Robustness: Create a default action if content starts without one
-                    current_action = Action(type="response", path="")
-                in_content = True
-                i += 1
-                continue
-
-            # v3.2: >>> は行頭（column 0）のみブロック終端として認識する（doctest保護）
-            if line.rstrip() == '>>>':
-                if not in_content:
-                    i += 1
-                    continue # Ignore orphan >>>
-                
-                if current_action:
-                    if current_action.type == 'execute_batch':
-                        # バッチブロックを %%% で分割してサブアクションに展開
-                        batch_actions = self._split_batch_content('\n'.join(content_buffer))
-                        result.actions.extend(batch_actions)
-                    else:
-                        raw_content = '\n'.join(content_buffer)
-                        yaml_params, body = self._extract_yaml_frontmatter(raw_content)
-                        current_action.content = body
-                        # YAML フロントマターのパラメーターをインライン params にマージ（YAML優先）
-                        current_action.params = {**current_action.params, **yaml_params}
-                        result.actions.append(current_action)
-                    current_action = None
-                content_buffer = []
-                in_content = False
-                i += 1
-                continue
-
-            if in_content:
-                content_buffer.append(line)
-                i += 1
-                continue
-
-            if stripped.startswith('>>'):
-                result.thoughts.append(stripped[2:].strip())
-            elif stripped.startswith('::'):
-                if self._is_vitals(stripped):
-                    self._parse_vitals(stripped, result.vitals)
-                else:
-                    if current_action:
-                        # 前のアクションにコンテンツブロックがなかった
-                        # コンテンツなしの単体アクションとして追加する
-                        result.actions.append(current_action)
-                    current_action = self._parse_action(stripped)
-            elif stripped.startswith('?'):
-                result.questions.append(stripped[1:].strip())
-            elif stripped.startswith('!'):
-                result.errors.append(stripped[1:].strip())
-            i += 1
-
-        # ループ終了時に未追加のアクションがあれば追加（コンテンツブロックなしの単体アクション）
-        if current_action:
-            result.actions.append(current_action)
-
-        return result
+        line_parser = StrictLineParser(self)
+        for line in text.split('\n'):
+            line_parser.push_line(line)
+        line_parser.close()
+        return line_parser.result
 
     def _extract_yaml_frontmatter(self, content: str) -> tuple[dict, str]:
         """
@@ -411,6 +536,11 @@ class FuzzyParser:
 
         first_line = seg_lines[0].strip()
         content_lines = seg_lines[1:]
+        # AutoRepair がバッチ内の "read_file @x" を ":: read_file @ x" に補完している場合がある
+        if first_line.startswith('::'):
+            first_line = first_line[2:].strip()
+        if not first_line:
+            return None
 
         # "action_name @path" または "action_name" を解析
         if '@' in first_line:
@@ -423,8 +553,17 @@ class FuzzyParser:
             action_type = tokens[0]
             path_part = tokens[1] if len(tokens) > 1 else ""
 
-        # Extract parameters from path_part
-        path, params = self._extract_line_params(path_part)
+        # "@path > dependency": 同じバッチ内の依存先（run_command はシェルのリダイレクトと区別できないため対象外）。
+        # > はパスの直後のものだけを依存の印とみなす（pattern=-> のようなパラメータの値の中の > は対象外）
+        depends_on = None
+        dependency = _BATCH_DEPENDS_RE.match(path_part) if action_type != 'run_command' else None
+        if dependency:
+            depends_on, params = self._extract_line_params(dependency.group(2))
+            path = dependency.group(1)
+            depends_on = depends_on or None
+        else:
+            # Extract parameters from path_part
+            path, params = self._extract_line_params(path_part)
 
         content = '\n'.join(content_lines).strip()
 
@@ -437,6 +576,7 @@ class FuzzyParser:
             type=action_type,
             path=path,
             content=content,
+            depends_on=depends_on,
             params=params,
             confidence=0.95  # バッチは明示的な構文なので高信頼度
         )
@@ -666,35 +806,13 @@ class SymOpsProcessor:
     def process(self, raw_output: str) -> ParsedResult:
         """
         Main processing pipeline with preprocessing
+
+        前処理・修復・パースを1行ずつのステージとして1パスで実行する
+        （IncrementalSymOpsParser に全文を一度に渡すのと同じ）。
         """
-        # Phase 0: Plain Markdown/Text Detection & Conversion
-        converted, was_converted = self.markdown_converter.convert(raw_output)
-        if was_converted:
-            raw_output = converted
-        
-        # Phase 1: Preprocessing (remove preamble, unwrap markdown)
-        preprocessed, corrections = self.preprocessor.preprocess(raw_output)
-        
-        # Phase 2: Auto Repair
-        repaired = self.repairer.repair(preprocessed)
-        
-        # Phase 3: Strict Parse Attempt
-        try:
-            parsed = self.parser.strict_parse(repaired)
-            if was_converted:
-                parsed.warnings.append("Converted from plain markdown/text")
-            if corrections:
-                parsed.warnings.append(f"Preprocessing: {', '.join(corrections)}")
-            return parsed
-        except ParseError:
-            pass
-        
-        # Phase 4: Fuzz Parse (Fallback)
-        partial = self.parser.fuzzy_parse(repaired)
-        partial.warnings.append("Partial parse used")
-        if was_converted:
-            partial.warnings.append("Converted from plain markdown/text")
-        if corrections:
-            partial.warnings.append(f"Preprocessing: {', '.join(corrections)}")
-        
-        return partial
+        from companion.utils.sym_ops_stream import IncrementalSymOpsParser
+
+        parser = IncrementalSymOpsParser(self)
+        parser.feed(raw_output)
+        parser.close()
+        return parser.result()
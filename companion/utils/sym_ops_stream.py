@@ -0,0 +1,205 @@
+"""
+Incremental Sym-Ops parser
+
+SymOpsProcessor.process() と同じ結果を、チャンク単位の入力から逐次的に得る。
+前処理（preamble除去・外側```の除去）、AutoRepair の各パス、strict_parse を
+1行ずつのステージとして直列につなぎ、全文の再分割を繰り返さない。
+
+    parser = IncrementalSymOpsParser()
+    for chunk in stream:
+        for event in parser.feed(chunk):
+            ...            # event.kind: thought / vitals / action / question / error
+    for event in parser.close():
+        ...
+    result = parser.result()   # SymOpsProcessor().process(全文) と同一
+
+全文を見ないと結果が決まらないケースは、確定するまでイベントを保留する:
+- `::` 行が現れるまで（PlainMarkdownConverter によるラップの可能性）
+- 末尾の行（strip と末尾 ``` 除去、未閉じブロックの補完）
+- 行をまたぐバイタル表記（例: "confidence:" の直後で改行）は AutoRepair が保留する
+"""
+from typing import List, Optional
+
+from companion.utils.sym_ops import AutoRepair, ParsedResult, ParseEvent, StrictLineParser
+
+# preamble 判定に使うプロトコル開始記号（SymOpsPreprocessor と同じ）
+_PREAMBLE_MARKERS = ('>>', '::', '<<<')
+
+
+class IncrementalSymOpsParser:
+    """
+    Chunk-fed Sym-Ops parser with the same output as SymOpsProcessor.process.
+    """
+
+    def __init__(self, processor=None):
+        if processor is None:
+            from companion.utils.sym_ops import SymOpsProcessor
+            processor = SymOpsProcessor()
+        self._processor = processor
+        # AutoRepair / StrictLineParser は入力ごとのステートを持つので共有しない
+        self._repairer = AutoRepair()
+        self._line_parser = StrictLineParser(processor.parser)
+        self._chunks: List[str] = []
+        self._partial = ""
+        self._streaming = False   # 最初の :: 行が現れたら True
+        self._closed = False
+        self._final: Optional[ParsedResult] = None
+
+        # Sym-Ops 判定待ちの行 / 前処理
+        self._pending_lines: List[str] = []
+        self._held: List[str] = []     # 末尾の strip・``` 除去のため保留中の行
+        self._corrections: List[str] = []
+
+    # ------------------------------------------------------------------ API
+
+    def feed(self, chunk: str) -> List[ParseEvent]:
+        """チャンクを追加し、確定したイベントを返す。"""
+        if self._closed:
+            raise ValueError("feed() called after close()")
+        self._chunks.append(chunk)
+        if not chunk:
+            return []
+
+        events: List[ParseEvent] = []
+        lines = (self._partial + chunk).split('\n')
+        self._partial = lines.pop()
+        for line in lines:
+            self._push_line(line, events)
+        return events
+
+    def close(self) -> List[ParseEvent]:
+        """入力の終端。残りのイベントをすべて返す。"""
+        if self._closed:
+            return []
+        self._closed = True
+
+        events: List[ParseEvent] = []
+        self._push_line(self._partial, events)
+        self._partial = ""
+        if self._streaming:
+            self._finish_streaming(events)
+        else:
+            self._finish_plain(events)
+        return events
+
+    def result(self) -> ParsedResult:
+        """close() 後の最終結果（SymOpsProcessor.process と同一）。"""
+        if not self._closed:
+            raise ValueError("result() called before close()")
+        return self._final
+
+    @property
+    def text(self) -> str:
+        """これまでに受け取った全文。"""
+        return "".join(self._chunks)
+
+    # ------------------------------------------------------------ preprocess
+
+    def _push_line(self, line: str, events: List[ParseEvent]) -> None:
+        if self._streaming:
+            self._hold_line(line, events)
+            return
+
+        # PlainMarkdownConverter: :: 行が1つでもあれば変換されない
+        self._pending_lines.append(line)
+        if not line.strip().startswith('::'):
+            return
+
+        lines = self._pending_lines
+        self._pending_lines = []
+        self._streaming = True
+
+        # SymOpsPreprocessor._remove_preamble
+        marker = next(i for i, l in enumerate(lines) if l.strip().startswith(_PREAMBLE_MARKERS))
+        start = marker
+        while start > 0 and not lines[start - 1].strip():
+            start -= 1
+        if start > 0:
+            self._corrections.append('preamble_removed')
+
+        # SymOpsPreprocessor._unwrap_markdown_block: 先頭側の strip()
+        first = lines[marker].lstrip()
+        if start < marker or first != lines[marker]:
+            self._corrections.append('markdown_unwrapped')
+        self._held.append(first)
+        for l in lines[marker + 1:]:
+            self._hold_line(l, events)
+
+    def _hold_line(self, line: str, events: List[ParseEvent]) -> None:
+        """
+        末尾処理（strip、最終行の ``` 除去）が確定するまで最後の非空行を保留する。
+        最終非空行が ``` の場合は、その手前の非空行からを保留する。
+        """
+        stripped = line.strip()
+        if not stripped:
+            self._held.append(line)
+            return
+        if stripped == '```':
+            self._held.append(line)
+            keep_from = next(
+                (i for i in range(len(self._held) - 2, -1, -1) if self._held[i].strip()),
+                0,
+            )
+            released = self._held[:keep_from]
+            self._held = self._held[keep_from:]
+        else:
+            released = self._held
+            self._held = [line]
+
+        push_line = self._line_parser.push_line
+        for l in released:
+            for repaired in self._repairer.push_line(l):
+                events.extend(push_line(repaired))
+
+    def _finish_streaming(self, events: List[ParseEvent]) -> None:
+        held = self._held
+        self._held = []
+
+        # strip() の末尾側
+        unwrapped = 'markdown_unwrapped' in self._corrections
+        while held and not held[-1].strip():
+            held.pop()
+            unwrapped = True
+        if held[-1] != held[-1].rstrip():
+            held[-1] = held[-1].rstrip()
+            unwrapped = True
+        # 最終行の ``` を除去
+        if len(held) > 1 and held[-1].strip() == '```':
+            held.pop()
+            unwrapped = True
+        if unwrapped and 'markdown_unwrapped' not in self._corrections:
+            self._corrections.append('markdown_unwrapped')
+
+        # 末尾の行は AutoRepair.close_blocks の rstrip 対象になりうるので集めてから parse する
+        tail: List[str] = []
+        for i, l in enumerate(held):
+            tail.extend(self._repairer.push_line(l, has_newline=i < len(held) - 1))
+        tail.extend(self._repairer.flush())
+        self._parse_lines(self._repairer.close_blocks(tail), events)
+        events.extend(self._line_parser.close())
+
+        self._final = self._line_parser.result
+        if self._corrections:
+            self._final.warnings.append(f"Preprocessing: {', '.join(self._corrections)}")
+
+    def _finish_plain(self, events: List[ParseEvent]) -> None:
+        """
+        :: 行が1つもない応答。PlainMarkdownConverter の変換結果を全文で処理する。
+        （変換前にイベントは出せないので、ここで一括して返す）
+        """
+        processor = self._processor
+        text, was_converted = processor.markdown_converter.convert('\n'.join(self._pending_lines))
+        self._pending_lines = []
+        preprocessed, corrections = processor.preprocessor.preprocess(text)
+        self._parse_lines(self._repairer.repair(preprocessed).split('\n'), events)
+        events.extend(self._line_parser.close())
+
+        self._final = self._line_parser.result
+        if was_converted:
+            self._final.warnings.append("Converted from plain markdown/text")
+        if corrections:
+            self._final.warnings.append(f"Preprocessing: {', '.join(corrections)}")
+
+    def _parse_lines(self, lines: List[str], events: List[ParseEvent]) -> None:
+        for line in lines:
+            events.extend(self._line_parser.push_line(line))
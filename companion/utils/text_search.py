@@ -0,0 +1,246 @@
+"""
+grep_files の検索本体（プロセスプールのワーカーでも動くように依存の少ないモジュールにしている）。
+
+ワーカーには (正規表現, ファイルの絶対パスのリスト, ワークスペースルート, 上限件数) を渡し、
+("相対パス:行番号: 行" のリスト, 大きすぎてスキップしたファイル数) を受け取る。spawn したワーカーが import するのはこのモジュールだけ。
+
+1ファイルの検索は行ごとのループではなく、ファイル全体（大きいものは mmap）に正規表現を1回ずつ走らせ、
+ヒットした位置の行だけを切り出して行番号に変換する。判定は従来どおり「行ごとに regex.search」と同じになるよう、
+ヒットした行は元の正規表現で確認してから結果に入れる（全体検索は候補を見つけるためだけに使う）。
+
+    bytes  パターンが ASCII だけで、非 ASCII 文字にマッチしうる構文（. \\w [^...] など）を含まない場合。
+           mmap のバイト列をデコードせずに検索する
+    text   それ以外。ファイル全体をデコードしてから検索する
+    lines  \\A / \\Z を含む場合（行ごとでないと意味が変わる）。従来どおり1行ずつ検索する
+
+CR を含むファイルはテキストモードの読み込みと同じく改行を "\n" にそろえてから検索する。
+先頭のバイトに NUL を含むファイル（バイナリ）と max_bytes を超えるファイルは読まずにスキップする。
+バイナリは黙って飛ばし、max_bytes を超えたテキストファイルだけを数えて返す（検索されなかったことを伝えるため）。
+
+stop_path を渡すと、ファイルごとにそのパスが存在するかを確かめ、作られていたらそこで打ち切る。
+呼び出し側が全体の件数の上限に達したとき、実行中のワーカーのチャンクを止めるためのもの
+（プロセス間で共有できる一番軽いフラグとしてファイルの有無を使う）。
+"""
+import mmap
+import os
+import re
+from typing import List, Optional, Sequence, Tuple
+
+# バイナリ判定に読む先頭のバイト数
+SNIFF_BYTES = 8192
+# これより大きいファイルは mmap で読む
+MMAP_MIN_BYTES = 256 * 1024
+DEFAULT_MAX_FILE_BYTES = 10 * 1024 * 1024
+
+# バイト列で検索すると str での検索より狭くなる（非 ASCII 文字に当たらなくなる）エスケープ
+_UNICODE_ESCAPES = set("wWdDsSbBuUNx")
+
+
+def scan_mode(pattern: str) -> str:
+    """パターンから検索方式（bytes / text / lines）を決める。"""
+    if "\\A" in pattern or "\\Z" in pattern:
+        return "lines"
+    if not pattern.isascii():
+        return "text"
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\":
+            if pattern[i + 1:i + 2] in _UNICODE_ESCAPES:
+                return "text"
+            i += 2
+            continue
+        if ch == "." or pattern.startswith("[^", i):
+            return "text"
+        i += 1
+    return "bytes"
+
+
+def _whole_buffer_pattern(pattern: str) -> str:
+    """
+    行ごとの検索で当たる行をファイル全体の検索でも取りこぼさないようにパターンを書き換える。
+
+    1行ずつの検索では行末の改行を消費した直後（文字列の末尾）でも $ が成り立つが、
+    ファイル全体では次の行が続くので成り立たない（例: 空行に対する \\s+$）。
+    文字クラス外の $ を「$ または改行の直後」に置き換えて、その位置でも候補になるようにする。
+    """
+    out = []
+    i = 0
+    in_class = False
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\":
+            out.append(pattern[i:i + 2])
+            i += 2
+            continue
+        if in_class:
+            if ch == "]":
+                in_class = False
+        elif ch == "[":
+            in_class = True
+            # "[]" や "[^]" の直後の ] はクラスの中の文字
+            j = i + 1
+            if pattern.startswith("^", j):
+                j += 1
+            if pattern.startswith("]", j):
+                out.append(pattern[i:j + 1])
+                i = j + 1
+                continue
+        elif ch == "$":
+            out.append("(?:$|(?<=\\n))")
+            i += 1
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _candidate_regex(regex: "re.Pattern[str]", mode: str) -> "re.Pattern":
+    """ファイル全体から候補を探すための MULTILINE 版（bytes モードではバイト列のパターン）。"""
+    pattern = _whole_buffer_pattern(regex.pattern)
+    flags = regex.flags | re.MULTILINE
+    if mode == "bytes":
+        try:
+            return re.compile(pattern.encode("ascii"), flags & ~re.UNICODE)
+        except (re.error, ValueError):
+            pass
+    try:
+        return re.compile(pattern, flags)
+    except re.error:
+        return re.compile(regex.pattern, flags)
+
+
+def _is_binary(head: bytes) -> bool:
+    return b"\0" in head
+
+
+def _search_buffer(buf, regex, candidate, newline, decode, limit: int) -> List[Tuple[int, str]]:
+    """
+    buf 全体を candidate で検索し、ヒットした行を元の regex で確認する。
+    newline / decode は buf の型（bytes か str）に合わせたもの。
+    """
+    hits: List[Tuple[int, str]] = []
+    size = len(buf)
+    pos = 0
+    line_no = 1
+    counted = 0
+    while pos <= size and len(hits) < limit:
+        match = candidate.search(buf, pos)
+        if match is None:
+            break
+        start = match.start()
+        line_start = buf.rfind(newline, 0, start) + 1
+        if line_start >= size:
+            break  # 末尾の改行の後ろは行ではない
+        line_end = buf.find(newline, start)
+        if line_end == -1:
+            line_end = size
+        # 行番号はヒットした位置までの改行だけを数える
+        line_no += buf[counted:line_start].count(newline)
+        counted = line_start
+        line = decode(buf[line_start:line_end])
+        # テキストモードで1行ずつ読んだときと同じ入力（行末の改行付き）で確認する
+        if regex.search(line + "\n" if line_end < size else line):
+            hits.append((line_no, line.rstrip()))
+        pos = line_end + 1
+    return hits
+
+
+def _search_lines(path: str, regex: "re.Pattern[str]", limit: int) -> List[Tuple[int, str]]:
+    hits: List[Tuple[int, str]] = []
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line_no, line in enumerate(f, 1):
+            if regex.search(line):
+                hits.append((line_no, line.rstrip()))
+                if len(hits) >= limit:
+                    break
+    return hits
+
+
+class FileTooLarge(Exception):
+    """search_file: ファイルが max_bytes を超えている。"""
+
+
+def _decode(data) -> str:
+    return bytes(data).decode("utf-8", errors="ignore")
+
+
+def search_file(
+    path: str,
+    regex: "re.Pattern[str]",
+    limit: int,
+    mode: Optional[str] = None,
+    candidate: Optional["re.Pattern"] = None,
+    max_bytes: int = DEFAULT_MAX_FILE_BYTES,
+) -> Optional[List[Tuple[int, str]]]:
+    """1ファイルを検索して [(行番号, 行)] を返す。バイナリは None、max_bytes を超えるファイルは FileTooLarge。"""
+    mode = mode or scan_mode(regex.pattern)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return []
+        # 大きすぎるファイルも先頭だけは読み、バイナリなら黙ってスキップする（テキストだけを数えるため）
+        if _is_binary(f.read(SNIFF_BYTES)):
+            return None
+        if size > max_bytes:
+            raise FileTooLarge(path)
+        if mode == "lines":
+            return _search_lines(path, regex, limit)
+        candidate = candidate or _candidate_regex(regex, mode)
+        f.seek(0)
+        if size >= MMAP_MIN_BYTES:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                return _search_data(buf, regex, candidate, mode, limit)
+        data = f.read()
+    return _search_data(data, regex, candidate, mode, limit)
+
+
+def _search_data(data, regex, candidate, mode: str, limit: int) -> List[Tuple[int, str]]:
+    # CR を含むファイルはテキストモードと同じく改行を "\n" にそろえてから検索する（行番号・$ の位置を合わせるため）
+    if data.find(b"\r") != -1:
+        text = _decode(data).replace("\r\n", "\n").replace("\r", "\n")
+        if mode == "bytes":
+            candidate = re.compile(candidate.pattern.decode("ascii"), candidate.flags | re.UNICODE)
+        return _search_buffer(text, regex, candidate, "\n", str, limit)
+    if mode == "bytes":
+        return _search_buffer(data, regex, candidate, b"\n", _decode, limit)
+    return _search_buffer(_decode(data), regex, candidate, "\n", str, limit)
+
+
+def grep_paths(
+    regex: "re.Pattern[str]",
+    paths: Sequence[str],
+    root: str,
+    limit: int,
+    max_bytes: int = DEFAULT_MAX_FILE_BYTES,
+    stop_path: Optional[str] = None,
+) -> Tuple[List[str], int]:
+    """
+    paths を順に検索し、(最大 limit 件の "相対パス:行番号: 行", max_bytes を超えてスキップしたファイル数) を返す。
+    stop_path が作られたら残りのファイルは検索しない（結果は呼び出し側で捨てられる）。
+    """
+    results: List[str] = []
+    oversized = 0
+    if limit <= 0:
+        return results, oversized
+    mode = scan_mode(regex.pattern)
+    candidate = None if mode == "lines" else _candidate_regex(regex, mode)
+    for file_path in paths:
+        if stop_path is not None and os.path.exists(stop_path):
+            break
+        try:
+            hits = search_file(file_path, regex, limit - len(results), mode, candidate, max_bytes)
+        except FileTooLarge:
+            oversized += 1
+            continue
+        except (OSError, ValueError):
+            continue
+        if hits is None:
+            # バイナリ
+            continue
+        if hits:
+            rel_path = os.path.relpath(file_path, root)
+            results.extend(f"{rel_path}:{line_no}: {line}" for line_no, line in hits)
+            if len(results) >= limit:
+                break
+    return results, oversized
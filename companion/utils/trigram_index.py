@@ -0,0 +1,378 @@
+"""
+Persistent trigram index that narrows grep_files to candidate files.
+
+codesearch / zoekt と同じ考え方で、ワークスペースのファイルごとに含まれる3文字の並び（trigram）を
+転置インデックスにしてディスクに置いておく。grep の正規表現からは「マッチする行が必ず含む trigram」の
+AND / OR のクエリを作り、インデックスで候補のファイルだけに絞ってから本物の正規表現で確認する。
+
+    index = TrigramIndex(workspace_root, "logs/trigram_index")
+    candidates = index.candidates(regex, files, max_bytes)   # None ならクエリを作れない（全ファイルを検索する）
+
+    - trigram は小文字にした本文から取る（大文字小文字を無視する検索も同じインデックスで絞れる）。
+    - インデックスは base（大きい、めったに書き換えない）と delta（変更・追加されたファイル）の2つのセグメント。
+      ファイルは (サイズ, mtime_ns) で検証し、変わっていたら読み直して delta に入れる。
+      delta が大きくなったら base にまとめ直す（compaction）。
+    - 対象のファイル（隠しファイル・include の規則）は呼び出し側の走査に任せる。
+      インデックスは渡されたファイルについてだけ最新にする。
+    - バイナリと大きすぎるファイルは中身を索引せず、候補にそのまま残す（grep 側でスキップされる）。
+
+ディスク上の形式（セグメントごと）:
+    <name>.json      バージョン・ファイル一覧 [相対パス, サイズ, mtime_ns, flags]
+    <name>.keys      trigram を UTF-32-LE で並べたもの（ソート済み）
+    <name>.offsets   array('Q'): trigram ごとのポスティングの開始位置
+    <name>.postings  array('I'): ファイル番号
+"""
+import json
+import os
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+try:
+    from re import _constants as _sre
+    from re import _parser as _sre_parse
+except ImportError:  # Python 3.10
+    import sre_constants as _sre  # type: ignore[no-redef]
+    import sre_parse as _sre_parse  # type: ignore[no-redef]
+
+INDEX_VERSION = 1
+# ファイルの状態（flags）
+FLAG_BINARY = 1
+FLAG_LARGE = 2
+# バイナリ判定に読む先頭のバイト数（text_search と同じ）
+SNIFF_BYTES = 8192
+# delta がこの件数（または base の 1/4）を超えたら base にまとめ直す
+COMPACT_MIN_FILES = 500
+
+# クエリ: trigram（str）/ ("and", [...]) / ("or", [...])。None は「絞れない（全ファイル）」
+Query = Union[str, Tuple[str, list]]
+FileEntry = Tuple[str, int, int, int]
+
+
+# --- trigram ---
+
+def normalize_text(data: bytes) -> str:
+    """索引する本文（grep と同じく改行をそろえ、小文字にする）。"""
+    text = data.decode("utf-8", errors="ignore")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text.lower()
+
+
+def trigrams_of(text: str) -> Set[str]:
+    n = len(text)
+    if n < 3:
+        return set()
+    # 文字列のスライスを map で作る（Python のループより数倍速い）
+    return set(map(text.__getitem__, map(slice, range(n - 2), range(3, n + 1))))
+
+
+def _literal_query(run: str) -> Optional[Query]:
+    grams = sorted(trigrams_of(run.lower()))
+    if not grams:
+        return None
+    return grams[0] if len(grams) == 1 else ("and", grams)
+
+
+def _and(parts: List[Optional[Query]]) -> Optional[Query]:
+    parts = [p for p in parts if p is not None]
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else ("and", parts)
+
+
+def _or(parts: List[Optional[Query]]) -> Optional[Query]:
+    if not parts or any(p is None for p in parts):
+        return None
+    return parts[0] if len(parts) == 1 else ("or", parts)
+
+
+def _sequence_query(items: Iterable) -> Optional[Query]:
+    """
+    正規表現の並び（sre の構文木）から、マッチが必ず含む trigram のクエリを作る。
+    連続するリテラルの trigram を AND し、グループ・繰り返し（1回以上）は中身を AND、
+    選択（a|b）は各分岐の OR にする。わからない構文はそこでリテラルの並びを切る（候補が増えるだけで取りこぼさない）。
+    """
+    parts: List[Optional[Query]] = []
+    run: List[str] = []
+
+    def flush() -> None:
+        if run:
+            parts.append(_literal_query("".join(run)))
+            run.clear()
+
+    for op, av in items:
+        if op is _sre.LITERAL:
+            run.append(chr(av))
+            continue
+        flush()
+        if op is _sre.SUBPATTERN:
+            parts.append(_sequence_query(av[-1]))
+        elif op in (_sre.MAX_REPEAT, _sre.MIN_REPEAT) or op is getattr(_sre, "POSSESSIVE_REPEAT", None):
+            if av[0] >= 1:
+                parts.append(_sequence_query(av[2]))
+        elif op is _sre.BRANCH:
+            parts.append(_or([_sequence_query(branch) for branch in av[1]]))
+        elif op is getattr(_sre, "ATOMIC_GROUP", None):
+            parts.append(_sequence_query(av))
+    flush()
+    return _and(parts)
+
+
+def regex_query(pattern: str, flags: int = 0) -> Optional[Query]:
+    """正規表現から trigram クエリを作る。絞り込めない・解析できないときは None。"""
+    try:
+        return _sequence_query(_sre_parse.parse(pattern, flags))
+    except Exception:
+        return None
+
+
+# --- segment ---
+
+class Segment:
+    """Immutable inverted index over a list of files."""
+
+    def __init__(self, files: List[FileEntry], keys: List[str], offsets: "array[int]", postings: "array[int]"):
+        self.files = files
+        self.by_path: Dict[str, int] = {entry[0]: i for i, entry in enumerate(files)}
+        self.keys = keys
+        self.key_index: Dict[str, int] = {key: i for i, key in enumerate(keys)}
+        self.offsets = offsets
+        self.postings = postings
+
+    @classmethod
+    def empty(cls) -> "Segment":
+        return cls([], [], array("Q", [0]), array("I"))
+
+    @classmethod
+    def build(cls, entries: Sequence[Tuple[FileEntry, Set[str]]]) -> "Segment":
+        inverted: Dict[str, List[int]] = {}
+        for file_id, (_, grams) in enumerate(entries):
+            for gram in grams:
+                ids = inverted.get(gram)
+                if ids is None:
+                    inverted[gram] = [file_id]
+                else:
+                    ids.append(file_id)
+        keys = sorted(inverted)
+        offsets = array("Q", [0])
+        postings = array("I")
+        for key in keys:
+            postings.extend(inverted[key])
+            offsets.append(len(postings))
+        return cls([entry for entry, _ in entries], keys, offsets, postings)
+
+    def forward(self) -> List[Set[str]]:
+        """ファイルごとの trigram 集合に戻す（compaction 用）。"""
+        grams: List[Set[str]] = [set() for _ in self.files]
+        for i, key in enumerate(self.keys):
+            for file_id in self.postings[self.offsets[i]:self.offsets[i + 1]]:
+                grams[file_id].add(key)
+        return grams
+
+    def _posting(self, gram: str) -> Set[int]:
+        i = self.key_index.get(gram)
+        if i is None:
+            return set()
+        return set(self.postings[self.offsets[i]:self.offsets[i + 1]])
+
+    def evaluate(self, query: Query) -> Set[int]:
+        """クエリに当てはまるファイル番号の集合。"""
+        if isinstance(query, str):
+            return self._posting(query)
+        op, parts = query
+        if op == "or":
+            result: Set[int] = set()
+            for part in parts:
+                result |= self.evaluate(part)
+            return result
+        # AND は小さいポスティングから絞る
+        ordered = sorted(parts, key=lambda p: len(self._posting(p)) if isinstance(p, str) else len(self.files))
+        result = self.evaluate(ordered[0])
+        for part in ordered[1:]:
+            if not result:
+                break
+            result &= self.evaluate(part)
+        return result
+
+    # --- persistence ---
+
+    def save(self, directory: str, name: str) -> None:
+        base = os.path.join(directory, name)
+        meta = {"version": INDEX_VERSION, "files": self.files}
+        _atomic_write(base + ".keys", "".join(self.keys).encode("utf-32-le"))
+        _atomic_write(base + ".offsets", self.offsets.tobytes())
+        _atomic_write(base + ".postings", self.postings.tobytes())
+        # 一覧は最後に書く（これが読めればほかのファイルも揃っている）
+        _atomic_write(base + ".json", json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+    @classmethod
+    def load(cls, directory: str, name: str) -> Optional["Segment"]:
+        base = os.path.join(directory, name)
+        try:
+            with open(base + ".json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != INDEX_VERSION:
+                return None
+            with open(base + ".keys", "rb") as f:
+                joined = f.read().decode("utf-32-le")
+            offsets = array("Q")
+            with open(base + ".offsets", "rb") as f:
+                offsets.frombytes(f.read())
+            postings = array("I")
+            with open(base + ".postings", "rb") as f:
+                postings.frombytes(f.read())
+        except (OSError, ValueError):
+            return None
+        keys = [joined[i:i + 3] for i in range(0, len(joined), 3)]
+        if len(offsets) != len(keys) + 1:
+            return None
+        return cls([tuple(entry) for entry in meta["files"]], keys, offsets, postings)
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+# --- index ---
+
+class TrigramIndex:
+    """base + delta segments for one workspace, refreshed lazily from (size, mtime_ns)."""
+
+    def __init__(self, root: str, directory: str):
+        self.root = os.path.abspath(root)
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.base = Segment.load(directory, "base") or Segment.empty()
+        delta = Segment.load(directory, "delta") or Segment.empty()
+        # delta は小さいので、ファイルごとの trigram 集合で持っておき、変わるたびにセグメントを作り直す
+        self._delta_entries: Dict[str, Tuple[FileEntry, Set[str]]] = {
+            entry[0]: (entry, grams) for entry, grams in zip(delta.files, delta.forward())
+        }
+        self.delta = delta
+        # 書き込み直後などで (サイズ, mtime) が変わらなくても読み直すファイル
+        self._dirty: Set[str] = set()
+
+    def mark_dirty(self, path: str) -> None:
+        """path を次の検索で読み直す（mtime の分解能が粗いと同じサイズの書き換えを見逃すため）。"""
+        with self._lock:
+            self._dirty.add(self._relpath(os.path.abspath(path)))
+
+    def _relpath(self, path: str) -> str:
+        if path.startswith(self.root + os.sep):
+            return path[len(self.root) + 1:]
+        return os.path.relpath(path, self.root)
+
+    @staticmethod
+    def _read(path: str, size: int, max_bytes: int) -> Tuple[int, Set[str]]:
+        if size > max_bytes:
+            return FLAG_LARGE, set()
+        with open(path, "rb") as f:
+            data = f.read()
+        if b"\0" in data[:SNIFF_BYTES]:
+            return FLAG_BINARY, set()
+        return 0, trigrams_of(normalize_text(data))
+
+    def _is_fresh(self, rel: str, size: int, mtime_ns: int, max_bytes: int) -> bool:
+        """rel の索引が今のファイル（サイズ・mtime）と一致しているか。delta にあればそちらを見る。"""
+        for segment in (self.delta, self.base):
+            file_id = segment.by_path.get(rel)
+            if file_id is None:
+                continue
+            _, s, m, flags = segment.files[file_id]
+            # 大きすぎて索引しなかったファイルは、上限が上がったら読み直す
+            return s == size and m == mtime_ns and not (flags & FLAG_LARGE and size <= max_bytes)
+        return False
+
+    def candidates(self, regex, paths: Sequence[str], max_bytes: int) -> Optional[List[str]]:
+        """
+        paths のうち regex にマッチしうるファイル（順序は paths のまま）。
+        クエリを作れないパターンなら None（呼び出し側はすべてのファイルを検索する）。
+        """
+        query = regex_query(regex.pattern, regex.flags)
+        if query is None:
+            return None
+        with self._lock:
+            located: List[Tuple[str, str]] = []
+            changed = False
+            for path in paths:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                rel = self._relpath(path)
+                if rel in self._dirty or not self._is_fresh(rel, st.st_size, st.st_mtime_ns, max_bytes):
+                    self._dirty.discard(rel)
+                    try:
+                        flags, grams = self._read(path, st.st_size, max_bytes)
+                    except OSError:
+                        continue
+                    self._delta_entries[rel] = ((rel, st.st_size, st.st_mtime_ns, flags), grams)
+                    changed = True
+                located.append((path, rel))
+            if changed:
+                self._commit_delta()
+
+            base_hits = self.base.evaluate(query)
+            delta_hits = self.delta.evaluate(query)
+            result = []
+            for path, rel in located:
+                # delta にあればそちらが新しい
+                file_id = self.delta.by_path.get(rel)
+                segment, hits = self.delta, delta_hits
+                if file_id is None:
+                    file_id = self.base.by_path[rel]
+                    segment, hits = self.base, base_hits
+                if segment.files[file_id][3] or file_id in hits:
+                    result.append(path)
+            return result
+
+    def _commit_delta(self) -> None:
+        if len(self._delta_entries) > max(COMPACT_MIN_FILES, len(self.base.files) // 4):
+            self._compact()
+            return
+        self.delta = Segment.build(list(self._delta_entries.values()))
+        self._save("delta", self.delta)
+
+    def _compact(self) -> None:
+        """base と delta をまとめて新しい base にする（消えたファイルはここで落とす）。"""
+        entries: List[Tuple[FileEntry, Set[str]]] = []
+        for entry, grams in zip(self.base.files, self.base.forward()):
+            if entry[0] in self._delta_entries or not os.path.exists(os.path.join(self.root, entry[0])):
+                continue
+            entries.append((entry, grams))
+        entries.extend(self._delta_entries.values())
+        entries.sort(key=lambda e: e[0][0])
+        self.base = Segment.build(entries)
+        self._delta_entries = {}
+        self.delta = Segment.empty()
+        self._save("base", self.base)
+        self._save("delta", self.delta)
+
+    def _save(self, name: str, segment: Segment) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            segment.save(self.directory, name)
+        except OSError:
+            pass  # 保存できなくてもこのプロセスの中では使える
+
+
+_indexes: Dict[Tuple[str, str], TrigramIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_trigram_index(root: str, index_dir: str) -> TrigramIndex:
+    """ワークスペースごとの TrigramIndex（プロセス内で共有、初回はディスクから読む）。"""
+    import hashlib
+
+    root = os.path.abspath(root)
+    directory = os.path.join(index_dir, hashlib.sha1(root.encode("utf-8")).hexdigest()[:16])
+    with _indexes_lock:
+        index = _indexes.get((root, directory))
+        if index is None:
+            index = TrigramIndex(root, directory)
+            _indexes[(root, directory)] = index
+        return index
@@ -0,0 +1,162 @@
+"""
+Cached directory listings shared by the workspace tools.
+
+find_files / grep_files / list_directory / get_project_tree はそれぞれ独自にツリーを走査していた
+（iterdir + エントリごとの is_file / is_dir の stat、get_project_tree は別の scandir）。
+WorkspaceInventory はディレクトリごとの一覧（名前順、ファイル・ディレクトリの種別、隠しファイルかどうか）を
+os.scandir で1回だけ作ってキャッシュし、4つのツールはここに問い合わせる。
+
+    inventory = get_workspace_inventory()
+    inventory.listing("/repo/src")                      # そのディレクトリの一覧
+    for entry in inventory.iter_files("/repo", 15):     # 名前順の深さ優先（隠しファイル・ディレクトリは除く）
+        entry.path
+
+一覧はディレクトリの mtime_ns で検証する（エントリの追加・削除・改名でディレクトリの mtime が変わる）。
+問い合わせのたびに辿るディレクトリを1回ずつ stat し、変わったディレクトリだけ scandir し直すので、
+同じループの中で find_files を何度呼んでもディスクを走査し直さない。
+種別は scandir の d_type から分かるので、エントリごとの stat は（シンボリックリンク以外）発生しない。
+
+ファイルの中身の変更ではディレクトリの mtime は変わらないが、一覧は名前と種別しか持たないので影響しない。
+mtime の分解能より短い間隔の変更を見逃さないよう、走査時点で mtime が新しすぎる一覧は次回も読み直す。
+"""
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator, Optional, Tuple
+
+# キャッシュする一覧のエントリ数の合計の上限
+_MAX_CACHED_ENTRIES = 2_000_000
+# 走査時点で mtime がこれより新しい一覧は信用しない（同じ mtime のうちに起きた変更を見逃さないため）
+RACY_NS = 1_000_000_000
+
+
+class InventoryEntry:
+    """One directory entry: name, absolute path and its type (symlinks followed)."""
+
+    __slots__ = ("name", "path", "is_dir", "is_file", "hidden")
+
+    def __init__(self, name: str, path: str, is_dir: bool, is_file: bool):
+        self.name = name
+        self.path = path
+        self.is_dir = is_dir
+        self.is_file = is_file
+        self.hidden = name.startswith(".")
+
+
+class DirListing:
+    """Entries of one directory (sorted by name), valid for one mtime_ns."""
+
+    __slots__ = ("mtime_ns", "racy", "entries")
+
+    def __init__(self, mtime_ns: int, racy: bool, entries: Tuple[InventoryEntry, ...]):
+        self.mtime_ns = mtime_ns
+        self.racy = racy
+        self.entries = entries
+
+    @classmethod
+    def scan(cls, directory: str, st: os.stat_result) -> "DirListing":
+        scanned_ns = time.time_ns()
+        entries = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                    is_file = not is_dir and entry.is_file()
+                except OSError:
+                    is_dir = is_file = False
+                entries.append(InventoryEntry(entry.name, entry.path, is_dir, is_file))
+        entries.sort(key=lambda e: e.name)
+        return cls(st.st_mtime_ns, scanned_ns - st.st_mtime_ns < RACY_NS, tuple(entries))
+
+
+class WorkspaceInventory:
+    """LRU of DirListing per directory, bounded by the total number of entries."""
+
+    def __init__(self, max_entries: int = _MAX_CACHED_ENTRIES):
+        self.max_entries = max_entries
+        self.scans = 0
+        self.hits = 0
+        self._listings: "OrderedDict[str, DirListing]" = OrderedDict()
+        self._total_entries = 0
+        self._lock = threading.Lock()
+
+    def listing(self, directory: str) -> Tuple[InventoryEntry, ...]:
+        """directory の最新の一覧（名前順）。存在しなければ FileNotFoundError、ディレクトリでなければ NotADirectoryError。"""
+        return self.listing_state(directory).entries
+
+    def listing_state(self, directory: str) -> DirListing:
+        """listing と同じだが、検証に使った mtime_ns と racy も返す（一覧から作った結果をキャッシュする側向け）。"""
+        key = os.path.abspath(directory)
+        st = os.stat(key)
+        if not stat.S_ISDIR(st.st_mode):
+            raise NotADirectoryError(f"Not a directory: {directory}")
+        with self._lock:
+            cached = self._listings.get(key)
+            if cached is not None and cached.mtime_ns == st.st_mtime_ns and not cached.racy:
+                self._listings.move_to_end(key)
+                self.hits += 1
+                return cached
+        listing = DirListing.scan(key, st)
+        with self._lock:
+            self.scans += 1
+            self._store(key, listing)
+        return listing
+
+    def iter_files(
+        self, top: str, max_depth: int, recursive: bool = True, skip_hidden: bool = True
+    ) -> Iterator[InventoryEntry]:
+        """
+        top 以下のファイルを名前順の深さ優先で返す（top の直下が深さ 0、max_depth まで）。
+        skip_hidden なら . で始まるファイルとディレクトリ（の中）を除く。読めないディレクトリは飛ばす。
+        """
+        def walk(directory: str, depth: int) -> Iterator[InventoryEntry]:
+            try:
+                entries = self.listing(directory)
+            except OSError:
+                return
+            for entry in entries:
+                if skip_hidden and entry.hidden:
+                    continue
+                if entry.is_file:
+                    yield entry
+                elif entry.is_dir and recursive and depth < max_depth:
+                    yield from walk(entry.path, depth + 1)
+
+        return walk(os.path.abspath(top), 0)
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """path とその親ディレクトリの一覧を捨てる（None なら全部）。書き込み直後の変更を確実に反映させる。"""
+        with self._lock:
+            if path is None:
+                self._listings.clear()
+                self._total_entries = 0
+                return
+            key = os.path.abspath(path)
+            for directory in (key, os.path.dirname(key)):
+                old = self._listings.pop(directory, None)
+                if old is not None:
+                    self._total_entries -= len(old.entries)
+
+    def _store(self, key: str, listing: DirListing) -> None:
+        old = self._listings.pop(key, None)
+        if old is not None:
+            self._total_entries -= len(old.entries)
+        self._listings[key] = listing
+        self._total_entries += len(listing.entries)
+        # 上限を超えたら古いものから捨てる（今入れたものは残す）
+        while self._total_entries > self.max_entries and len(self._listings) > 1:
+            _, evicted = self._listings.popitem(last=False)
+            self._total_entries -= len(evicted.entries)
+
+
+_inventory: Optional[WorkspaceInventory] = None
+
+
+def get_workspace_inventory() -> WorkspaceInventory:
+    """プロセス共有の WorkspaceInventory を返す。"""
+    global _inventory
+    if _inventory is None:
+        _inventory = WorkspaceInventory()
+    return _inventory
@@ -1,58 +1,65 @@
 #!/usr/bin/env python3
+import argparse
 import asyncio
 import logging
 import os
 import sys
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+from logging.handlers import RotatingFileHandler
+from typing import TYPE_CHECKING
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from companion.core import DuckAgent
-from companion.modules.session_manager import SessionManager
-
-from logging.handlers import RotatingFileHandler
-from rich.traceback import install
-
-# Install rich traceback handler
-install(show_locals=False)
-
-from companion.ui import ui
-
-class UILogHandler(logging.Handler):
-    """Custom logging handler to send logs to the DuckUI sidebar."""
-    def emit(self, record):
-        try:
-            msg = self.format(record)
-            ui.add_log(msg)
-        except Exception:
-            self.handleError(record)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(name)s: %(message)s',
-    handlers=[
-        RotatingFileHandler(
-            "duckflow_v4.log",
-            maxBytes=5*1024*1024,  # 5MB
-            backupCount=3,
-            encoding='utf-8'
-        ),
-        UILogHandler()  # Use UI sidebar instead of StreamHandler
-    ]
-)
-# Set external libs to WARNING to reduce noise
-logging.getLogger("httpx").setLevel(logging.WARNING)
-logging.getLogger("openai").setLevel(logging.WARNING)
+# .env の読み込み・アプリ本体の import・ログ設定は __main__ として実行されたときだけ行う。
+# CPU プロセスプール（spawn）のワーカーはこのファイルを __mp_main__ として読み込み直すので、
+# 最上位に置くとワーカーごとに全モジュールを import し、同じログファイルに RotatingFileHandler を
+# 追加してしまう（複数プロセスが1つのファイルをローテーションするのは安全でない。Windows では失敗する）。
+if TYPE_CHECKING:
+    from companion.modules.session_manager import SessionManager
+
+
+def _bootstrap():
+    """環境変数・rich の traceback・ログ出力を設定する（メインプロセスでのみ呼ぶ）。"""
+    from dotenv import load_dotenv
+    from rich.traceback import install
+
+    # Load environment variables
+    load_dotenv()
+
+    # Install rich traceback handler
+    install(show_locals=False)
+
+    from companion.ui import ui
+
+    class UILogHandler(logging.Handler):
+        """Custom logging handler to send logs to the DuckUI sidebar."""
+        def emit(self, record):
+            try:
+                msg = self.format(record)
+                ui.add_log(msg)
+            except Exception:
+                self.handleError(record)
+
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(name)s: %(message)s',
+        handlers=[
+            RotatingFileHandler(
+                "duckflow_v4.log",
+                maxBytes=5*1024*1024,  # 5MB
+                backupCount=3,
+                encoding='utf-8'
+            ),
+            UILogHandler()  # Use UI sidebar instead of StreamHandler
+        ]
+    )
+    # Set external libs to WARNING to reduce noise
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("openai").setLevel(logging.WARNING)
 
-import argparse
-from companion.tools.file_ops import file_ops
 
-def _prompt_session_resume(session_manager: SessionManager):
+def _prompt_session_resume(session_manager: "SessionManager"):
     """
     起動時に前回セッションの継続有無をユーザーに尋ねる。
 
@@ -107,6 +114,12 @@ def _prompt_session_resume(session_manager: SessionManager):
 
 
 async def main():
+    from companion.core import DuckAgent
+    from companion.modules.session_manager import SessionManager
+    from companion.tools.file_ops import file_ops
+    from companion.base import http_pool
+    from companion.base.io_executor import shutdown_io_executor
+
     # Parse arguments
     parser = argparse.ArgumentParser(description="Duckflow v4 Agent")
     parser.add_argument("--dir", type=str, default=".", help="Working directory for the agent")
@@ -142,9 +155,15 @@ async def main():
         session_manager=session_manager,
         resume_state=resume_state,
     )
-    await agent.run()
+    try:
+        await agent.run()
+    finally:
+        # 共有 HTTP 接続プールとファイル I/O 用のスレッド・プロセスプールを閉じる
+        await http_pool.aclose_all()
+        shutdown_io_executor(wait=False)
 
 if __name__ == "__main__":
+    _bootstrap()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
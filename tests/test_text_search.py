@@ -0,0 +1,51 @@
+"""grep_files の検索本体（companion.utils.text_search.grep_paths）のスキップの扱い。"""
+import re
+
+from companion.utils.text_search import SNIFF_BYTES, grep_paths
+
+
+def _write(path, data: bytes) -> str:
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_binary_files_are_skipped_silently(tmp_path):
+    # .pyc のように本文中に文字列を含むバイナリは検索もせず、スキップ数にも数えない
+    text = _write(tmp_path / "a.py", b"# TODO: text\n")
+    binary = _write(tmp_path / "a.cpython-311.pyc", b"\0\0\0\0TODO: in bytecode\n")
+
+    results, oversized = grep_paths(re.compile("TODO"), [text, binary], str(tmp_path), 50)
+
+    assert results == ["a.py:1: # TODO: text"]
+    assert oversized == 0
+
+
+def test_nul_after_sniff_window_is_searched(tmp_path):
+    late_nul = _write(tmp_path / "late.txt", b"TODO: first line\n" + b"x" * SNIFF_BYTES + b"\0\n")
+
+    results, oversized = grep_paths(re.compile("TODO"), [late_nul], str(tmp_path), 50)
+
+    assert results == ["late.txt:1: TODO: first line"]
+    assert oversized == 0
+
+
+def test_oversized_text_files_are_counted(tmp_path):
+    small = _write(tmp_path / "small.py", b"TODO\n")
+    large = _write(tmp_path / "large.py", b"TODO\n" * 100)
+    binary = _write(tmp_path / "large.bin", b"\0" * 1000)
+
+    results, oversized = grep_paths(re.compile("TODO"), [small, large, binary], str(tmp_path), 50, max_bytes=64)
+
+    # 大きすぎるバイナリは数えない
+    assert results == ["small.py:1: TODO"]
+    assert oversized == 1
+
+
+def test_stop_path_ends_the_scan(tmp_path):
+    paths = [_write(tmp_path / f"{i}.txt", b"TODO\n") for i in range(3)]
+    stop = tmp_path / "stop"
+    stop.touch()
+
+    results, _ = grep_paths(re.compile("TODO"), paths, str(tmp_path), 50, stop_path=str(stop))
+
+    assert results == []